@@ -9,12 +9,22 @@ class Camera:
     One codebase:
     - Pi: uses Picamera2 if available
     - Laptop: falls back to OpenCV
+    - replay: serves a recording.py recording (no hardware needed)
     Returns RGB uint8 frames (H,W,3)
     """
-    def __init__(self, size: Tuple[int, int] = (320, 240), fps: int = 15) -> None:
+    def __init__(self, size: Tuple[int, int] = (320, 240), fps: int = 15, replay_path: Optional[str] = None) -> None:
         self.size = size
         self.fps = fps
         self.backend = "unknown"
+        self.finished = False
+        self.replay = None
+
+        if replay_path is not None:
+            from recording import ReplayCamera
+            self.backend = "replay"
+            self.replay = ReplayCamera(replay_path)
+            self.size = self.replay.size
+            return
 
         # Try PiCamera2
         try:
@@ -36,6 +46,7 @@ class Camera:
         import cv2  # type: ignore
         self.backend = "opencv"
         self._cv2 = cv2
+        self._bgr: Optional[np.ndarray] = None
         self._cap = cv2.VideoCapture(0)
         self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
         self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
@@ -43,16 +54,49 @@ class Camera:
         if not self._cap.isOpened():
             raise RuntimeError("Could not open camera via picamera2 or opencv.")
 
-    def read(self) -> Optional[np.ndarray]:
+    def read(self, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """
+        Next frame. With `out` (e.g. a FramePool buffer of the frame's shape)
+        the frame is written into it and `out` is returned; otherwise, or if
+        the shape doesn't match, a new array is returned.
+        """
+        if self.backend == "replay":
+            frame = self.replay.read(out=out)
+            self.finished = self.replay.finished
+            return frame
         if self.backend == "picamera2":
-            return self._cam.capture_array("main")
-        ret, bgr = self._cap.read()
+            if out is None:
+                return self._cam.capture_array("main")
+            return self._read_picamera2_into(out)
+        # BGR staging buffer is reused by VideoCapture when the size matches
+        ret, bgr = self._cap.read(self._bgr)
         if not ret:
             return None
-        return bgr[:, :, ::-1].copy()  # BGR->RGB
+        self._bgr = bgr
+        if out is not None and out.shape == bgr.shape:
+            return self._cv2.cvtColor(bgr, self._cv2.COLOR_BGR2RGB, dst=out)
+        return self._cv2.cvtColor(bgr, self._cv2.COLOR_BGR2RGB)
+
+    def _read_picamera2_into(self, out: np.ndarray) -> Optional[np.ndarray]:
+        # copy straight out of the libcamera buffer and hand it back right
+        # away (holding it would starve the camera's request queue)
+        from picamera2 import MappedArray  # type: ignore
+        request = self._cam.capture_request()
+        try:
+            with MappedArray(request, "main") as m:
+                src = m.array
+                h, w = out.shape[:2]
+                if src.shape[0] < h or src.shape[1] < w:
+                    return src[:, :, :3].copy()
+                np.copyto(out, src[:h, :w, :out.shape[2]])
+        finally:
+            request.release()
+        return out
 
     def close(self) -> None:
-        if self.backend == "picamera2":
+        if self.backend == "replay":
+            self.replay.close()
+        elif self.backend == "picamera2":
             self._cam.close()
         else:
             self._cap.release()
\ No newline at end of file
@@ -1,17 +1,21 @@
 from interpreter_backend import make_interpreter
-from typing import List, Dict, Any
-from PIL import Image
+from typing import List, Dict, Any, Optional, Tuple
 from module import Module
 from labels import load_labels
 import numpy as np
-from det import Det
-import cv2
+from det import Det, DetectionBatch
+import time
 import variables
 import nms
+from preprocess import InputPreprocessor
+from rate_controller import module_settings
 
 class CocoModule(Module):
     name = "coco"
     hz = 1.5  # ~1–2 FPS
+    priority = 1
+    scene_gated = True
+    rate_settings = ("threads",)  # one model: no small_model
 
     def __init__(self, model_path: str, labels_path: str) -> None:
         super().__init__()
@@ -19,6 +23,9 @@ class CocoModule(Module):
         self.det = CocoDetector(model_path=model_path, labels=labels, score_thresh=variables.COCO_DEFAULT_THRESH)
 
     def process(self, frame: np.ndarray, state: Dict[str, Any]) -> None:
+        threads = module_settings(state, self.name).get("threads")
+        if threads:
+            self.det.set_num_threads(threads)
         dets = self.det.infer(frame)
         if variables.DEBUG:
             print("[DEBUG] top:", [(d.label, round(d.score, 2)) for d in sorted(dets, key=lambda x: x.score, reverse=True)[:variables.DEBUG_TOP_N]])
@@ -44,8 +51,9 @@ class CocoDetector:
     def __init__(self, model_path: str, labels: List[str], score_thresh: float = 0.4) -> None:
         self.labels = labels
         self.score_thresh = score_thresh
-        self.interp = make_interpreter(model_path, num_threads=variables.TFLITE_THREADS, force=variables.INTERPRETER_MODE)  # or "tf" or "runtime"
-        self.interp.allocate_tensors()
+        self.model_path = model_path
+        self.num_threads = variables.TFLITE_THREADS
+        self.interp = make_interpreter(model_path, num_threads=self.num_threads)
 
         self.in_details = self.interp.get_input_details()[0]
         self.out_details = self.interp.get_output_details()
@@ -56,114 +64,134 @@ class CocoDetector:
                 print(i, d["name"], d["shape"], d["dtype"])
         # input shape: [1, H, W, 3]
         _, self.in_h, self.in_w, _ = self.in_details["shape"]
-
-    def _preprocess(self, rgb: np.ndarray) -> np.ndarray:
-        # img = Image.fromarray(rgb).resize((self.in_w, self.in_h), resample=Image.BILINEAR)
-        img = cv2.resize(rgb, (self.in_w, self.in_h), interpolation=cv2.INTER_LINEAR)
-        x = np.ascontiguousarray(np.asarray(img, dtype=np.uint8))
-        # Handle float inputs if model expects float32
-        in_dtype = self.in_details["dtype"]
-        scale, zero = self.in_details.get("quantization", (0.0, 0))
-
-        # Float model
-        if in_dtype == np.float32:
-            x = x.astype(np.float32) / 255.0
-            return np.expand_dims(x, axis=0)
-
-        # Quantized model (uint8 or int8)
-        if scale is None or scale == 0:
-            # fallback: just cast
-            q = x.astype(in_dtype)
-            return np.expand_dims(q, axis=0)
-
-        # IMPORTANT:
-        # Most TFLite detection models quantize *normalized* input (commonly [-1,1] or [0,1]).
-        # We try [-1,1] first because many edge detectors use it.
-        xf = (x.astype(np.float32) - 127.5) / 127.5  # -> [-1, 1]
-
-        q = np.round(xf / scale + zero)
-
-        if in_dtype == np.uint8:
-            q = np.clip(q, 0, 255).astype(np.uint8)
-        elif in_dtype == np.int8:
-            q = np.clip(q, -128, 127).astype(np.int8)
-        else:
-            q = q.astype(in_dtype)
-
-        return np.expand_dims(q, axis=0)
-
-    def infer(self, frame_rgb: np.ndarray) -> List[Det]:
-        h, w, _ = frame_rgb.shape
-        x = self._preprocess(frame_rgb)
-
-        self.interp.set_tensor(self.in_details["index"], x)
-        self.interp.invoke()
-
-        # Typical order: boxes, classes, scores, num
-        outs = [self.interp.get_tensor(d["index"]) for d in self.out_details]
-        # Make robust to minor variations
-        outs = [o.squeeze() for o in outs]
-        if len(outs) != 4:
+        # uint8 -> input dtype lookup table computed once from the model's quantization
+        self.pre = InputPreprocessor(
+            self.in_h, self.in_w, self.in_details["dtype"], self.in_details.get("quantization")
+        )
+        self._input_tensor = self.interp.tensor(self.in_details["index"])
+
+        # output roles resolved once instead of per frame
+        roles = self._resolve_outputs()
+        self._out_boxes, self._out_classes, self._out_scores, self._out_num = (
+            self.out_details[i]["index"] for i in roles
+        )
+        # common SSD label offset: labels[0] is '???'/'background', class id k -> labels[k + 1]
+        self.class_names: List[str] = self.labels[1:]
+        # per-class score threshold indexed by class id; last entry for unknown ids
+        self._thresholds = np.array(
+            [variables.COCO_THRESHOLDS.get(lbl, variables.COCO_DEFAULT_THRESH) for lbl in self.class_names]
+            + [variables.COCO_DEFAULT_THRESH],
+            dtype=np.float64,
+        )
+        self.last_timings: Dict[str, float] = {}
+        # detector_input stream target: (copy of the last input tensor,
+        # (w, h) of its source frame), only taken while capture_input is set
+        self.capture_input = False
+        self.last_input: Optional[Tuple[np.ndarray, Tuple[int, int]]] = None
+
+    def set_num_threads(self, num_threads: int) -> None:
+        """
+        Rebuild the interpreter with another thread count (TFLite fixes it at
+        construction). Call between inferences, from the inferring thread.
+        """
+        num_threads = max(1, int(num_threads))
+        if num_threads == self.num_threads:
+            return
+        # model bytes are cached; the new interpreter is warmed up before it is used
+        self.interp = make_interpreter(self.model_path, num_threads=num_threads)
+        # same model: tensor indices and output roles are unchanged
+        self._input_tensor = self.interp.tensor(self.in_details["index"])
+        self.num_threads = num_threads
+
+    def _preprocess(self, rgb: np.ndarray) -> None:
+        """
+        Resize + quantize straight into the interpreter's input tensor.
+        The tensor view must be dropped before invoke(), so it is fetched per call.
+        """
+        x = self._input_tensor()
+        self.pre.run(rgb, x[0])
+        if self.capture_input:
+            # fresh tuple swapped in by reference: readers never see a half-written copy
+            self.last_input = (x[0].copy(), (rgb.shape[1], rgb.shape[0]))
+        del x
+
+    def _resolve_outputs(self) -> Tuple[int, int, int, int]:
+        """
+        Map output tensors to (boxes, classes, scores, num) once.
+        Names first (metadata models), then shapes (Nx4 boxes, 1-element num),
+        then the usual SSD order boxes, classes, scores, num.
+        """
+        if len(self.out_details) != 4:
             raise RuntimeError(
-                f"Model outputs {len(outs)} tensors (expected 4). "
+                f"Model outputs {len(self.out_details)} tensors (expected 4). "
                 f"This model likely has no TFLite postprocess. "
                 f"Out details: {[d['shape'] for d in self.out_details]}"
             )
+        roles: Dict[str, int] = {}
+        for i, d in enumerate(self.out_details):
+            n = d["name"].lower()
+            if "box" in n or "location" in n:
+                roles.setdefault("boxes", i)
+            elif "class" in n or "categor" in n:
+                roles.setdefault("classes", i)
+            elif "score" in n:
+                roles.setdefault("scores", i)
+            elif "num" in n or "count" in n:
+                roles.setdefault("num", i)
+        if len(set(roles.values())) == 4 and len(roles) == 4:
+            return roles["boxes"], roles["classes"], roles["scores"], roles["num"]
+
+        shapes = [tuple(d["shape"]) for d in self.out_details]
+        boxes = next((i for i, sh in enumerate(shapes) if len(sh) >= 2 and sh[-1] == 4), None)
+        num = next((i for i, sh in enumerate(shapes) if int(np.prod(sh)) == 1), None)
+        if boxes is None or num is None or boxes == num:
+            return 0, 1, 2, 3
+        classes, scores = [i for i in range(4) if i not in (boxes, num)]
+        return boxes, classes, scores, num
+
+    def decode(self, w: int, h: int) -> DetectionBatch:
+        """
+        Vectorized decode of the postprocess outputs into pixel boxes,
+        filtered by the per-class threshold vector.
+        """
+        boxes = self.interp.get_tensor(self._out_boxes).reshape(-1, 4)
+        classes = self.interp.get_tensor(self._out_classes).reshape(-1)
+        scores = self.interp.get_tensor(self._out_scores).reshape(-1)
+        num = int(self.interp.get_tensor(self._out_num).reshape(-1)[0])
+
+        n = min(num, scores.shape[0])
+        cls = classes[:n].astype(np.int32)
+        sc = scores[:n].astype(np.float32)
+
+        # unknown class ids use the default threshold (last entry)
+        n_names = len(self.class_names)
+        thr_idx = np.where((cls >= 0) & (cls < n_names), cls, n_names)
+        keep = sc >= self._thresholds[thr_idx]
+
+        # boxes are usually [ymin, xmin, ymax, xmax] normalized
+        b = boxes[:n][keep].astype(np.float64) * (h, w, h, w)
+        xyxy = b[:, [1, 0, 3, 2]].astype(np.int32)
+        return DetectionBatch(xyxy, sc[keep], cls[keep], self.class_names)
+
+    def infer_batch(self, frame_rgb: np.ndarray) -> DetectionBatch:
+        h, w, _ = frame_rgb.shape
+        t0 = time.perf_counter()
+        self._preprocess(frame_rgb)
+        t1 = time.perf_counter()
+        self.interp.invoke()
+        t2 = time.perf_counter()
+        batch = self.decode(w, h)
+        t3 = time.perf_counter()
+        batch = nms.nms_batch(batch, iou_thresh=variables.COCO_NMS_THRESH, top_k=variables.COCO_NMS_TOP_K)
+        t4 = time.perf_counter()
+        # per-stage ms of the last call (model_bench, debugging)
+        self.last_timings = {
+            "preprocess": (t1 - t0) * 1000.0,
+            "invoke": (t2 - t1) * 1000.0,
+            "decode": (t3 - t2) * 1000.0,
+            "nms": (t4 - t3) * 1000.0,
+        }
+        return batch
 
-        # Heuristic mapping
-        boxes = None
-        classes = None
-        scores = None
-        num = None
-
-        for o in outs:
-            if o.ndim == 2 and o.shape[1] == 4:  # Nx4
-                boxes = o
-            elif o.ndim == 1 and o.dtype in (np.float32, np.float16) and o.size <= 200:
-                # could be scores OR classes; disambiguate later
-                pass
-
-        # Many SSD models output in fixed order; try that first:
-        if len(outs) >= 4 and outs[0].ndim == 2 and outs[0].shape[1] == 4:
-            boxes = outs[0]
-            classes = outs[1].astype(np.int32)
-            scores = outs[2].astype(np.float32)
-            num = int(outs[3]) if np.isscalar(outs[3]) else int(outs[3].item())
-        else:
-            # Fallback: assume standard names by position (still best-effort)
-            boxes = outs[0]
-            classes = outs[1].astype(np.int32)
-            scores = outs[2].astype(np.float32)
-            num = int(outs[3]) if np.isscalar(outs[3]) else int(outs[3].item())
-
-        dets: List[Det] = []
-        n = min(num, len(scores))
-        for i in range(n):
-            score = float(scores[i])
-            # if float(scores[i]) < self.score_thresh:
-            #     continue
-            # cls_raw = int(classes[i])
-            # if i < 5:
-            #     print("[DBG]", "cls_raw=", cls_raw,
-            #         "labels[cls_raw]=", self.labels[cls_raw] if 0 <= cls_raw < len(self.labels) else "OOB",
-            #         "labels[cls_raw+1]=", self.labels[cls_raw+1] if 0 <= cls_raw+1 < len(self.labels) else "OOB",
-            #         "score=", float(scores[i]))
-            cls = int(classes[i])
-            # label = self.labels[cls] if 0 <= cls < len(self.labels) else f"class_{cls}"
-            label = self.labels[cls + 1] if 0 <= (cls + 1) < len(self.labels) else f"class_{cls}"
-            threshold = variables.COCO_THRESHOLDS.get(label, variables.COCO_DEFAULT_THRESH)
-            if score < threshold:
-                continue
-            # FIX: common SSD label offset where labels[0] is '???'/'background'
-            # if label in {"???", "background"} and (cls + 1) < len(self.labels):
-            #     label = self.labels[cls + 1]
-
-            # boxes are usually [ymin, xmin, ymax, xmax] normalized
-            ymin, xmin, ymax, xmax = [float(v) for v in boxes[i]]
-            x1 = int(xmin * w)
-            y1 = int(ymin * h)
-            x2 = int(xmax * w)
-            y2 = int(ymax * h)
-            dets.append(Det(label=label, score=float(scores[i]), bbox=(x1, y1, x2, y2)))
-        dets = nms.nms_dets(dets=dets, iou_thresh=variables.COCO_NMS_THRESH)
-        return dets
\ No newline at end of file
+    def infer(self, frame_rgb: np.ndarray) -> List[Det]:
+        return self.infer_batch(frame_rgb).dets
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import Tuple
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
 # -----------------------------
 # Shared types
 # -----------------------------
@@ -7,4 +8,49 @@ from typing import Tuple
 class Det:
     label: str
     score: float
-    bbox: Tuple[int, int, int, int]  # x1,y1,x2,y2 in pixels
\ No newline at end of file
+    bbox: Tuple[int, int, int, int]  # x1,y1,x2,y2 in pixels
+
+
+class DetectionBatch:
+    """
+    Detections as parallel arrays:
+    - boxes     : (N, 4) int32  x1,y1,x2,y2 in pixels
+    - scores    : (N,)   float32
+    - class_ids : (N,)   int32, index into `names`
+    Det objects are only built (once) when .dets is read.
+    """
+    __slots__ = ("boxes", "scores", "class_ids", "names", "_dets")
+
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, names: Sequence[str]) -> None:
+        self.boxes = boxes
+        self.scores = scores
+        self.class_ids = class_ids
+        self.names = names
+        self._dets: Optional[List[Det]] = None
+
+    @classmethod
+    def empty(cls, names: Sequence[str] = ()) -> "DetectionBatch":
+        return cls(
+            np.zeros((0, 4), dtype=np.int32),
+            np.zeros((0,), dtype=np.float32),
+            np.zeros((0,), dtype=np.int32),
+            names,
+        )
+
+    def __len__(self) -> int:
+        return int(self.scores.shape[0])
+
+    def label(self, class_id: int) -> str:
+        return self.names[class_id] if 0 <= class_id < len(self.names) else f"class_{class_id}"
+
+    def take(self, idx: np.ndarray) -> "DetectionBatch":
+        return DetectionBatch(self.boxes[idx], self.scores[idx], self.class_ids[idx], self.names)
+
+    @property
+    def dets(self) -> List[Det]:
+        if self._dets is None:
+            self._dets = [
+                Det(label=self.label(c), score=s, bbox=(x1, y1, x2, y2))
+                for (x1, y1, x2, y2), s, c in zip(self.boxes.tolist(), self.scores.tolist(), self.class_ids.tolist())
+            ]
+        return self._dets
@@ -1,7 +1,9 @@
 from module import Module
-from typing import Dict, Any, List
-from PIL import Image
+from typing import Dict, Any, List, Tuple
 from det import Det
+from nms import nms_dets
+from rate_controller import module_settings
+import variables
 import math
 import numpy as np
 try:
@@ -16,29 +18,84 @@ from vendor_fdlite import FaceDetection, FaceDetectionModel
 class FaceModule(Module):
     name = "face"
     hz = 2.5  # 2–3 FPS, but gated
+    priority = 2
+    scene_gated = True
+    depends_on = ("coco",)  # new person boxes
+    # person mode always runs the 128x128 model on crops: no small_model
+    rate_settings = ("threads",) if variables.FACE_ROI_MODE == 'person' else ("threads", "small_model")
 
     def __init__(self) -> None:
         super().__init__()
-        self.fd = FaceDetection(model_type=FaceDetectionModel.BACK_CAMERA)
+        self.person_rois = variables.FACE_ROI_MODE == 'person'
+        model_type = FaceDetectionModel.SHORT if self.person_rois else FaceDetectionModel.BACK_CAMERA
+        # person mode: the crop batch is allocated once, never resized per frame
+        max_batch = variables.FACE_MAX_CROPS if self.person_rois else 1
+        self.fd = FaceDetection(
+            model_type=model_type,
+            cache_anchors=variables.FACE_CACHE_ANCHORS,
+            max_batch=max_batch,
+            num_threads=variables.FACE_TFLITE_THREADS,
+        )
+        self.fd_low = None  # short-range 128x128 model, built when the rate controller first asks for it
+
+    def _detector(self, state: Dict[str, Any]) -> FaceDetection:
+        """
+        The configured model, or the short-range 128x128 model while the rate
+        controller asks for small_model (frame mode; person mode already uses
+        it). This is a model switch: the short-range model only finds faces
+        within ~2 m, it is not the back-camera model on a smaller input.
+        """
+        if self.person_rois or not module_settings(state, self.name).get("small_model", False):
+            return self.fd
+        if self.fd_low is None:
+            self.fd_low = FaceDetection(
+                model_type=FaceDetectionModel.SHORT,
+                cache_anchors=variables.FACE_CACHE_ANCHORS,
+                num_threads=self.fd.num_threads,
+            )
+        return self.fd_low
 
     def process(self, frame: np.ndarray, state: Dict[str, Any]) -> None:
+        threads = module_settings(state, self.name).get("threads")
+        if threads:
+            for fd in (self.fd, self.fd_low):
+                if fd is not None:
+                    fd.set_num_threads(threads)
+
         # Gate: only run face detection if person exists
         if not state.get("person_present", False):
             state["faces"] = []
+            state["face_timings"] = {}
             return
 
-        # Optional ROI: run only in top 75% for chest pendant (cuts false positives)
         h, w, _ = frame.shape
-        roi = frame[: int(h * 0.75), :, :]
-        img = Image.fromarray(roi)
-        dets = self.fd(img)
+        if self.person_rois:
+            # head crops of the detected persons, one batched invoke
+            persons = sorted(state.get("persons", []), key=lambda d: d.score, reverse=True)
+            result = self.fd.detect_batch(frame, [head_roi(p.bbox) for p in persons[: variables.FACE_MAX_CROPS]])
+        else:
+            # Optional ROI: run only in top 75% for chest pendant (cuts false positives)
+            # (the frame is passed as-is; detections come back in frame pixels)
+            result = self._detector(state).detect(frame, roi_px=(0, 0, w, int(h * 0.75)))
 
         faces: List[Det] = []
-        for d in dets:
-            bb = d.bbox  # normalized xmin,ymin,width,height relative to ROI
-            x1 = int(bb.xmin * w)
-            y1 = int(bb.ymin * roi.shape[0])
-            x2 = int((bb.xmin + bb.width) * w)
-            y2 = int((bb.ymin + bb.height) * roi.shape[0])
+        for d in result.detections:
+            (x1, y1), (x2, y2) = d.data[:2].astype(int).tolist()
             faces.append(Det(label="face", score=float(d.score), bbox=(x1, y1, x2, y2)))
-        state["faces"] = faces
\ No newline at end of file
+        if self.person_rois and len(faces) > 1:
+            faces = nms_dets(faces, variables.FACE_CROP_NMS_THRESH)
+        state["faces"] = faces
+        # per-stage ms of this run (tensorize / invoke / decode / nms), for the debug view
+        state["face_timings"] = result.timings
+
+
+def head_roi(bbox: Tuple[int, int, int, int]) -> Tuple[float, float, float, float]:
+    """
+    Square, padded crop around the head region (top of a person box).
+    May extend past the frame; the letterbox fill covers that.
+    """
+    x1, y1, x2, y2 = bbox
+    head_h = (y2 - y1) * variables.FACE_HEAD_FRACTION
+    side = max(x2 - x1, head_h) * (1.0 + 2.0 * variables.FACE_HEAD_PAD)
+    cx, cy = (x1 + x2) / 2.0, y1 + head_h / 2.0
+    return (cx - side / 2.0, cy - side / 2.0, cx + side / 2.0, cy + side / 2.0)
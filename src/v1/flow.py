@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+import variables
+from det import Det
+from module import Module
+
+
+_LK_PARAMS = dict(
+    winSize=(15, 15),
+    maxLevel=2,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03),
+)
+
+
+class FlowBoxes:
+    """
+    Boxes carried from frame to frame by sparse Lucas-Kanade flow.
+    - seed(): new detections; corners are picked inside every box
+    - step(): one forward + one backward LK pass for all points of all boxes;
+      points failing the forward-backward or patch-error check are dropped,
+      each box moves
+      by the median displacement and scales by the median spread ratio
+    - confidence per box: surviving points / seeded points
+    Points live in the downscaled frame; boxes in full-frame pixels.
+    """
+
+    def __init__(self, scale: float) -> None:
+        self.scale = scale
+        self.dets: List[Det] = []
+        self.boxes = np.zeros((0, 4), dtype=np.float64)
+        self.points: List[np.ndarray] = []
+        self.seeded: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.dets)
+
+    def seed(self, dets: Sequence[Det], gray: np.ndarray) -> None:
+        self.dets = list(dets)
+        self.boxes = np.array([d.bbox for d in dets], dtype=np.float64).reshape(-1, 4)
+        self.points = [self._corners(gray, box) for box in self.boxes]
+        self.seeded = [len(p) for p in self.points]
+
+    def _corners(self, gray: np.ndarray, box: np.ndarray) -> np.ndarray:
+        h, w = gray.shape
+        x1, y1, x2, y2 = (box * self.scale).round().astype(int).tolist()
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return np.zeros((0, 2), dtype=np.float32)
+        pts = cv2.goodFeaturesToTrack(
+            gray[y1:y2, x1:x2],
+            maxCorners=variables.FLOW_MAX_POINTS,
+            qualityLevel=0.01,
+            minDistance=3,
+        )
+        if pts is None or len(pts) < variables.FLOW_MIN_POINTS:
+            # flat region: fall back to a regular grid inside the box
+            gx, gy = np.meshgrid(np.linspace(0.2, 0.8, 4), np.linspace(0.2, 0.8, 4))
+            return np.stack([x1 + gx.ravel() * (x2 - x1), y1 + gy.ravel() * (y2 - y1)], axis=1).astype(np.float32)
+        return pts.reshape(-1, 2) + np.array([x1, y1], dtype=np.float32)
+
+    def step(self, prev: np.ndarray, gray: np.ndarray) -> List[float]:
+        """
+        Propagate all boxes from `prev` to `gray`; returns per-box confidence.
+        """
+        counts = [len(p) for p in self.points]
+        if not self.dets or sum(counts) == 0:
+            return [0.0 if n else 1.0 for n in self.seeded]
+        p0 = np.concatenate(self.points).reshape(-1, 1, 2)
+        p1, st, err = cv2.calcOpticalFlowPyrLK(prev, gray, p0, None, **_LK_PARAMS)
+        back, st_b, _ = cv2.calcOpticalFlowPyrLK(gray, prev, p1, None, **_LK_PARAMS)
+        fb_err = np.linalg.norm((p0 - back).reshape(-1, 2), axis=1)
+        good = (
+            (st.ravel() == 1)
+            & (st_b.ravel() == 1)
+            & (fb_err < variables.FLOW_FB_MAX_ERR)
+            # patch appearance changed (occlusion): geometry alone can't tell
+            & (err.ravel() < variables.FLOW_MAX_PATCH_ERR)
+        )
+        p0, p1 = p0.reshape(-1, 2), p1.reshape(-1, 2)
+
+        conf: List[float] = []
+        start = 0
+        for i, n in enumerate(counts):
+            sl = slice(start, start + n)
+            start += n
+            g = good[sl]
+            old, new = p0[sl][g], p1[sl][g]
+            self.points[i] = new
+            if len(new) < variables.FLOW_MIN_POINTS:
+                conf.append(0.0 if self.seeded[i] else 1.0)
+                continue
+            conf.append(len(new) / self.seeded[i])
+            self.boxes[i] = _move_box(self.boxes[i], old / self.scale, new / self.scale)
+        return conf
+
+    def current(self) -> List[Det]:
+        out: List[Det] = []
+        for d, box in zip(self.dets, self.boxes):
+            x1, y1, x2, y2 = box.round().astype(int).tolist()
+            out.append(Det(label=d.label, score=d.score, bbox=(x1, y1, x2, y2)))
+        return out
+
+
+def _move_box(box: np.ndarray, old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """
+    Shift by the median point displacement, scale about the centre by the
+    median ratio of point spread (clamped per frame).
+    """
+    shift = np.median(new - old, axis=0)
+    c_old, c_new = np.median(old, axis=0), np.median(new, axis=0)
+    d_old = np.linalg.norm(old - c_old, axis=1)
+    d_new = np.linalg.norm(new - c_new, axis=1)
+    valid = d_old > 1e-3
+    s = float(np.median(d_new[valid] / d_old[valid])) if valid.sum() >= 2 else 1.0
+    s = min(max(s, 0.8), 1.25)
+    cx, cy = (box[0] + box[2]) / 2 + shift[0], (box[1] + box[3]) / 2 + shift[1]
+    hw, hh = (box[2] - box[0]) * s / 2, (box[3] - box[1]) * s / 2
+    return np.array([cx - hw, cy - hh, cx + hw, cy + hh])
+
+
+class FlowModule(Module):
+    """
+    Propagates the last detector boxes (coco_dets) and faces to every new
+    frame with sparse LK flow on a downscaled grayscale copy.
+    Publishes:
+      state["flow_dets"]       : List[Det]  coco_dets moved to this frame
+      state["flow_faces"]      : List[Det]  faces moved to this frame
+      state["flow_confidence"] : float      worst per-box point survival (1.0 = no boxes)
+    Detector results arrive a few frames late. The gray frames of the last
+    FLOW_HISTORY runs are kept by frame id, so new boxes are seeded on the
+    frame they were detected on (or the closest earlier one) and stepped
+    forward through the newer frames. Older than the history: seeded on
+    the current frame (counted in `stale_seeds`).
+    `on_degraded` is called (rate-limited) when confidence drops below
+    FLOW_MIN_CONFIDENCE, e.g. to run the detector early.
+    """
+    name = "flow"
+    hz = float(variables.TARGET_FRAME_GRABBER_FPS)
+    priority = 3
+    cpu_heavy = False
+
+    def __init__(self, on_degraded: Optional[Callable[[], None]] = None) -> None:
+        super().__init__()
+        self.on_degraded = on_degraded
+        self.scale = variables.FLOW_SCALE
+        self.dets = FlowBoxes(self.scale)
+        self.faces = FlowBoxes(self.scale)
+        self._small: Optional[np.ndarray] = None
+        # (frame_id, gray) of the last runs, oldest first; the grays are a
+        # ring of buffers reused in the same order
+        self._history: Deque[Tuple[int, np.ndarray]] = deque(maxlen=variables.FLOW_HISTORY)
+        self._grays: List[np.ndarray] = []
+        self._next_gray = 0
+        self._seen: Dict[str, Any] = {"coco": None, "face": None}
+        self._last_trigger = 0.0
+        self.stale_seeds = 0
+
+    def _to_gray(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        size = (max(1, int(w * self.scale)), max(1, int(h * self.scale)))
+        if self._small is None or self._small.shape[:2] != (size[1], size[0]):
+            self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self._grays = [np.empty((size[1], size[0]), dtype=np.uint8) for _ in range(variables.FLOW_HISTORY)]
+            self._history.clear()
+        cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        # the buffer of the oldest history entry, which the caller drops
+        gray = self._grays[self._next_gray]
+        self._next_gray = (self._next_gray + 1) % len(self._grays)
+        cv2.cvtColor(self._small, cv2.COLOR_RGB2GRAY, dst=gray)
+        return gray
+
+    def _seed_at(self, boxes: FlowBoxes, dets: Sequence[Det], det_frame_id: Optional[int]) -> List[float]:
+        """
+        Seed on the history frame closest to (not after) the detector's
+        frame, then step to the newest one; returns the last step's confidence.
+        """
+        history = self._history
+        start = len(history) - 1
+        if det_frame_id is not None:
+            while start > 0 and history[start][0] > det_frame_id:
+                start -= 1
+        if det_frame_id is None or history[start][0] > det_frame_id:
+            # detected before the oldest kept frame: seed where we are
+            self.stale_seeds += 1
+            start = len(history) - 1
+        boxes.seed(dets, history[start][1])
+        conf: List[float] = []
+        for i in range(start + 1, len(history)):
+            conf = boxes.step(history[i - 1][1], history[i][1])
+        return conf
+
+    def process(self, frame: np.ndarray, state: Dict[str, Any]) -> None:
+        gray = self._to_gray(frame)
+        prev = self._history[-1][1] if self._history else None
+        self._history.append((self.frame_id, gray))
+
+        conf: List[float] = []
+        for name, key, boxes in (("coco", "coco_dets", self.dets), ("face", "faces", self.faces)):
+            frame_id = state.get(f"{name}_frame_id")
+            if frame_id != self._seen[name]:
+                # fresh detector output: reseed on the frame it came from
+                self._seen[name] = frame_id
+                conf.extend(self._seed_at(boxes, state.get(key, []), frame_id))
+            elif prev is not None:
+                conf.extend(boxes.step(prev, gray))
+
+        confidence = min(conf) if conf else 1.0
+        state["flow_dets"] = self.dets.current()
+        state["flow_faces"] = self.faces.current()
+        state["flow_confidence"] = confidence
+
+        now = time.time()
+        if (
+            confidence < variables.FLOW_MIN_CONFIDENCE
+            and self.on_degraded is not None
+            and now - self._last_trigger >= variables.FLOW_TRIGGER_MIN_INTERVAL_S
+        ):
+            self._last_trigger = now
+            self.on_degraded()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Generic, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Packet(NamedTuple):
+    value: Any
+    ts: float   # capture timestamp (time.time())
+    seq: int    # monotonically increasing, 1 for the first value
+
+
+class LatestValueChannel(Generic[T]):
+    """
+    Single-slot channel that keeps ONLY the latest value.
+    - publish() overwrites the slot and wakes every waiting consumer
+    - wait_newer(seq) blocks until a value newer than `seq` exists
+    - consumers compare sequence numbers, never float timestamps
+    Optional reference counting (FramePool): publish() hands the producer's
+    reference to the channel, which calls release(old value) when it is
+    overwritten; every packet returned by latest()/wait_newer() has had
+    retain(value) called for the reader, who must release it when done.
+    """
+
+    def __init__(
+        self,
+        retain: Optional[Callable[[Any], None]] = None,
+        release: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._packet: Optional[Packet] = None
+        self._seq: int = 0
+        self._closed: bool = False
+        self._retain = retain
+        self._release = release
+
+    def publish(self, value: T, ts: Optional[float] = None) -> int:
+        with self._cond:
+            old = self._packet
+            self._seq += 1
+            self._packet = Packet(value, time.time() if ts is None else ts, self._seq)
+            if old is not None and self._release is not None:
+                self._release(old.value)
+            self._cond.notify_all()
+            return self._seq
+
+    def _take(self) -> Optional[Packet]:
+        # under the lock: the value can't be released between here and retain
+        if self._packet is not None and self._retain is not None:
+            self._retain(self._packet.value)
+        return self._packet
+
+    def latest(self) -> Optional[Packet]:
+        with self._cond:
+            return self._take()
+
+    def wait_newer(self, seq: int, timeout: Optional[float] = None) -> Optional[Packet]:
+        """
+        Returns the latest packet with packet.seq > seq, or None on timeout/close.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > seq or self._closed, timeout):
+                return None
+            if self._seq <= seq:
+                return None
+            return self._take()
+
+    def close(self) -> None:
+        """
+        Wakes all waiters; subsequent waits return None once drained.
+        """
+        with self._cond:
+            self._closed = True
+            if self._packet is not None and self._release is not None:
+                self._release(self._packet.value)
+                self._packet = None
+            self._cond.notify_all()
+
+    @property
+    def seq(self) -> int:
+        return self._seq
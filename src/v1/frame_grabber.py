@@ -5,6 +5,8 @@ import time
 from typing import Optional
 import variables
 import numpy as np
+from frame_channel import LatestValueChannel, Packet
+from frame_pool import FramePool
 
 
 class FrameGrabber:
@@ -12,16 +14,36 @@ class FrameGrabber:
     Grabs frames continuously from your Camera and stores ONLY the latest frame.
     - No queue growth
     - Inference always runs on the freshest frame (drops old frames automatically)
+    - Consumers block in wait_for_frame() and wake as soon as a frame lands
+    - With a frame pool (pool_size > 0) the camera writes into recycled
+      buffers: every frame returned by wait_for_frame()/get_latest() is
+      leased to the caller, who hands it back with release_frame()
+      (no per-frame allocation, no defensive copy)
     """
 
-    def __init__(self, cam, target_fps: float = variables.TARGET_FRAME_GRABBER_FPS, copy_frame: bool = variables.GRABBER_COPY_FRAME) -> None:
+    def __init__(
+        self,
+        cam,
+        target_fps: float = variables.TARGET_FRAME_GRABBER_FPS,
+        copy_frame: bool = variables.GRABBER_COPY_FRAME,
+        recorder=None,
+        pool_size: int = variables.FRAME_POOL_SIZE,
+    ) -> None:
         self.cam = cam
         self.target_fps = float(target_fps)
         self.copy_frame = bool(copy_frame)
+        # optional recording.Recorder; copies every published frame (written on its own thread)
+        self.recorder = recorder
 
-        self._lock = threading.Lock()
-        self._latest: Optional[np.ndarray] = None
-        self._latest_ts: float = 0.0
+        self.pool: Optional[FramePool] = FramePool(pool_size) if pool_size > 0 else None
+        if self.pool is not None:
+            self.channel: LatestValueChannel[np.ndarray] = LatestValueChannel(
+                retain=self.pool.retain, release=self.pool.release
+            )
+        else:
+            self.channel = LatestValueChannel()
+        # shape of the camera's frames, learned from the first one
+        self._shape: Optional[tuple] = None
 
         self._running = False
         self._thread: Optional[threading.Thread] = None
@@ -38,6 +60,7 @@ class FrameGrabber:
 
     def stop(self) -> None:
         self._running = False
+        self.channel.close()
         if self._thread is not None:
             self._thread.join(timeout=1.0)
         self._thread = None
@@ -47,31 +70,70 @@ class FrameGrabber:
         next_t = time.time()
 
         while self._running:
-            frame = self.cam.read()
-            if frame is None:
-                time.sleep(0.01)
-                continue
+            buf = None
+            if self.pool is not None and self._shape is not None:
+                buf = self.pool.acquire(self._shape)
+                if buf is None:
+                    # every buffer is still leased; skip this tick (counted as a drop)
+                    next_t = self._pace(next_t, min_dt)
+                    continue
 
-            # Optional copy if camera backend reuses buffers
-            if self.copy_frame:
+            frame = self.cam.read(out=buf)
+            if frame is None or frame is not buf:
+                # nothing read, or the camera could not fill the buffer
+                if buf is not None:
+                    self.pool.release(buf)
+                if frame is None:
+                    time.sleep(0.01)
+                    continue
+            if self._shape is None:
+                self._shape = frame.shape
+
+            # Optional copy if camera backend reuses buffers (pooled buffers are ours)
+            if self.copy_frame and buf is None:
                 frame = frame.copy()
 
-            with self._lock:
-                self._latest = frame
-                self._latest_ts = time.time()
-                self.frames_grabbed += 1
+            ts = time.time()
+            if self.recorder is not None:
+                self.recorder.write_frame(frame, ts)
+            # the grabber's reference moves to the channel
+            self.channel.publish(frame, ts)
+            self.frames_grabbed += 1
+
+            next_t = self._pace(next_t, min_dt)
+
+    @staticmethod
+    def _pace(next_t: float, min_dt: float) -> float:
+        next_t += min_dt
+        sleep_s = next_t - time.time()
+        if sleep_s > 0:
+            time.sleep(sleep_s)
+            return next_t
+        return time.time()
 
-            # pacing
-            next_t += min_dt
-            sleep_s = next_t - time.time()
-            if sleep_s > 0:
-                time.sleep(sleep_s)
-            else:
-                next_t = time.time()
+    def release_frame(self, frame: np.ndarray) -> None:
+        """
+        Hand back a frame obtained from wait_for_frame() / get_latest().
+        """
+        if self.pool is not None:
+            self.pool.release(frame)
+
+    def pool_metrics(self) -> dict:
+        return self.pool.metrics() if self.pool is not None else {}
 
     def get_latest(self) -> tuple[Optional[np.ndarray], float]:
         """
-        Returns (latest_frame_rgb, timestamp)
+        Returns (latest_frame_rgb, timestamp); release_frame() the frame when done.
+        """
+        pkt = self.channel.latest()
+        if pkt is None:
+            return None, 0.0
+        return pkt.value, pkt.ts
+
+    def wait_for_frame(self, last_seq: int, timeout: Optional[float] = None) -> Optional[Packet]:
+        """
+        Blocks until a frame newer than `last_seq` is available.
+        Returns Packet(frame_rgb, ts, seq) or None on timeout / stop;
+        release_frame() the frame when done.
         """
-        with self._lock:
-            return self._latest, self._latest_ts
+        return self.channel.wait_newer(last_seq, timeout)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class FramePool:
+    """
+    Fixed set of preallocated frame buffers, recycled by reference count.
+    - acquire(): a free buffer with refcount 1 (the grabber's reference), or
+      None when every buffer is still referenced (counted as a drop)
+    - retain(frame) / release(frame): +1 / -1; the buffer is free again at 0
+    Buffers are identified by the array object itself, so the frame that
+    travels through channels and workers is the plain ndarray. retain /
+    release of arrays that aren't from the pool are no-ops.
+    Buffers are allocated on the first acquire() for the shape the camera
+    reports.
+    """
+
+    def __init__(self, size: int, shape: Optional[Tuple[int, ...]] = None, dtype=np.uint8) -> None:
+        self.size = max(2, int(size))
+        self.dtype = np.dtype(dtype)
+        self.shape: Optional[Tuple[int, ...]] = None
+        self._lock = threading.Lock()
+        self._buffers: List[np.ndarray] = []
+        self._slot: Dict[int, int] = {}
+        self._refs: List[int] = [0] * self.size
+        self._next = 0
+        # metrics
+        self.acquired = 0
+        self.drops = 0
+        self.peak_leased = 0
+        if shape is not None:
+            self._allocate(tuple(shape))
+
+    def _allocate(self, shape: Tuple[int, ...]) -> None:
+        self.shape = shape
+        self._buffers = [np.empty(shape, dtype=self.dtype) for _ in range(self.size)]
+        self._slot = {id(b): i for i, b in enumerate(self._buffers)}
+
+    def acquire(self, shape: Tuple[int, ...]) -> Optional[np.ndarray]:
+        with self._lock:
+            if self.shape is None:
+                self._allocate(tuple(shape))
+            elif tuple(shape) != self.shape:
+                raise ValueError(f"frame shape {tuple(shape)} does not match pool {self.shape}")
+            # round-robin from the last handed-out buffer: the oldest frames
+            # are the most likely to be free
+            for k in range(self.size):
+                i = (self._next + k) % self.size
+                if self._refs[i] == 0:
+                    self._next = (i + 1) % self.size
+                    self._refs[i] = 1
+                    self.acquired += 1
+                    self.peak_leased = max(self.peak_leased, self.leased)
+                    return self._buffers[i]
+            self.drops += 1
+            return None
+
+    def retain(self, frame) -> None:
+        with self._lock:
+            i = self._slot.get(id(frame))
+            if i is not None and self._buffers[i] is frame:
+                self._refs[i] += 1
+
+    def release(self, frame) -> None:
+        with self._lock:
+            i = self._slot.get(id(frame))
+            if i is not None and self._buffers[i] is frame and self._refs[i] > 0:
+                self._refs[i] -= 1
+
+    @property
+    def leased(self) -> int:
+        """
+        Buffers with at least one reference.
+        """
+        return sum(1 for r in self._refs if r > 0)
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "leased": self.leased,
+                "leases": sum(self._refs),
+                "peak_leased": self.peak_leased,
+                "acquired": self.acquired,
+                "drops": self.drops,
+            }
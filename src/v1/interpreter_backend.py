@@ -1,25 +1,161 @@
 from __future__ import annotations
-from typing import Optional
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 
-def make_interpreter(model_path: str, num_threads: int = 2, force: Optional[str] = None):
+import numpy as np
+
+import variables
+
+
+# -----------------------------
+# Load / warm-up stats
+# -----------------------------
+@dataclass
+class InterpreterStats:
+    """
+    One make_interpreter() call.
+    - read_ms          : reading the model file (0 when the bytes were cached)
+    - load_ms          : building the interpreter + allocate_tensors
+    - first_invoke_ms  : first warm-up invoke (lazy kernel / XNNPACK setup)
+    - warm_invoke_ms   : mean of the remaining warm-up invokes (steady state)
+    """
+    model: str
+    backend: str
+    threads: int
+    xnnpack: bool
+    read_ms: float
+    load_ms: float
+    warmup_runs: int
+    first_invoke_ms: float
+    warm_invoke_ms: float
+
+    def summary(self) -> str:
+        s = (
+            f"{self.model} [{self.backend} t{self.threads} xnnpack={'on' if self.xnnpack else 'off'}] "
+            f"read {self.read_ms:.1f}ms load {self.load_ms:.1f}ms"
+        )
+        if self.warmup_runs:
+            s += f" warm-up {self.warmup_runs}x first {self.first_invoke_ms:.1f}ms"
+            if self.warmup_runs > 1:
+                s += f" then {self.warm_invoke_ms:.1f}ms"
+        return s
+
+
+# every interpreter built in this process, in creation order
+LOAD_STATS: List[InterpreterStats] = []
+
+# model path -> file contents; interpreters are built from memory so the same
+# model (face short/back, coco thread-count rebuilds) is only read once
+_MODEL_BYTES: Dict[str, bytes] = {}
+_MODEL_LOCK = threading.Lock()
+
+
+def model_bytes(model_path: str) -> bytes:
+    with _MODEL_LOCK:
+        data = _MODEL_BYTES.get(model_path)
+        if data is None:
+            with open(model_path, "rb") as f:
+                data = f.read()
+            _MODEL_BYTES[model_path] = data
+        return data
+
+
+# -----------------------------
+# Backend selection
+# -----------------------------
+def _interpreter_class(force: Optional[str]):
     """
     force:
       - "runtime": use tflite-runtime only
       - "tf": use tensorflow tflite only
-      - None: try runtime, fall back to tf
+      - None / "auto": try runtime, fall back to tf
     """
     if force == "runtime":
         from tflite_runtime.interpreter import Interpreter
-        return Interpreter(model_path=model_path, num_threads=num_threads)
+        return Interpreter, "runtime"
 
     if force == "tf":
         from tensorflow.lite.python.interpreter import Interpreter
-        return Interpreter(model_path=model_path, num_threads=num_threads)
+        return Interpreter, "tf"
 
     # auto
     try:
         from tflite_runtime.interpreter import Interpreter
-        return Interpreter(model_path=model_path, num_threads=num_threads)
+        return Interpreter, "runtime"
     except Exception:
         from tensorflow.lite.python.interpreter import Interpreter
-        return Interpreter(model_path=model_path, num_threads=num_threads)
+        return Interpreter, "tf"
+
+
+def _build(Interpreter, data: bytes, num_threads: int, xnnpack: bool):
+    if xnnpack:
+        return Interpreter(model_content=data, num_threads=num_threads)
+    # XNNPACK is applied as a default delegate; the builtin resolver without
+    # default delegates turns it off (TF >= 2.7 / matching tflite-runtime)
+    resolver = sys.modules[Interpreter.__module__].OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    return Interpreter(model_content=data, num_threads=num_threads, experimental_op_resolver_type=resolver)
+
+
+def warm_up(interp, runs: int) -> List[float]:
+    """
+    Invoke `runs` times on zero inputs; returns the per-invoke ms.
+    Tensors must be allocated.
+    """
+    for d in interp.get_input_details():
+        interp.set_tensor(d["index"], np.zeros(d["shape"], dtype=d["dtype"]))
+    times: List[float] = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        interp.invoke()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return times
+
+
+# -----------------------------
+# Factory
+# -----------------------------
+def make_interpreter(
+    model_path: str,
+    num_threads: Optional[int] = None,
+    force: Optional[str] = variables.INTERPRETER_MODE,
+    xnnpack: Optional[bool] = None,
+    warmup_runs: Optional[int] = None,
+):
+    """
+    Build an allocated (and warmed-up) interpreter for `model_path`.
+    Defaults come from variables: TFLITE_THREADS, INTERPRETER_MODE,
+    TFLITE_XNNPACK, INTERPRETER_WARMUP_RUNS. Timings go to LOAD_STATS and,
+    with INTERPRETER_LOG, to stdout.
+    """
+    num_threads = variables.TFLITE_THREADS if num_threads is None else max(1, int(num_threads))
+    xnnpack = variables.TFLITE_XNNPACK if xnnpack is None else xnnpack
+    warmup_runs = variables.INTERPRETER_WARMUP_RUNS if warmup_runs is None else warmup_runs
+
+    Interpreter, backend = _interpreter_class(force)
+    t0 = time.perf_counter()
+    cached = model_path in _MODEL_BYTES
+    data = model_bytes(model_path)
+    t1 = time.perf_counter()
+    interp = _build(Interpreter, data, num_threads, xnnpack)
+    interp.allocate_tensors()
+    t2 = time.perf_counter()
+    times = warm_up(interp, warmup_runs) if warmup_runs > 0 else []
+
+    stats = InterpreterStats(
+        model=model_path,
+        backend=backend,
+        threads=num_threads,
+        xnnpack=xnnpack,
+        read_ms=0.0 if cached else (t1 - t0) * 1000.0,
+        load_ms=(t2 - t1) * 1000.0,
+        warmup_runs=len(times),
+        first_invoke_ms=times[0] if times else 0.0,
+        warm_invoke_ms=float(np.mean(times[1:])) if len(times) > 1 else 0.0,
+    )
+    LOAD_STATS.append(stats)
+    if variables.INTERPRETER_LOG:
+        print(f"[MODEL] {stats.summary()}")
+    return interp
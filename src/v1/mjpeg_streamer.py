@@ -3,21 +3,279 @@ import threading
 import time
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, Optional, Set
 import cv2
 import variables
 import numpy as np
 
+VIEW_HTML = b"""<html>
+<head>
+    <title>PathPal Stream</title>
+    <style>
+    html, body {
+        margin: 0; padding: 0; background: #000; height: 100%;
+        display: flex; align-items: center; justify-content: center;
+    }
+    img {
+        width: 100vw;
+        height: 100vh;
+        object-fit: contain;
+    }
+    </style>
+</head>
+<body>
+    <img src="/stream.mjpg" />
+</body>
+</html>
+"""
+
+
 class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
     daemon_threads = True
     allow_reuse_address = True
 
+
+class _ClientSlot:
+    """
+    Latest-chunk mailbox of one viewer (bounded to one chunk: a slow client
+    skips frames instead of queueing them).
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._chunk: Optional[bytes] = None
+        self._closed = False
+        self.sent = 0
+        self.skipped = 0
+        self.connected_ts = time.time()
+
+    def put(self, chunk: bytes) -> None:
+        with self._cond:
+            if self._chunk is not None:
+                self.skipped += 1
+            self._chunk = chunk
+            self._cond.notify()
+
+    def take(self, timeout: float) -> Optional[bytes]:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._chunk is not None or self._closed, timeout):
+                return None
+            chunk, self._chunk = self._chunk, None
+            return chunk
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+
+class EncodedFeed:
+    """
+    One MJPEG feed: latest frame in, one JPEG per new frame out.
+    - update_bgr / update_rgb copy the frame in (resized by `scale`) and
+      bump its version
+    - the encoder thread encodes each new version once (at most `fps`),
+      wraps it as a multipart chunk and hands it to on_chunk(feed, chunk)
+    - nothing is encoded while wanted() is False: no viewer subscribed and
+      no one-shot request (`pending`, e.g. a snapshot) waiting
+    """
+
+    def __init__(
+        self,
+        name: str,
+        jpeg_quality: int,
+        fps: float,
+        scale: float = 1.0,
+        on_chunk: Optional[Callable[["EncodedFeed", bytes], None]] = None,
+    ) -> None:
+        self.name = name
+        self.jpeg_quality = int(jpeg_quality)
+        self.fps = float(fps)
+        self.scale = float(scale)
+        self.on_chunk = on_chunk
+
+        # frame hand-off: update_*() writes `_back`, the encoder swaps it
+        # with `_front` and encodes that, so neither side waits on the other
+        self._cond = threading.Condition(threading.Lock())
+        self._back: Optional[np.ndarray] = None
+        self._front: Optional[np.ndarray] = None
+        self._version: int = 0
+        self._encoded_version: int = 0
+        self._next_update_t: float = 0.0
+        self.latest_chunk: Optional[bytes] = None
+        self.latest_jpeg: Optional[bytes] = None
+        self.latest_ts: float = 0.0
+
+        # viewers (server-specific client objects with sent / skipped /
+        # connected_ts); the set is only mutated under clients_lock
+        self.clients_lock = threading.Lock()
+        self.clients: Set[Any] = set()
+        self.pending: int = 0
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        # encoder stats
+        self.encoded: int = 0
+        self.encode_cpu_s: float = 0.0
+        self.encode_wall_s: float = 0.0
+
+    def wanted(self) -> bool:
+        return len(self.clients) > 0 or self.pending > 0
+
+    def due(self) -> bool:
+        """
+        wanted() and at least 1/fps since the last update: frames rendered
+        faster than the encoder takes them would only be overwritten.
+        """
+        return self.wanted() and time.time() >= self._next_update_t
+
+    def wake(self) -> None:
+        """
+        Re-check wanted() now (call after adding a client / pending request).
+        """
+        with self._cond:
+            self._cond.notify_all()
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._encode_loop, daemon=True, name=f"mjpeg-{self.name}")
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self.wake()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    # -----------------------------
+    # frames in
+    # -----------------------------
+    def update_rgb(self, frame_rgb: np.ndarray) -> None:
+        """
+        Accept RGB frame and store internally as BGR for OpenCV encode.
+        """
+        self._store(frame_rgb, cv2.COLOR_RGB2BGR)
+
+    def update_bgr(self, frame_bgr: np.ndarray) -> None:
+        """
+        Accept BGR frame and store internally as BGR (copied: the caller may
+        reuse its buffer).
+        """
+        self._store(frame_bgr, None)
+
+    def _store(self, frame: np.ndarray, code: Optional[int]) -> None:
+        if frame is None:
+            return
+        h, w = frame.shape[:2]
+        size = (w, h)
+        if self.scale != 1.0:
+            size = (max(1, int(round(w * self.scale))), max(1, int(round(h * self.scale))))
+        with self._cond:
+            if self._back is None or self._back.shape[:2] != (size[1], size[0]):
+                self._back = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            if size != (w, h):
+                cv2.resize(frame, size, dst=self._back, interpolation=cv2.INTER_AREA)
+                if code is not None:
+                    cv2.cvtColor(self._back, code, dst=self._back)
+            elif code is not None:
+                cv2.cvtColor(frame, code, dst=self._back)
+            else:
+                np.copyto(self._back, frame)
+            self._version += 1
+            self._next_update_t = time.time() + 1.0 / max(self.fps, 0.1)
+            self._cond.notify_all()
+
+    # -----------------------------
+    # encoder
+    # -----------------------------
+    def _encode_latest(self, bgr: np.ndarray) -> Optional[bytes]:
+        """
+        Encode BGR frame to JPEG.
+        """
+        ok, buf = cv2.imencode(
+            ".jpg",
+            bgr,
+            [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality],
+        )
+        if not ok:
+            return None
+        return buf.tobytes()
+
+    def _encode_loop(self) -> None:
+        min_dt = 1.0 / max(self.fps, 0.1)
+        next_t = 0.0
+        while self._running:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: not self._running or (self._version > self._encoded_version and self.wanted()),
+                    timeout=0.5,
+                )
+                if not self._running or self._version <= self._encoded_version or not self.wanted():
+                    continue
+            # throttle to fps; frames arriving meanwhile just replace `_back`
+            wait_s = next_t - time.time()
+            if wait_s > 0:
+                time.sleep(wait_s)
+            with self._cond:
+                self._back, self._front = self._front, self._back
+                version = self._version
+
+            t0, c0 = time.time(), time.thread_time()
+            jpg = self._encode_latest(self._front)
+            if jpg is None:
+                continue
+            chunk = b"".join((
+                b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: ",
+                str(len(jpg)).encode("ascii"),
+                b"\r\n\r\n",
+                jpg,
+                b"\r\n",
+            ))
+            self.encode_cpu_s += time.thread_time() - c0
+            self.encode_wall_s += time.time() - t0
+            self.encoded += 1
+            next_t = t0 + min_dt
+
+            with self._cond:
+                self._encoded_version = version
+                self.latest_chunk = chunk
+                self.latest_jpeg = jpg
+                self.latest_ts = time.time()
+            if self.on_chunk is not None:
+                self.on_chunk(self, chunk)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.clients_lock:
+            clients = list(self.clients)
+        now = time.time()
+        return {
+            "clients": len(clients),
+            "scale": self.scale,
+            "fps": self.fps,
+            "encoded": self.encoded,
+            "encode_ms_mean": self.encode_wall_s * 1000.0 / max(self.encoded, 1),
+            "encode_cpu_s": self.encode_cpu_s,
+            "client_fps": [c.sent / max(now - c.connected_ts, 1e-6) for c in clients],
+            "client_skipped": [c.skipped for c in clients],
+        }
+
+
 class MjpegStreamer:
     """
     Minimal MJPEG streamer
-    - update_rgb(frame_rgb) stores latest frame
-    - HTTP clients connect to /stream.mjpg (or /) and receives MJPEG
-    - encodes JPEG only if at least one client is connected
+    - one EncodedFeed per named target (variables.STREAM_TARGETS), served
+      at /stream/<name>.mjpg; /stream.mjpg is "annotated", /raw.mjpg "raw"
+    - each feed has its own scale / JPEG quality / fps cap and an encoder
+      thread that idles while nobody watches; callers render into a feed
+      only while due(name) (subscribed and its fps cap allows a new frame)
+    - update_bgr(frame_bgr) / update_rgb(frame_rgb, feed=...) copy the
+      latest frame of a feed in
+    - every new frame is encoded once and the finished multipart chunk is
+      handed to every viewer's slot; HTTP clients get one write per frame
     """
 
     def __init__(
@@ -26,22 +284,34 @@ class MjpegStreamer:
         port: int = variables.STREAM_PORT,
         jpeg_quality: int = variables.STREAM_JPEG_QUALITY,
         stream_fps: float = variables.STREAM_FPS,
+        targets: Optional[Dict[str, Dict[str, float]]] = None,
             ) -> None:
         self.host = host
         self.port = port
-        self.jpeg_quality = int(jpeg_quality)
-        self.stream_fps = float(stream_fps)
-
-        self._lock = threading.Lock()
-        self._latest_bgr: Optional[np.ndarray] = None
-        self._latest_jpeg: Optional[bytes] = None
-        self._latest_jpeg_ts: float = 0.0
+        targets = dict(variables.STREAM_TARGETS if targets is None else targets)
+        # jpeg_quality / stream_fps keep configuring the annotated stream
+        targets["annotated"] = {**targets.get("annotated", {}), "quality": jpeg_quality, "fps": stream_fps}
+        self.feeds: Dict[str, EncodedFeed] = {
+            name: EncodedFeed(
+                name,
+                int(cfg.get("quality", jpeg_quality)),
+                float(cfg.get("fps", stream_fps)),
+                scale=float(cfg.get("scale", 1.0)),
+                on_chunk=self._publish,
+            )
+            for name, cfg in targets.items()
+        }
+        self.paths: Dict[str, str] = {f"/stream/{name}.mjpg": name for name in self.feeds}
+        self.paths["/stream.mjpg"] = "annotated"
+        if "raw" in self.feeds:
+            self.paths["/raw.mjpg"] = "raw"
 
         self._running: bool = False
         self._server: Optional[_ThreadingHTTPServer] = None
         self._thread: Optional[threading.Thread] = None
 
-        self._clients: int = 0
+        # last telemetry snapshot pushed by the main loop (served as JSON)
+        self._telemetry: Dict[str, Any] = {}
 
     def start(self) -> None:
         if self._running:
@@ -53,27 +323,7 @@ class MjpegStreamer:
         class Handler(BaseHTTPRequestHandler):
             def do_GET(self) -> None:
                 if self.path in ("/view", "/"):
-                    html = f"""
-                    <html>
-                    <head>
-                        <title>PathPal Stream</title>
-                        <style>
-                        html, body {{
-                            margin: 0; padding: 0; background: #000; height: 100%;
-                            display: flex; align-items: center; justify-content: center;
-                        }}
-                        img {{
-                            width: 100vw;
-                            height: 100vh;
-                            object-fit: contain;
-                        }}
-                        </style>
-                    </head>
-                    <body>
-                        <img src="/stream.mjpg" />
-                    </body>
-                    </html>
-                    """.encode("utf-8")
+                    html = VIEW_HTML
 
                     self.send_response(200)
                     self.send_header("Content-Type", "text/html; charset=utf-8")
@@ -82,12 +332,13 @@ class MjpegStreamer:
                     self.wfile.write(html)
                     return
 
-                if self.path != "/stream.mjpg":
+                feed = streamer.feeds.get(streamer.paths.get(self.path, ""))
+                if feed is None:
                     self.send_response(404)
                     self.end_headers()
                     return
 
-                streamer._clients += 1
+                slot = streamer._add_client(feed)
                 try:
                     self.send_response(200)
                     self.send_header("Age", "0")
@@ -96,102 +347,120 @@ class MjpegStreamer:
                     self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
                     self.end_headers()
 
-                    frame_interval = 1.0 / max(streamer.stream_fps, 0.1)
-
                     while streamer._running:
-                        jpg = streamer._get_latest_jpeg()
-                        if jpg is None:
-                            time.sleep(0.02)
+                        chunk = slot.take(timeout=0.5)
+                        if chunk is None:
                             continue
-
                         try:
-                            self.wfile.write(b"--frame\r\n")
-                            self.wfile.write(b"Content-Type: image/jpeg\r\n")
-                            self.wfile.write(f"Content-Length: {len(jpg)}\r\n\r\n".encode("ascii"))
-                            self.wfile.write(jpg)
-                            self.wfile.write(b"\r\n")
-                            time.sleep(frame_interval)
+                            # boundary + headers + JPEG in one write
+                            self.wfile.write(chunk)
+                            slot.sent += 1
                         except (BrokenPipeError, ConnectionResetError):
                             break
                 finally:
-                    streamer._clients -= 1
+                    streamer._remove_client(feed, slot)
             def log_message(self, format, *args) -> None:
                 return
         self._server = _ThreadingHTTPServer((self.host, self.port), Handler)
+        # port 0 picks a free port
+        self.port = self._server.server_address[1]
         self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
         self._thread.start()
+        for feed in self.feeds.values():
+            feed.start()
 
     def stop(self) -> None:
         self._running = False
+        for feed in self.feeds.values():
+            with feed.clients_lock:
+                for slot in feed.clients:
+                    slot.close()
         if self._server is not None:
             self._server.shutdown()
             self._server.server_close()
             self._server = None
+        for feed in self.feeds.values():
+            feed.stop()
         self._thread = None
 
-    def has_clients(self) -> bool:
-        return self._clients > 0
+    # -----------------------------
+    # clients
+    # -----------------------------
+    def _add_client(self, feed: EncodedFeed) -> _ClientSlot:
+        slot = _ClientSlot()
+        with feed.clients_lock:
+            feed.clients.add(slot)
+        feed.wake()
+        # a new viewer gets the last encoded frame right away
+        chunk = feed.latest_chunk
+        if chunk is not None:
+            slot.put(chunk)
+        return slot
 
-    def update_rgb(self, frame_rgb: np.ndarray) -> None:
-        """
-        Accept RGB frame and store internally as BGR for OpenCV encode.
-        """
-        if frame_rgb is None:
-            return
-        frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
-        with self._lock:
-            self._latest_bgr = frame_bgr
+    def _remove_client(self, feed: EncodedFeed, slot: _ClientSlot) -> None:
+        with feed.clients_lock:
+            feed.clients.discard(slot)
 
-    def update_bgr(self, frame_bgr: np.ndarray) -> None:
+    def has_clients(self) -> bool:
         """
-        Accept BGR frame and store internally as BGR.
+        Someone wants annotated frames (the main loop only draws then).
         """
-        if frame_bgr is None:
-            return
-        with self._lock:
-            self._latest_bgr = frame_bgr
-    def _encode_latest(self, bgr: np.ndarray) -> Optional[bytes]:
-        """
-        Encode BGR frame to JPEG.
-        """
-        ok, buf = cv2.imencode(
-            ".jpg",
-            bgr,
-            [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality],
-        )
-        if not ok:
-            return None
-        return buf.tobytes()
+        return self.feeds["annotated"].wanted()
+
+    def wants(self, feed: str) -> bool:
+        f = self.feeds.get(feed)
+        return f is not None and f.wanted()
 
-    def _get_latest_jpeg(self) -> Optional[bytes]:
+    def due(self, feed: str) -> bool:
         """
-        Returns cached JPEG; re-encodes at most at stream_fps.
-        Encodes only if at least one client is connected.
+        A frame rendered for `feed` now would be streamed (someone is
+        subscribed and the feed's fps cap allows a new frame).
         """
-        if not self.has_clients():
-            return None
+        f = self.feeds.get(feed)
+        return f is not None and f.due()
 
-        now = time.time()
-        min_dt = 1.0 / max(self.stream_fps, 0.1)
+    def has_event_clients(self) -> bool:
+        # no event stream on the threaded server
+        return False
 
-        with self._lock:
-            bgr = self._latest_bgr
-            jpg = self._latest_jpeg
-            ts = self._latest_jpeg_ts
+    # -----------------------------
+    # frames / events in
+    # -----------------------------
+    def update_rgb(self, frame_rgb: np.ndarray, feed: str = "annotated") -> None:
+        self.feeds[feed].update_rgb(frame_rgb)
 
-        if bgr is None:
-            return None
+    def update_bgr(self, frame_bgr: np.ndarray, feed: str = "annotated") -> None:
+        self.feeds[feed].update_bgr(frame_bgr)
 
-        # throttle encoding
-        if jpg is not None and (now - ts) < min_dt:
-            return jpg
+    def publish_event(self, event: Dict[str, Any]) -> None:
+        return
 
-        new_jpg = self._encode_latest(bgr)
-        if new_jpg is None:
-            return None
+    def _publish(self, feed: EncodedFeed, chunk: bytes) -> None:
+        """
+        Hand a finished multipart chunk to every viewer of `feed` (encoder
+        thread).
+        """
+        with feed.clients_lock:
+            clients = list(feed.clients)
+        for slot in clients:
+            slot.put(chunk)
+
+    # -----------------------------
+    # telemetry
+    # -----------------------------
+    def set_telemetry(self, telemetry: Dict[str, Any]) -> None:
+        """
+        Latest pipeline state for the JSON endpoint (replaced, not copied:
+        pass a fresh dict each time).
+        """
+        self._telemetry = telemetry
 
-        with self._lock:
-            self._latest_jpeg = new_jpg
-            self._latest_jpeg_ts = now
+    def telemetry(self) -> Dict[str, Any]:
+        return self._telemetry
 
-        return new_jpg
\ No newline at end of file
+    def stats(self) -> Dict[str, Any]:
+        feeds = {name: feed.stats() for name, feed in self.feeds.items()}
+        return {
+            "clients": sum(f["clients"] for f in feeds.values()),
+            "feeds": feeds,
+        }
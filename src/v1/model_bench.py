@@ -0,0 +1,357 @@
+"""
+Detector model selection benchmark.
+
+Runs every configured COCO model (variables.py paths) over recorded frames
+and reports, per model:
+- load / warm-up time (interpreter_backend.LOAD_STATS)
+- preprocess / invoke / decode / NMS latency percentiles (CocoDetector.last_timings)
+- peak RSS of the process that ran the model
+- with a ground-truth file: per-class precision / recall of the detections
+  that pass COCO_THRESHOLDS (IoU >= --iou with a same-label GT box)
+
+Each model runs in its own spawned process so peak RSS is per model and one
+model's arena doesn't inflate the next.
+
+Frames come from a directory of loose images (jpg/png/bmp) or a Recorder
+directory (meta.json, index.bin, frames.mjpg / frames.raw).
+
+Ground truth JSON: {"<frame name>": [{"label": "person", "bbox": [x1, y1, x2, y2]}, ...]}
+(pixel coordinates of the frame as stored). The frame name is the file name
+for loose images and the frame index ("0", "1", ...) for a recording.
+Frames without an entry are not scored.
+
+Run from src/v1:
+    python -m perf bench --frames recordings/frames [--threads 3] [--gt gt.json]
+    python -m perf bench --frames recordings/walk1 [--limit 300]
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+import variables
+
+
+# detector models from variables.py, with the input spec used when the model
+# file or a TFLite runtime is not available: (path, H, W, dtype, (scale, zero_point))
+BENCH_MODELS = {
+    "ssd_mobilenet_v1": (variables.COCO_SSD_MOBILENET_V1_PATH, 300, 300, np.uint8, (0.0078125, 128)),
+    "ssd_mobilenet_v3_large": (variables.COCO_SSD_MOBILENET_V3_LARGE_PATH, 320, 320, np.float32, (0.0, 0)),
+    "efficientdet_lite0": (variables.EFFICIENTDET_V0_PATH, 320, 320, np.uint8, (0.0078125, 127)),
+    "efficientdet_lite1": (variables.EFFICIENTDET_V1_PATH, 384, 384, np.uint8, (0.0078125, 127)),
+    "efficientdet_lite2": (variables.EFFICIENTDET_V2_PATH, 448, 448, np.uint8, (0.0078125, 127)),
+}
+STAGES = ("preprocess", "invoke", "decode", "nms")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+# -----------------------------
+# Frames / ground truth
+# -----------------------------
+def is_recording(path: str) -> bool:
+    return os.path.exists(os.path.join(path, "meta.json")) and os.path.exists(os.path.join(path, "index.bin"))
+
+
+class FrameSet:
+    """
+    The benchmark frames of a directory, by name (the ground-truth key):
+    - a Recorder directory: frame index as a string, decoded from the recording
+    - otherwise: the image files, sorted by name
+    Only the directory and names are pickled; each bench process opens the
+    recording itself.
+    """
+
+    def __init__(self, frames_dir: str, limit: Optional[int] = None) -> None:
+        self.frames_dir = frames_dir
+        self.recording = is_recording(frames_dir)
+        self._rec = None
+        if self.recording:
+            names = [str(i) for i in range(len(self._open()))]
+        else:
+            names = sorted(n for n in os.listdir(frames_dir) if n.lower().endswith(IMAGE_EXTS))
+        self.names = names[:limit] if limit else names
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {**self.__dict__, "_rec": None}
+
+    def _open(self):
+        if self._rec is None:
+            from recording import Recording
+            self._rec = Recording(self.frames_dir)
+        return self._rec
+
+    def load(self, i: int) -> np.ndarray:
+        """
+        RGB uint8 frame `i` of `names`.
+        """
+        if self.recording:
+            return self._open().frame(int(self.names[i]))
+        return load_rgb(os.path.join(self.frames_dir, self.names[i]))
+
+
+def load_rgb(path: str) -> np.ndarray:
+    bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError(f"cannot read frame {path}")
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+def load_ground_truth(path: str) -> Dict[str, List[Tuple[str, Tuple[float, float, float, float]]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    return {
+        os.path.basename(name): [(str(o["label"]), tuple(float(v) for v in o["bbox"])) for o in objs]
+        for name, objs in raw.items()
+    }
+
+
+# -----------------------------
+# Scoring
+# -----------------------------
+def _iou(a: Sequence[float], b: Sequence[float]) -> float:
+    iw = min(a[2], b[2]) - max(a[0], b[0])
+    ih = min(a[3], b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_frame(dets: Sequence[Tuple[str, float, Sequence[float]]], gt: Sequence[Tuple[str, Sequence[float]]], iou_thresh: float) -> Dict[str, List[int]]:
+    """
+    Greedy by score: each detection takes the best unmatched same-label GT box.
+    Returns {label: [tp, fp, fn]}.
+    """
+    counts: Dict[str, List[int]] = {}
+    used = [False] * len(gt)
+    for label, _, box in sorted(dets, key=lambda d: -d[1]):
+        c = counts.setdefault(label, [0, 0, 0])
+        best, best_iou = -1, iou_thresh
+        for j, (g_label, g_box) in enumerate(gt):
+            if used[j] or g_label != label:
+                continue
+            iou = _iou(box, g_box)
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best >= 0:
+            used[best] = True
+            c[0] += 1
+        else:
+            c[1] += 1
+    for j, (g_label, _) in enumerate(gt):
+        if not used[j]:
+            counts.setdefault(g_label, [0, 0, 0])[2] += 1
+    return counts
+
+
+def precision_recall(counts: Dict[str, List[int]]) -> Dict[str, Dict[str, float]]:
+    out: Dict[str, Dict[str, float]] = {}
+    for label in sorted(counts):
+        tp, fp, fn = counts[label]
+        out[label] = {
+            "tp": tp,
+            "fp": fp,
+            "fn": fn,
+            "precision": tp / (tp + fp) if tp + fp else 0.0,
+            "recall": tp / (tp + fn) if tp + fn else 0.0,
+            "threshold": variables.COCO_THRESHOLDS.get(label, variables.COCO_DEFAULT_THRESH),
+        }
+    return out
+
+
+# -----------------------------
+# One model (runs in a child process)
+# -----------------------------
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not len(values):
+        return {"n": 0}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "n": int(arr.size),
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p90": float(np.percentile(arr, 90)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+    }
+
+
+def bench_model(
+    name: str,
+    model_path: str,
+    frames: FrameSet,
+    threads: int,
+    labels_path: str,
+    gt: Optional[Dict[str, list]] = None,
+    iou_thresh: float = 0.5,
+) -> Dict[str, Any]:
+    import interpreter_backend
+    from coco_detector import CocoDetector
+    from labels import load_labels
+
+    rss_start = _peak_rss_mb()
+    variables.TFLITE_THREADS = threads
+    variables.INTERPRETER_LOG = False
+    variables.DEBUG = False
+    det = CocoDetector(model_path, load_labels(labels_path))
+    load = interpreter_backend.LOAD_STATS[-1]
+
+    stages: Dict[str, List[float]] = {s: [] for s in STAGES}
+    total: List[float] = []
+    counts: Dict[str, List[int]] = {}
+    n_dets = 0
+    for i, key in enumerate(frames.names):
+        rgb = frames.load(i)
+        batch = det.infer_batch(rgb)
+        for s in STAGES:
+            stages[s].append(det.last_timings[s])
+        total.append(sum(det.last_timings.values()))
+        n_dets += len(batch)
+
+        if gt is not None and key in gt:
+            dets = [(d.label, d.score, d.bbox) for d in batch.dets]
+            for label, (tp, fp, fn) in match_frame(dets, gt[key], iou_thresh).items():
+                c = counts.setdefault(label, [0, 0, 0])
+                c[0] += tp
+                c[1] += fp
+                c[2] += fn
+
+    result: Dict[str, Any] = {
+        "model": name,
+        "path": model_path,
+        "status": "ok",
+        "threads": threads,
+        "input": [int(det.in_h), int(det.in_w), str(np.dtype(det.in_details["dtype"]))],
+        "frames": len(frames),
+        "detections_per_frame": n_dets / max(len(frames), 1),
+        "load_ms": load.read_ms + load.load_ms,
+        "warmup_first_ms": load.first_invoke_ms,
+        "latency_ms": {s: _percentiles(v) for s, v in stages.items()},
+        "total_ms": _percentiles(total),
+        "rss_start_mb": rss_start,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    if gt is not None:
+        result["per_class"] = precision_recall(counts)
+    return result
+
+
+def _bench_child(*args) -> Dict[str, Any]:
+    try:
+        return bench_model(*args)
+    except Exception as e:
+        return {"model": args[0], "path": args[1], "status": f"error: {type(e).__name__}: {e}"}
+
+
+# -----------------------------
+# All models
+# -----------------------------
+def run(
+    frames_dir: str,
+    threads: int = variables.TFLITE_THREADS,
+    models: Optional[Sequence[str]] = None,
+    gt_path: Optional[str] = None,
+    labels_path: str = variables.COCO_LABELS_PATH,
+    iou_thresh: float = 0.5,
+    limit: Optional[int] = None,
+    tag: str = "",
+) -> Dict[str, Any]:
+    unknown = [name for name in models or () if name not in BENCH_MODELS]
+    if unknown:
+        raise ValueError(f"unknown model(s): {', '.join(unknown)}")
+    frames = FrameSet(frames_dir, limit)
+    if not len(frames):
+        raise SystemExit(f"no frames in {frames_dir}")
+    gt = load_ground_truth(gt_path) if gt_path else None
+
+    results: List[Dict[str, Any]] = []
+    ctx = multiprocessing.get_context("spawn")
+    for name in models or list(BENCH_MODELS):
+        path = BENCH_MODELS[name][0]
+        if not os.path.exists(path):
+            results.append({"model": name, "path": path, "status": "missing"})
+            continue
+        # fresh process per model: independent peak RSS, no shared arenas
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+            results.append(ex.submit(_bench_child, name, path, frames, threads, labels_path, gt, iou_thresh).result())
+
+    return {
+        "meta": {
+            "tag": tag,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": platform.node(),
+            "machine": platform.machine(),
+            "python": platform.python_version(),
+            "interpreter_mode": variables.INTERPRETER_MODE,
+            "xnnpack": variables.TFLITE_XNNPACK,
+            "threads": threads,
+            "frames_dir": frames_dir,
+            "frames_source": "recording" if frames.recording else "images",
+            "frames": len(frames),
+            "ground_truth": gt_path,
+            "iou": iou_thresh,
+        },
+        "results": results,
+    }
+
+
+def to_markdown(report: Dict[str, Any]) -> str:
+    meta = report["meta"]
+    lines = [
+        f"## Detector benchmark {meta['tag']}".rstrip(),
+        "",
+        f"{meta['time']} on {meta['host']} ({meta['machine']}), {meta['frames']} frames, "
+        f"{meta['threads']} threads, {meta['interpreter_mode']}, xnnpack={'on' if meta['xnnpack'] else 'off'}",
+        "",
+        "| model | input | load ms | pre p50/p90 | invoke p50/p90 | decode p50/p90 | nms p50/p90 | total p50/p90/p99 | peak RSS MB | dets/frame |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for r in report["results"]:
+        if r["status"] != "ok":
+            lines.append(f"| {r['model']} | {r['status']} |  |  |  |  |  |  |  |  |")
+            continue
+        lat = r["latency_ms"]
+        cells = [f"{lat[s]['p50']:.1f} / {lat[s]['p90']:.1f}" for s in STAGES]
+        t = r["total_ms"]
+        h, w, dtype = r["input"]
+        lines.append(
+            f"| {r['model']} | {w}x{h} {dtype} | {r['load_ms']:.0f} | " + " | ".join(cells)
+            + f" | {t['p50']:.1f} / {t['p90']:.1f} / {t['p99']:.1f} | {r['peak_rss_mb']:.0f} | {r['detections_per_frame']:.1f} |"
+        )
+
+    scored = [r for r in report["results"] if r.get("per_class")]
+    if scored:
+        labels = sorted({lbl for r in scored for lbl in r["per_class"]})
+        lines += [
+            "",
+            f"Precision / recall at COCO_THRESHOLDS (IoU >= {meta['iou']})",
+            "",
+            "| class | thresh | " + " | ".join(r["model"] for r in scored) + " |",
+            "|---|---|" + "---|" * len(scored),
+        ]
+        for lbl in labels:
+            thr = variables.COCO_THRESHOLDS.get(lbl, variables.COCO_DEFAULT_THRESH)
+            cells = []
+            for r in scored:
+                pc = r["per_class"].get(lbl)
+                cells.append(f"{pc['precision']:.2f} / {pc['recall']:.2f}" if pc else "-")
+            lines.append(f"| {lbl} | {thr:.2f} | " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
@@ -1,18 +1,39 @@
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 import numpy as np
 
 class Module:
     name: str = "module"
     hz: float = 1.0  # run frequency
+    priority: int = 10  # lower runs first when the CPU is saturated
+    needs_frame: bool = True  # False for sensor modules (frame is None)
+    cpu_heavy: bool = True  # heavy modules share the scheduler's compute slots
+    scene_gated: bool = False  # skip runs while the scene is static (SCENE_GATE)
+    depends_on: Tuple[str, ...] = ()  # modules whose new results force a run
+    frame_id: int = 0  # id of the frame passed to process() (set by the worker)
+    rate_settings: Tuple[str, ...] = ()  # rate controller settings process() applies ("threads", "small_model")
 
     def __init__(self) -> None:
         self._next_t = 0.0
 
+    @property
+    def next_deadline(self) -> float:
+        return self._next_t
+
     def should_run(self, now: float) -> bool:
         return now >= self._next_t
 
     def mark_ran(self, now: float) -> None:
-        self._next_t = now + (1.0 / max(self.hz, 1e-6))
+        # fixed-rate: keep the phase of the previous deadline so small delays
+        # don't accumulate; re-anchor once a whole period was lost
+        period = 1.0 / max(self.hz, 1e-6)
+        next_t = self._next_t + period
+        if next_t <= now:
+            next_t = now + period
+        self._next_t = next_t
+
+    def expedite(self) -> None:
+        # make the module due now (e.g. the detector when tracking degrades)
+        self._next_t = 0.0
 
     def process(self, frame: np.ndarray, state: Dict[str, Any]) -> None:
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
@@ -1,58 +1,207 @@
 import threading
 import time
-from typing import Any, Dict, Optional
+from collections import ChainMap, deque
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
 import numpy as np
+import variables
+from results_store import ResultsStore
+from scene_change import SceneChangeDetector
+
+
+@dataclass
+class ScheduleStats:
+    """
+    Per-module timing, all in seconds.
+    - jitter   : actual start minus scheduled deadline
+    - queued   : time spent waiting for a compute slot
+    - missed   : whole periods lost because the module started too late
+    - skipped  : runs left out because the scene was static
+    - failed   : runs that produced no result (process worker error / timeout)
+    """
+    runs: int = 0
+    missed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    jitter: Deque[float] = field(default_factory=lambda: deque(maxlen=100))
+    queued: Deque[float] = field(default_factory=lambda: deque(maxlen=100))
+
+    def record(self, lateness: float, queued: float, period: float) -> None:
+        self.runs += 1
+        self.jitter.append(lateness)
+        self.queued.append(queued)
+        if lateness > period:
+            self.missed += int(lateness // period)
+
+    def summary(self) -> Dict[str, float]:
+        out: Dict[str, float] = {"runs": self.runs, "missed": self.missed, "skipped": self.skipped}
+        if self.failed:
+            out["failed"] = self.failed
+        if self.jitter:
+            j = np.asarray(self.jitter) * 1000.0
+            out["jitter_ms_mean"] = float(j.mean())
+            out["jitter_ms_p95"] = float(np.percentile(j, 95))
+            out["jitter_ms_max"] = float(j.max())
+        if self.queued:
+            out["queued_ms_mean"] = float(np.mean(self.queued) * 1000.0)
+        return out
+
 
 class ModuleWorker:
-    def __init__(self, module, state: Dict[str, Any], lock: threading.Lock):
+    def __init__(self, module, store: ResultsStore, source, gate=None, stats: Optional[ScheduleStats] = None):
+        """
+        source: anything with wait_for_frame(last_seq, timeout) -> Packet | None
+                (FrameGrabber); the worker sleeps on it instead of polling.
+                Frames are handed back through source.release_frame(frame)
+                if it has one.
+        gate:   optional ComputeGate shared by cpu-heavy modules
+        """
         self.module = module
-        self.state = state
-        self.lock = lock
-
-        self._latest_frame: Optional[np.ndarray] = None
-        self._latest_ts: float = 0.0
+        self.store = store
+        self.source = source
+        self._release_frame = getattr(source, "release_frame", None)
+        self.gate = gate
+        self.stats = stats if stats is not None else ScheduleStats()
 
         self._running = False
+        self._wake = threading.Event()
         self._thread: Optional[threading.Thread] = None
         self.last_infer_ms: float = 0.0
         self.infer_times = []
         self.infer_count = 0
+        # capture -> inference start, seconds
+        self.wake_latencies: Deque[float] = deque(maxlen=100)
+        # static-scene gate: results (and their timestamps) stay as published
+        self.scene: Optional[SceneChangeDetector] = None
+        if variables.SCENE_GATE and module.scene_gated and module.needs_frame:
+            self.scene = SceneChangeDetector()
+        self._last_run_ts = 0.0
+        self._deps_seen: Tuple[Any, ...] = ()
+        self._forced = False
+        # set when the worker gave up on its module (see ProcessModuleWorker)
+        self.dead = False
 
     def start(self):
         self._running = True
-        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread = threading.Thread(target=self._loop, daemon=True, name=f"worker-{self.module.name}")
         self._thread.start()
 
     def stop(self):
         self._running = False
+        self._wake.set()
         if self._thread:
             self._thread.join(timeout=1.0)
 
-    def update_frame(self, frame: np.ndarray, ts: float):
-        self._latest_frame = frame
-        self._latest_ts = ts
+    def trigger(self):
+        """
+        Run the module as soon as possible instead of at its next deadline.
+        """
+        self.module.expedite()
+        self._forced = True
+        self._wake.set()
+
+    def _slot(self):
+        if self.gate is None or not self.module.cpu_heavy:
+            return nullcontext()
+        return self.gate.slot(self.module.priority)
+
+    def _should_infer(self, frame: np.ndarray, frame_ts: float) -> bool:
+        """
+        Scene gate: run if the frame changed, an upstream module published
+        new results, the run was triggered, or the last run is older than
+        SCENE_MAX_STALENESS_S.
+        """
+        view = self.store.view()
+        deps = tuple(view.get(f"{name}_frame_id") for name in self.module.depends_on)
+        force = (
+            self._forced
+            or deps != self._deps_seen
+            or frame_ts - self._last_run_ts >= variables.SCENE_MAX_STALENESS_S
+        )
+        self._forced = False
+        if not self.scene.update(frame, force=force):
+            return False
+        self._deps_seen = deps
+        self._last_run_ts = frame_ts
+        return True
+
+    def _run(self, frame: Optional[np.ndarray], frame_id: int, state: ChainMap) -> bool:
+        """
+        Run the module; False if it produced no result (nothing is published).
+        """
+        self.module.frame_id = frame_id
+        self.module.process(frame, state)
+        return True
 
     def _loop(self):
-        last_ts = 0.0
+        last_seq = 0
+        module = self.module
         while self._running:
-            frame = self._latest_frame
-            ts = self._latest_ts
-
-            # wait until we have a real frame and a new timestamp
-            if frame is None or ts == 0.0 or ts == last_ts:
-                time.sleep(0.005)
+            # sleep until the module's next deadline (stop() interrupts)
+            wait_s = module.next_deadline - time.time()
+            if wait_s > 0:
+                self._wake.wait(wait_s)
+                self._wake.clear()
                 continue
 
-            last_ts = ts
+            frame = None
+            frame_ts = time.time()
+            if module.needs_frame:
+                # block until the grabber publishes a newer frame (timeout only
+                # to re-check _running)
+                pkt = self.source.wait_for_frame(last_seq, timeout=0.5)
+                if pkt is None:
+                    continue
+                frame, frame_ts, last_seq = pkt
+            try:
+                self._step(frame, frame_ts, last_seq)
+            except Exception as e:
+                if not self._recover(e):
+                    raise
+            finally:
+                # the frame is leased from the grabber's pool while we use it
+                if frame is not None and self._release_frame is not None:
+                    self._release_frame(frame)
+
+    def _recover(self, exc: Exception) -> bool:
+        """
+        Handle an error from _step(); False lets it end the worker thread.
+        """
+        return False
+
+    def _step(self, frame: Optional[np.ndarray], frame_ts: float, frame_id: int) -> None:
+        module = self.module
+        if frame is not None and self.scene is not None and not self._should_infer(frame, frame_ts):
+            self.stats.skipped += 1
+            module.mark_ran(time.time())
+            return
 
-            # run inference
+        deadline = module.next_deadline
+        t_queue = time.time()
+        with self._slot():
+            # run inference outside any lock: the module reads a frozen view
+            # of the other modules' results and its writes land in `out`
+            out: Dict[str, Any] = {}
             t0 = time.time()
-            with self.lock:
-                self.module.process(frame, self.state)
+            if frame is not None:
+                self.wake_latencies.append(t0 - frame_ts)
+            ok = self._run(frame, frame_id, ChainMap(out, self.store.view()))
             dt = time.time() - t0
+        if not ok:
+            # keep the last good snapshot (and its frame_id / ts)
+            self.stats.failed += 1
+            module.mark_ran(time.time())
+            return
+        self.store.publish(module.name, out, ts=frame_ts, frame_id=frame_id, latency_ms=dt * 1000.0)
 
-            # timings for FPS
-            self.infer_times.append(dt)
-            if len(self.infer_times) > 30:
-                self.infer_times.pop(0)
+        if deadline > 0.0:
+            self.stats.record(t0 - deadline, t0 - t_queue, 1.0 / max(module.hz, 1e-6))
+        module.mark_ran(t0)
 
+        # timings for FPS
+        self.last_infer_ms = dt * 1000.0
+        self.infer_count += 1
+        self.infer_times.append(dt)
+        if len(self.infer_times) > 30:
+            self.infer_times.pop(0)
@@ -1,24 +1,140 @@
 from __future__ import annotations
-from typing import List
-from det import Det
+from typing import List, Optional, Tuple
+import numpy as np
+from det import Det, DetectionBatch
 import variables
 
-def _iou(a, b) -> float:
-    ax1, ay1, ax2, ay2 = a
-    bx1, by1, bx2, by2 = b
-    inter_x1 = max(ax1, bx1)
-    inter_y1 = max(ay1, by1)
-    inter_x2 = min(ax2, bx2)
-    inter_y2 = min(ay2, by2)
-    iw = max(0, inter_x2 - inter_x1)
-    ih = max(0, inter_y2 - inter_y1)
-    inter = iw * ih
-    if inter <= 0:
-        return 0.0
-    area_a = max(0, ax2 - ax1) * max(0, ay2 - ay1)
-    area_b = max(0, bx2 - bx1) * max(0, by2 - by1)
+
+def _iou_one_to_many(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """
+    IoU of one x1,y1,x2,y2 box against (N, 4) boxes; 0 where union is empty.
+    """
+    iw = np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0])
+    ih = np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1])
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    area_a = max(0.0, box[2] - box[0]) * max(0.0, box[3] - box[1])
+    area_b = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
     denom = area_a + area_b - inter
-    return float(inter / denom) if denom > 0 else 0.0
+    out = np.zeros(boxes.shape[0], dtype=np.float64)
+    np.divide(inter, denom, out=out, where=(denom > 0) & (inter > 0))
+    return out
+
+
+def _suppression_matrix(b: np.ndarray, iou_thresh: float) -> np.ndarray:
+    """
+    (N, N) bool: IoU(b[i], b[j]) >= iou_thresh, built in place. The IoU is
+    divided out rather than compared as inter >= t * union: t * union rounds,
+    which flips pairs sitting exactly on the threshold (e.g. 45 / 100 at 0.45).
+    """
+    x1, y1, x2, y2 = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    inter = np.minimum.outer(x2, x2)
+    inter -= np.maximum.outer(x1, x1)
+    np.maximum(inter, 0, out=inter)
+    ih = np.minimum.outer(y2, y2)
+    ih -= np.maximum.outer(y1, y1)
+    np.maximum(ih, 0, out=ih)
+    inter *= ih
+    area = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = np.add.outer(area, area, out=ih)
+    union -= inter
+    valid = (inter > 0) & (union > 0)
+    np.divide(inter, union, out=inter, where=valid)
+    # pairs with no overlap have IoU 0
+    return np.where(valid, inter >= iou_thresh, 0.0 >= iou_thresh)
+
+
+# above this many boxes the N x N IoU matrix costs more memory than it saves
+_MATRIX_MAX_BOXES = 1024
+
+
+def nms_arrays(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: Optional[np.ndarray] = None,
+    iou_thresh: float = variables.COCO_NMS_THRESH,
+    top_k: Optional[int] = None,
+    soft_sigma: Optional[float] = None,
+    min_score: float = 1e-3,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Class-aware NMS on (N, 4) x1,y1,x2,y2 boxes.
+    - classes are separated with the coordinate-offset trick (each class is
+      shifted into its own region, so one pass never suppresses across classes)
+    - hard NMS (default): a box is dropped if IoU >= iou_thresh with a kept box
+    - soft_sigma: Gaussian soft-NMS; overlapping scores decay by
+      exp(-iou^2 / sigma) and boxes below min_score are dropped
+    - top_k: stop after k boxes
+    Returns (kept indices in descending score order, their (re)scores).
+    Equal scores keep class id order, then input order (as the per-label
+    loop this replaced did when class ids follow first appearance).
+    """
+    n = int(scores.shape[0])
+    if n == 0:
+        return np.zeros((0,), dtype=np.int64), np.zeros((0,), dtype=np.float32)
+    b = boxes.astype(np.float64)
+    if class_ids is not None and n > 1:
+        span = float(b.max() - b.min()) + 1.0
+        b = b + (class_ids.astype(np.float64) * span)[:, None]
+    limit = n if top_k is None else max(0, int(top_k))
+
+    keep: List[int] = []
+    if soft_sigma is None:
+        if class_ids is None:
+            order = np.argsort(-scores, kind="stable")
+        else:
+            order = np.lexsort((class_ids, -scores))
+        if n <= _MATRIX_MAX_BOXES:
+            # one vectorized IoU pass, then a cheap greedy walk over the rows
+            suppress = _suppression_matrix(b[order], iou_thresh)
+            removed = np.zeros(n, dtype=bool)
+            for r in range(n):
+                if removed[r]:
+                    continue
+                keep.append(int(order[r]))
+                if len(keep) >= limit:
+                    break
+                removed |= suppress[r]
+            keep_idx = np.asarray(keep, dtype=np.int64)
+            return keep_idx, scores[keep_idx]
+        while order.size and len(keep) < limit:
+            i = order[0]
+            keep.append(int(i))
+            rest = order[1:]
+            order = rest[_iou_one_to_many(b[i], b[rest]) < iou_thresh]
+        keep_idx = np.asarray(keep, dtype=np.int64)
+        return keep_idx, scores[keep_idx]
+
+    sc = scores.astype(np.float64)
+    rem = np.arange(n)
+    kept_scores: List[float] = []
+    while rem.size and len(keep) < limit:
+        m = int(np.argmax(sc[rem]))
+        i = rem[m]
+        keep.append(int(i))
+        kept_scores.append(sc[i])
+        rem = np.delete(rem, m)
+        if rem.size:
+            iou = _iou_one_to_many(b[i], b[rem])
+            sc[rem] *= np.exp(-(iou * iou) / soft_sigma)
+            rem = rem[sc[rem] >= min_score]
+    return np.asarray(keep, dtype=np.int64), np.asarray(kept_scores, dtype=np.float32)
+
+
+def nms_batch(
+    batch: DetectionBatch,
+    iou_thresh: float = variables.COCO_NMS_THRESH,
+    top_k: Optional[int] = None,
+    soft_sigma: Optional[float] = None,
+) -> DetectionBatch:
+    """
+    Class-wise NMS on a DetectionBatch; no Det objects are built.
+    """
+    keep, scores = nms_arrays(batch.boxes, batch.scores, batch.class_ids, iou_thresh, top_k, soft_sigma)
+    out = batch.take(keep)
+    if soft_sigma is not None:
+        out.scores = scores
+    return out
+
 
 def nms_dets(dets: List[Det], iou_thresh: float = variables.COCO_NMS_THRESH) -> List[Det]:
     """
@@ -26,24 +142,9 @@ def nms_dets(dets: List[Det], iou_thresh: float = variables.COCO_NMS_THRESH) ->
     """
     if not dets:
         return dets
-    
-    out: List[Det] = []
-    # group by label to avoid suppressing different classes
-    by_label = {}
-    for d in dets:
-        by_label.setdefault(d.label, []).append(d)
-
-    for label, group in by_label.items():
-        group = sorted(group, key=lambda d: d.score, reverse=True)
-        kept: List["Det"] = []
-        for d in group:
-            if all(_iou(d.bbox, k.bbox) < iou_thresh for k in kept):
-                kept.append(d)
-        out.extend(kept)
-
-    # keep overall ordering by score
-    out.sort(key=lambda d: d.score, reverse=True)
-    if variables.DEBUG:
-        print(f'Before NMS: {len(dets)} objects. After NMS: {len(out)} objects.')
-    return out
-
+    label_ids = {}
+    class_ids = np.array([label_ids.setdefault(d.label, len(label_ids)) for d in dets], dtype=np.int64)
+    boxes = np.array([d.bbox for d in dets], dtype=np.float64)
+    scores = np.array([d.score for d in dets], dtype=np.float64)
+    keep, _ = nms_arrays(boxes, scores, class_ids, iou_thresh)
+    return [dets[i] for i in keep]
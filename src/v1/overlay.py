@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from det import Det
+
+Color = Tuple[int, int, int]
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+class Patch(NamedTuple):
+    """
+    One drawn primitive, cropped to its rectangle.
+    - pixels : BGR, premultiplied by coverage (drawn on black)
+    - mask   : uint8 0/255, pixels to copy (hard-edged primitives)
+    - inv    : 255 - coverage, 3 channels, for anti-aliased text; else None
+    """
+    y1: int
+    y2: int
+    x1: int
+    x2: int
+    pixels: np.ndarray
+    mask: np.ndarray
+    inv: Optional[np.ndarray]
+
+
+class _Canvas:
+    """
+    Scratch surface the primitives are drawn on (color + coverage), then
+    cut out as patches; the scratch is cleared again region by region.
+    """
+
+    def __init__(self, h: int, w: int) -> None:
+        self.h, self.w = h, w
+        self.bgr = np.zeros((h, w, 3), dtype=np.uint8)
+        self.cov = np.zeros((h, w), dtype=np.uint8)
+
+    def capture(self, x1: int, y1: int, x2: int, y2: int, out: List[Patch]) -> None:
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(self.w, x2), min(self.h, y2)
+        if x2 <= x1 or y2 <= y1:
+            return
+        cov = self.cov[y1:y2, x1:x2]
+        if cv2.countNonZero(cov):
+            inv = None
+            if ((cov > 0) & (cov < 255)).any():
+                inv = cv2.cvtColor(255 - cov, cv2.COLOR_GRAY2BGR)
+            out.append(Patch(y1, y2, x1, x2, self.bgr[y1:y2, x1:x2].copy(), cov.copy(), inv))
+        self.bgr[y1:y2, x1:x2] = 0
+        cov[...] = 0
+
+    def rectangle(self, p1: Tuple[int, int], p2: Tuple[int, int], color: Color, thickness: int, out: List[Patch]) -> None:
+        cv2.rectangle(self.bgr, p1, p2, color, thickness)
+        cv2.rectangle(self.cov, p1, p2, 255, thickness)
+        (x1, y1), (x2, y2) = p1, p2
+        if thickness < 0:
+            self.capture(x1, y1, x2 + 1, y2 + 1, out)
+            return
+        # an outline is four thin strips, not a box-sized patch
+        r = thickness // 2 + 1
+        self.capture(x1 - r, y1 - r, x2 + r + 1, y1 + r + 1, out)
+        self.capture(x1 - r, y2 - r, x2 + r + 1, y2 + r + 1, out)
+        self.capture(x1 - r, y1 + r + 1, x1 + r + 1, y2 - r, out)
+        self.capture(x2 - r, y1 + r + 1, x2 + r + 1, y2 - r, out)
+
+    def text(self, text: str, org: Tuple[int, int], scale: float, color: Color, thickness: int, out: List[Patch], line_type: int = cv2.LINE_8) -> None:
+        cv2.putText(self.bgr, text, org, FONT, scale, color, thickness, line_type)
+        cv2.putText(self.cov, text, org, FONT, scale, 255, thickness, line_type)
+        (tw, th), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+        x, y = org
+        self.capture(x - thickness, y - th - thickness, x + tw + thickness, y + baseline + thickness, out)
+
+
+def composite(out: np.ndarray, patches: Sequence[Patch]) -> None:
+    for p in patches:
+        roi = out[p.y1:p.y2, p.x1:p.x2]
+        if p.inv is None:
+            cv2.copyTo(p.pixels, p.mask, roi)
+        else:
+            # premultiplied: out = out * (1 - a) + pixels
+            cv2.multiply(roi, p.inv, dst=roi, scale=1.0 / 255.0)
+            cv2.add(roi, p.pixels, dst=roi)
+
+
+class _Layer:
+    """
+    One group of primitives, re-rendered only when its key changes.
+    """
+
+    def __init__(self) -> None:
+        self.key: Any = None
+        self.patches: List[Patch] = []
+        self.renders = 0
+
+    def update(self, key: Any, draw: Callable[[List[Patch]], None]) -> None:
+        if key == self.key:
+            return
+        patches: List[Patch] = []
+        draw(patches)
+        self.key = key
+        self.patches = patches
+        self.renders += 1
+
+
+def _det_key(dets: Sequence[Det]) -> Tuple:
+    return tuple((d.label, f"{d.score:.2f}", tuple(int(v) for v in d.bbox)) for d in dets)
+
+
+def _clamp_bbox(b: Tuple[int, int, int, int], w: int, h: int) -> Tuple[int, int, int, int]:
+    x1, y1, x2, y2 = b
+    x1 = max(0, min(w - 1, x1))
+    x2 = max(0, min(w - 1, x2))
+    y1 = max(0, min(h - 1, y1))
+    y2 = max(0, min(h - 1, y2))
+    if x2 < x1:
+        x1, x2 = x2, x1
+    if y2 < y1:
+        y1, y2 = y2, y1
+    return x1, y1, x2, y2
+
+
+# -----------------------------
+# Compositor
+# -----------------------------
+class OverlayCompositor:
+    """
+    Draws the detection / HUD overlay without touching the input frame.
+    - box layer : person + face boxes; re-rendered when the boxes change
+    - hud layer : distance, FPS, status lines; re-rendered when the text changes
+    Layers are kept as small patches (only the rectangles that were drawn
+    on) and composited onto a private BGR buffer, which compose() returns. The
+    buffer is reused: it is valid until the next compose().
+    style:
+      - "display": scaled boxes with filled label bars (render_display)
+      - "stream" : plain boxes with labels above (annotate_bgr)
+    """
+
+    def __init__(self, style: str = "display") -> None:
+        if style not in ("display", "stream"):
+            raise ValueError(f"unknown overlay style {style!r}")
+        self.style = style
+        self.boxes = _Layer()
+        self.hud = _Layer()
+        self._canvas: Optional[_Canvas] = None
+        self._out: Optional[np.ndarray] = None
+
+    def compose(
+        self,
+        frame_rgb: np.ndarray,
+        persons: Sequence[Det],
+        faces: Sequence[Det],
+        range_cm: float | None = None,
+        fps_loop: float | None = None,
+        fps_det: float | None = None,
+        status_lines: Optional[Sequence[str]] = None,
+    ) -> np.ndarray:
+        h, w = frame_rgb.shape[:2]
+        if self._canvas is None or (self._canvas.h, self._canvas.w) != (h, w):
+            self._canvas = _Canvas(h, w)
+            self._out = np.empty((h, w, 3), dtype=np.uint8)
+            self.boxes.key = self.hud.key = None
+
+        fps_loop_s = f"{fps_loop:.1f}" if fps_loop is not None else '--'
+        fps_det_s = f"{fps_det:.1f}" if fps_det is not None else '--'
+        hud_lines = (
+            f"DIST: {range_cm:.2f} cm" if range_cm is not None else None,
+            f'FPS: {fps_loop_s}  DET: {fps_det_s}',
+            tuple(status_lines or ()),
+        )
+        self.boxes.update((_det_key(persons), _det_key(faces)), lambda out: self._draw_boxes(persons, faces, out))
+        self.hud.update(hud_lines, lambda out: self._draw_hud(*hud_lines, out))
+
+        cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR, dst=self._out)
+        composite(self._out, self.boxes.patches)
+        composite(self._out, self.hud.patches)
+        return self._out
+
+    # -----------------------------
+    # layers
+    # -----------------------------
+    def _draw_boxes(self, persons: Sequence[Det], faces: Sequence[Det], out: List[Patch]) -> None:
+        c = self._canvas
+        if self.style == "display":
+            for d in persons:
+                self._display_box(d, (0, 255, 255), out)
+            for d in faces:
+                self._display_box(d, (255, 255, 0), out)
+            return
+        for dets, color, prefix in ((persons, (0, 255, 255), None), (faces, (255, 255, 0), "face")):
+            for d in dets:
+                x1, y1, x2, y2 = _clamp_bbox(d.bbox, c.w, c.h)
+                c.rectangle((x1, y1), (x2, y2), color, 2, out)
+                label = f"{prefix or d.label} {d.score:.2f}"
+                c.text(label, (x1, max(20, y1 - 8)), 0.6, color, 2, out, cv2.LINE_AA)
+
+    def _display_box(self, d: Det, color: Color, out: List[Patch]) -> None:
+        c = self._canvas
+        w, h = c.w, c.h
+        # Scale UI based on resolution
+        scale = max(0.6, min(1.2, w / 800.0))
+        thickness = max(1, int(2 * scale))
+        pad = max(3, int(6 * scale))
+
+        x1, y1, x2, y2 = d.bbox
+        x1 = max(0, min(w - 1, x1))
+        y1 = max(0, min(h - 1, y1))
+        x2 = max(0, min(w - 1, x2))
+        y2 = max(0, min(h - 1, y2))
+        if x2 <= x1 or y2 <= y1:
+            return
+        c.rectangle((x1, y1), (x2, y2), color, thickness, out)
+
+        label = f"{d.label} {d.score:.2f}"
+        (tw, th), baseline = cv2.getTextSize(label, FONT, 0.6 * scale, thickness)
+        th_total = th + baseline
+        # Prefer label inside top of bbox; if not enough space, put above bbox
+        if y1 + th_total + 2 * pad < y2:
+            ry1, ry2 = y1, y1 + th_total + 2 * pad
+        else:
+            ry2, ry1 = y1, max(0, y1 - (th_total + 2 * pad))
+        rx1, rx2 = x1, min(w - 1, x1 + tw + 2 * pad)
+        # Filled background bar for readability, black text on it
+        c.rectangle((rx1, ry1), (rx2, ry2), color, -1, out)
+        c.text(label, (rx1 + pad, ry2 - pad - baseline), 0.6 * scale, (0, 0, 0), thickness, out, cv2.LINE_AA)
+
+    def _draw_hud(self, dist: Optional[str], fps: str, status_lines: Sequence[str], out: List[Patch]) -> None:
+        c = self._canvas
+        if dist is not None:
+            c.text(dist, (10, 30), 0.9, (0, 255, 0), 2, out)
+        c.text(fps, (10, 90), 0.7, (0, 255, 255), 2, out)
+        # extra lines under the FPS line (e.g. rate controller status)
+        for i, line in enumerate(status_lines):
+            c.text(line, (10, 120 + 25 * i), 0.5, (0, 200, 255), 1, out, cv2.LINE_AA)
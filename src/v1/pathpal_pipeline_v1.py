@@ -1,23 +1,28 @@
 from __future__ import annotations
 import time
-from typing import Any, Dict, List, Optional
+from typing import List, Optional
 import cv2
 from module import Module
 from camera import Camera
 from coco_detector import CocoModule
-from utils import side_from_bbox, render_display, annotate_bgr
+from utils import side_from_bbox, render_display
 from det import Det
 from face_module import FaceModule
 from event_policy import EventPolicy
 import variables
 from frame_grabber import FrameGrabber
-import threading
-state_lock = threading.Lock()
+from results_store import ResultsStore
 
 if variables.ENABLE_FPS:
     from collections import deque
 if variables.ENABLE_ULTRASONIC:
     from ultrasonic_module import UltrasonicModule
+if variables.ENABLE_TRACKER:
+    from tracker import TrackerModule
+if variables.ENABLE_FLOW:
+    from flow import FlowModule
+if variables.ENABLE_RATE_CTL:
+    from rate_controller import RateControllerModule
 
 def fps_from_times(times):
     if not times:
@@ -34,44 +39,83 @@ def main() -> None:
     COCO_MODEL = variables.EFFICIENTDET_V0_PATH
     COCO_LABELS = variables.COCO_LABELS_PATH
 
-    cam = Camera(size=(variables.CAM_WIDTH, variables.CAM_HEIGHT), fps=variables.FPS)
+    cam = Camera(size=(variables.CAM_WIDTH, variables.CAM_HEIGHT), fps=variables.FPS, replay_path=variables.CAMERA_REPLAY_PATH)
     if variables.DEBUG:
         print(f"[INFO] Camera backend: {cam.backend}")
-    grabber = FrameGrabber(cam, target_fps=variables.TARGET_FRAME_GRABBER_FPS, copy_frame=variables.GRABBER_COPY_FRAME)
+    recorder = None
+    if variables.RECORD_PATH:
+        from recording import Recorder
+        recorder = Recorder(variables.RECORD_PATH)
+    grabber_fps = variables.TARGET_FRAME_GRABBER_FPS
+    if cam.replay is not None and cam.replay.mode == 'fast':
+        # the replay sets the pace; frames the pipeline can't keep up with are dropped
+        grabber_fps = 1000.0
+    grabber = FrameGrabber(cam, target_fps=grabber_fps, copy_frame=variables.GRABBER_COPY_FRAME, recorder=recorder)
     grabber.start()
-    state: Dict[str, Any] = {
+    store = ResultsStore(defaults={
         'coco_dets': [],
         'faces': [],
         'person_present': False,
-        'persons': []
-    }
+        'persons': [],
+        'tracks': [],
+        'flow_dets': [],
+        'flow_faces': [],
+        'flow_confidence': 0.0
+    })
     modules: List[Module] = []
-    workers = []
 
-    if variables.ENABLE_ULTRASONIC:
+    if cam.replay is not None and len(cam.replay.rec.ranges):
+        # recorded ultrasonic readings, in step with the replayed frames
+        from recording import ReplayRangeModule
+        modules.append(ReplayRangeModule(cam.replay))
+    elif variables.ENABLE_ULTRASONIC:
         modules.append(UltrasonicModule())
 
-    coco = CocoModule(COCO_MODEL, COCO_LABELS)
-    face = FaceModule()
+    if variables.WORKER_BACKEND == 'process':
+        from process_worker import RemoteModule
+        # built inside their own processes; only scheduling attributes live here
+        coco = RemoteModule(CocoModule, COCO_MODEL, COCO_LABELS)
+        face = RemoteModule(FaceModule)
+    else:
+        coco = CocoModule(COCO_MODEL, COCO_LABELS)
+        face = FaceModule()
 
     modules.extend([coco, face])
+    if variables.ENABLE_TRACKER:
+        # cheap; predicts boxes on every frame between detector runs
+        modules.append(TrackerModule())
+    flow = None
+    if variables.ENABLE_FLOW:
+        # per-frame box propagation; wired to the detector below
+        flow = FlowModule()
+        modules.append(flow)
     # modules: List[Module] = [
     #     CocoModule(COCO_MODEL, COCO_LABELS),
     #     FaceModule(),
     #     # Later: add new modules here (OCRModule, MotionHazardModule, etc.)
     # ]
-    from module_worker import ModuleWorker
+    from scheduler import DeadlineScheduler
 
-    coco_worker = ModuleWorker(coco, state, state_lock)
-    face_worker = ModuleWorker(face, state, state_lock)
-
-    coco_worker.start()
-    face_worker.start()
+    # every registered module runs at its own Module.hz
+    scheduler = DeadlineScheduler(store, grabber)
+    for m in modules:
+        scheduler.add(m)
+    if variables.ENABLE_RATE_CTL:
+        # adjusts the other modules' rate / threads / model size
+        scheduler.add(RateControllerModule(scheduler))
+    coco_worker = scheduler.worker(coco.name)
+    if flow is not None:
+        # run the detector early when flow tracking degrades
+        flow.on_degraded = coco_worker.trigger
+    scheduler.start()
 
     events = EventPolicy(cooldown_s=2.0)
     streamer = None
     if variables.ENABLE_STREAM:
-        from mjpeg_streamer import MjpegStreamer
+        if variables.STREAM_SERVER == 'asyncio':
+            from stream_server import AsyncStreamServer as MjpegStreamer
+        else:
+            from mjpeg_streamer import MjpegStreamer
         streamer = MjpegStreamer(
             host=variables.STREAM_HOST,
             port=variables.STREAM_PORT,
@@ -79,30 +123,38 @@ def main() -> None:
             stream_fps=variables.STREAM_FPS,
         )
         streamer.start()
+        from stream_targets import StreamTargets, TargetInput
+        targets = StreamTargets(streamer, store, coco=coco, coco_worker=coco_worker, scheduler=scheduler, grabber=grabber)
         if variables.DEBUG:
             print(f"[INFO] MJPEG: http://10.32.30.165:{variables.STREAM_PORT}/view")
+            print(f"[INFO] targets: http://10.32.30.165:{variables.STREAM_PORT}/streams")
     try:
         if variables.ENABLE_FPS:
             loop_times = deque(maxlen=30)
-        last_ts = 0.0
+        last_seq = 0
+        last_stats_t = time.time()
+        last_range_ts = None
+        last_event_key = None
+        frame = None
         while True:
+            if frame is not None:
+                # done with the previous frame: its pool buffer can be reused
+                grabber.release_frame(frame)
+                frame = None
             loop_fps = None
             det_fps = None
+            # sleep until the grabber publishes a newer frame (no polling)
+            pkt = grabber.wait_for_frame(last_seq, timeout=0.5)
+            if pkt is None:
+                if cam.finished and variables.EXIT_ON_REPLAY_END:
+                    break
+                continue
             if variables.ENABLE_FPS:
                 loop_start = time.time()
-            frame, ts = grabber.get_latest()
-            # No frame yet
-            if frame is None:
-                time.sleep(0.01)
-                continue
-            # if we already processed this frame, skip it
-            if ts == last_ts:
-                time.sleep(0.002)
-                continue
-            last_ts = ts
+            frame, ts, last_seq = pkt
 
             now = time.time()
-            state['now_ts'] = now  # useful for sensor modules
+            store.publish('main', {'now_ts': now}, ts=now)  # useful for sensor modules
 
             # for m in modules:
             #     if m.should_run(now):
@@ -111,18 +163,31 @@ def main() -> None:
             #         m.mark_ran(now)
             #         if m.name == 'coco':
             #             det_times.append(time.time() - t0)
-            coco_worker.update_frame(frame, ts)
-            face_worker.update_frame(frame, ts)
 
             # Simple demo events
             h, w, _ = frame.shape
             # persons: List[Det] = state.get('persons', [])
             # faces: List[Det] = state.get('faces', [])
-            with state_lock:
-                persons = list(state.get('persons', []))
-                faces   = list(state.get('faces', []))
-                dets    = list(state.get('coco_dets', []))
-                range_cm = state.get('range_cm')
+            # lock-free: the view is an immutable snapshot of the latest results
+            state = store.view()
+            persons = list(state.get('persons', []))
+            faces   = list(state.get('faces', []))
+            dets    = list(state.get('coco_dets', []))
+            range_cm = state.get('range_cm')
+            rate_ctl = state.get('rate_ctl')
+            status_lines = [rate_ctl['status']] if rate_ctl else None
+            if recorder is not None and state.get('range_ts') != last_range_ts:
+                last_range_ts = state.get('range_ts')
+                recorder.write_range(range_cm, state.get('range_raw_cm'), now)
+            if variables.ENABLE_FLOW and state.get('flow_confidence', 0.0) >= variables.FLOW_MIN_CONFIDENCE:
+                # boxes moved to this frame by optical flow
+                dets = list(state.get('flow_dets', []))
+                faces = list(state.get('flow_faces', []))
+                persons = [d for d in dets if d.label == 'person']
+            elif variables.ENABLE_TRACKER:
+                # tracked boxes are predicted to now instead of the last detector frame
+                dets = list(state.get('tracks', []))
+                persons = [d for d in dets if d.label == 'person']
 
             # ---- existing person/face events (keep as-is if you want) ----
             if persons:
@@ -190,34 +255,78 @@ def main() -> None:
                     faces=faces,
                     fps_det=det_fps,
                     fps_loop=loop_fps,
-                    range_cm=state.get('range_cm'),
-                    window_name=WINDOW_NAME
+                    range_cm=range_cm,
+                    window_name=WINDOW_NAME,
+                    status_lines=status_lines,
                 ):
                     break
 
             # Stream to laptop
-            if streamer is not None and streamer.has_clients():
-                bgr_annot = annotate_bgr(
-                    frame_rgb=frame,
-                    persons=dets,
+            if streamer is not None:
+                streamer.set_telemetry({
+                    'ts': ts,
+                    'range_cm': range_cm,
+                    'direction': direction,
+                    'fps_loop': loop_fps,
+                    'fps_det': det_fps,
+                    'dets': [{'label': d.label, 'score': round(float(d.score), 3), 'bbox': [int(v) for v in d.bbox]} for d in dets],
+                    'faces': len(faces),
+                    'status': status_lines or [],
+                })
+                # boxes for browser-side drawing (/view) over the raw feed
+                snaps = store.snapshots()
+                # one event per new module result ('main' republishes every loop)
+                event_key = tuple((name, snap.ts) for name, snap in snaps.items() if name != 'main')
+                if streamer.has_event_clients() and event_key != last_event_key:
+                    last_event_key = event_key
+                    # boxes/faces are the ones used above for this frame (frame_id,
+                    # captured at ts): flow / tracker moved when enabled, else the
+                    # last detector output, which ran on det_frame_id at det_ts
+                    streamer.publish_event({
+                        'frame_id': last_seq,
+                        'ts': ts,
+                        'w': w,
+                        'h': h,
+                        'det_frame_id': state.get('coco_frame_id'),
+                        'det_ts': state.get('coco_ts'),
+                        'boxes': [[d.label, round(float(d.score), 3), *(int(v) for v in d.bbox)] for d in dets],
+                        'faces': [['face', round(float(d.score), 3), *(int(v) for v in d.bbox)] for d in faces],
+                        'range_cm': range_cm,
+                        'latency_ms': {name: round(snap.latency_ms, 1) for name, snap in snaps.items() if name != 'main'},
+                    })
+                # each stream target renders only while subscribed (and due)
+                targets.render(TargetInput(
+                    frame=frame,
+                    dets=dets,
                     faces=faces,
-                    fps_det=det_fps,
+                    range_cm=range_cm,
                     fps_loop=loop_fps,
-                    range_cm=state.get('range_cm'),
-                )
-                streamer.update_bgr(bgr_annot)
+                    fps_det=det_fps,
+                    status_lines=status_lines,
+                    state=state,
+                ))
             
             try:
                 if int(time.time()) % 2 == 0:   # print every ~2 seconds
                     print(f"[FPS] loop={loop_fps:.1f} det={det_fps:.1f}")
             except Exception as e:
                 pass
+            if variables.DEBUG and (now - last_stats_t) >= variables.SCHED_STATS_EVERY_S:
+                last_stats_t = now
+                for name, st in scheduler.stats().items():
+                    print(f"[SCHED] {name}: {st}")
+                if grabber.pool is not None:
+                    print(f"[POOL] {grabber.pool_metrics()}")
+                if recorder is not None:
+                    print(f"[REC] frames {recorder.frames} drops {recorder.drops}")
 
     finally:
         grabber.stop()
         cam.close()
-        coco_worker.stop()
-        face_worker.stop()
+        if recorder is not None:
+            recorder.close()
+            print(f"[REC] {recorder.path}: {recorder.frames} frames, {recorder.drops} dropped")
+        scheduler.stop()
         if ENABLE_DISPLAY:
             cv2.destroyAllWindows()
         if streamer is not None:
@@ -0,0 +1,491 @@
+"""
+Performance measurements for the pipeline building blocks.
+
+Run from src/v1:
+    python -m perf latency [--seconds 5] [--fps 30]
+    python -m perf preprocess [--iters 200]
+    python -m perf nms [--iters 50]
+    python -m perf stream [--seconds 5] [--clients 1,5,20] [--stalled 0] [--server threaded,asyncio]
+    python -m perf bench --frames DIR [--threads 3] [--gt gt.json] [--json out.json] [--md out.md]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+
+import variables
+import nms
+import model_bench
+from det import Det
+from frame_channel import LatestValueChannel
+from model_bench import BENCH_MODELS
+from preprocess import InputPreprocessor
+
+
+def _percentiles(values: List[float], scale: float = 1000.0) -> Dict[str, float]:
+    if not values:
+        return {"n": 0}
+    arr = np.asarray(values, dtype=np.float64) * scale
+    return {
+        "n": int(arr.size),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "max": float(arr.max()),
+    }
+
+
+# -----------------------------
+# capture -> inference-start wake-up latency
+# -----------------------------
+def _run_producer(publish: Callable[[np.ndarray, float], None], fps: float, seconds: float, stop: threading.Event) -> None:
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    dt = 1.0 / fps
+    end = time.time() + seconds
+    while time.time() < end:
+        publish(frame, time.time())
+        time.sleep(dt)
+    stop.set()
+
+
+def _latency_polling(fps: float, seconds: float) -> Dict[str, float]:
+    """
+    Old scheme: lock-protected latest slot, consumer sleeps 5 ms between
+    float-timestamp comparisons (FrameGrabber + ModuleWorker before).
+    """
+    lock = threading.Lock()
+    slot = {"frame": None, "ts": 0.0}
+    stop = threading.Event()
+    lat: List[float] = []
+
+    def publish(frame: np.ndarray, ts: float) -> None:
+        with lock:
+            slot["frame"] = frame
+            slot["ts"] = ts
+
+    def consume() -> None:
+        last_ts = 0.0
+        while not stop.is_set():
+            with lock:
+                frame, ts = slot["frame"], slot["ts"]
+            if frame is None or ts == last_ts:
+                time.sleep(0.005)
+                continue
+            last_ts = ts
+            lat.append(time.time() - ts)
+
+    return _measure(publish, consume, stop, fps, seconds, lat)
+
+
+def _latency_channel(fps: float, seconds: float) -> Dict[str, float]:
+    """
+    New scheme: LatestValueChannel with condition-variable wake-ups.
+    """
+    ch: LatestValueChannel[np.ndarray] = LatestValueChannel()
+    stop = threading.Event()
+    lat: List[float] = []
+
+    def consume() -> None:
+        last_seq = 0
+        while not stop.is_set():
+            pkt = ch.wait_newer(last_seq, timeout=0.5)
+            if pkt is None:
+                continue
+            last_seq = pkt.seq
+            lat.append(time.time() - pkt.ts)
+
+    def publish(frame: np.ndarray, ts: float) -> None:
+        ch.publish(frame, ts)
+
+    res = _measure(publish, consume, stop, fps, seconds, lat, on_stop=ch.close)
+    return res
+
+
+def _measure(publish, consume, stop: threading.Event, fps: float, seconds: float, lat: List[float], on_stop=None) -> Dict[str, float]:
+    consumers = [threading.Thread(target=consume, daemon=True) for _ in range(2)]
+    cpu0 = time.process_time()
+    for t in consumers:
+        t.start()
+    _run_producer(publish, fps, seconds, stop)
+    if on_stop is not None:
+        on_stop()
+    for t in consumers:
+        t.join(timeout=1.0)
+    res = _percentiles(lat)
+    # CPU share of the whole process (producer + 2 consumers) while mostly idle
+    res["cpu_pct"] = 100.0 * (time.process_time() - cpu0) / seconds
+    return res
+
+
+def cmd_latency(args: argparse.Namespace) -> None:
+    print(f"capture -> consumer wake-up, 2 consumers, {args.fps:.0f} fps, {args.seconds:.0f} s (ms)")
+    for name, fn in (("polling", _latency_polling), ("channel", _latency_channel)):
+        r = fn(args.fps, args.seconds)
+        if r["n"] == 0:
+            print(f"  {name:8s} no samples")
+            continue
+        print(f"  {name:8s} p50={r['p50']:.3f} p95={r['p95']:.3f} max={r['max']:.3f} cpu={r['cpu_pct']:.1f}%")
+
+
+# -----------------------------
+# CocoDetector preprocessing
+# -----------------------------
+def _model_input_spec(name: str):
+    path, h, w, dtype, quant = BENCH_MODELS[name]
+    try:
+        from interpreter_backend import make_interpreter
+        interp = make_interpreter(path, num_threads=1, warmup_runs=0)
+        d = interp.get_input_details()[0]
+        _, h, w, _ = d["shape"]
+        return int(h), int(w), d["dtype"], d.get("quantization"), "model"
+    except Exception:
+        return h, w, dtype, quant, "table"
+
+
+def _legacy_preprocess(rgb: np.ndarray, in_h: int, in_w: int, in_dtype, quant) -> np.ndarray:
+    """
+    CocoDetector._preprocess before the LUT engine (reference for timing/parity).
+    """
+    img = cv2.resize(rgb, (in_w, in_h), interpolation=cv2.INTER_LINEAR)
+    x = np.ascontiguousarray(np.asarray(img, dtype=np.uint8))
+    scale, zero = quant if quant else (0.0, 0)
+    if in_dtype == np.float32:
+        x = x.astype(np.float32) / 255.0
+        return np.expand_dims(x, axis=0)
+    if scale is None or scale == 0:
+        return np.expand_dims(x.astype(in_dtype), axis=0)
+    xf = (x.astype(np.float32) - 127.5) / 127.5
+    q = np.round(xf / scale + zero)
+    if in_dtype == np.uint8:
+        q = np.clip(q, 0, 255).astype(np.uint8)
+    elif in_dtype == np.int8:
+        q = np.clip(q, -128, 127).astype(np.int8)
+    else:
+        q = q.astype(in_dtype)
+    return np.expand_dims(q, axis=0)
+
+
+def _time_ms(fn, iters: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return (time.perf_counter() - t0) * 1000.0 / iters
+
+
+def cmd_preprocess(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(variables.CAM_HEIGHT, variables.CAM_WIDTH, 3), dtype=np.uint8)
+    print(f"preprocess {frame.shape[1]}x{frame.shape[0]} frame, {args.iters} iters (ms/frame)")
+    print(f"  {'model':24s} {'input':16s} {'legacy':>8s} {'fused':>8s} {'speedup':>8s}  parity")
+    for name in BENCH_MODELS:
+        h, w, dtype, quant, src = _model_input_spec(name)
+        pre = InputPreprocessor(h, w, dtype, quant)
+        out = np.empty((1, h, w, 3), dtype=dtype)
+        legacy = _time_ms(lambda: _legacy_preprocess(frame, h, w, dtype, quant), args.iters)
+        fused = _time_ms(lambda: pre.run(frame, out[0]), args.iters)
+        ref = _legacy_preprocess(frame, h, w, dtype, quant)
+        parity = "exact" if np.array_equal(ref, out) else f"max|d|={np.abs(ref.astype(np.float64) - out).max():.3g}"
+        spec = f"{w}x{h} {np.dtype(dtype).name}"
+        print(f"  {name:24s} {spec:16s} {legacy:8.3f} {fused:8.3f} {legacy / fused:7.1f}x  {parity} ({src})")
+
+
+# -----------------------------
+# NMS
+# -----------------------------
+def _legacy_iou(a, b) -> float:
+    ax1, ay1, ax2, ay2 = a
+    bx1, by1, bx2, by2 = b
+    iw = max(0, min(ax2, bx2) - max(ax1, bx1))
+    ih = max(0, min(ay2, by2) - max(ay1, by1))
+    inter = iw * ih
+    if inter <= 0:
+        return 0.0
+    area_a = max(0, ax2 - ax1) * max(0, ay2 - ay1)
+    area_b = max(0, bx2 - bx1) * max(0, by2 - by1)
+    denom = area_a + area_b - inter
+    return float(inter / denom) if denom > 0 else 0.0
+
+
+def _legacy_nms_dets(dets: List[Det], iou_thresh: float) -> List[Det]:
+    """
+    nms.nms_dets before vectorization (reference for timing/equivalence).
+    """
+    out: List[Det] = []
+    by_label: Dict[str, List[Det]] = {}
+    for d in dets:
+        by_label.setdefault(d.label, []).append(d)
+    for group in by_label.values():
+        group = sorted(group, key=lambda d: d.score, reverse=True)
+        kept: List[Det] = []
+        for d in group:
+            if all(_legacy_iou(d.bbox, k.bbox) < iou_thresh for k in kept):
+                kept.append(d)
+        out.extend(kept)
+    out.sort(key=lambda d: d.score, reverse=True)
+    return out
+
+
+def _random_dets(n: int, rng: np.random.Generator) -> List[Det]:
+    """
+    Clustered boxes (like raw detector output) over 4 labels, 640x480 frame.
+    """
+    labels = ["person", "car", "bottle", "bicycle"]
+    centers = rng.uniform((40, 40), (600, 440), size=(max(1, n // 8), 2))
+    dets = []
+    for _ in range(n):
+        cx, cy = centers[rng.integers(len(centers))] + rng.normal(0, 8, 2)
+        bw, bh = rng.uniform(20, 120, 2)
+        bbox = (int(cx - bw / 2), int(cy - bh / 2), int(cx + bw / 2), int(cy + bh / 2))
+        dets.append(Det(label=labels[rng.integers(len(labels))], score=float(rng.random()), bbox=bbox))
+    return dets
+
+
+def cmd_nms(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(0)
+    thr = variables.COCO_NMS_THRESH
+    print(f"class-wise NMS, iou_thresh={thr} (ms/call)")
+    print("  legacy = old List[Det] loop, dets = nms_dets(List[Det]), arrays = nms_arrays (CocoDetector path)")
+    print(f"  {'boxes':>6s} {'legacy':>9s} {'dets':>9s} {'arrays':>9s} {'soft':>9s}  equivalent")
+    for n in (10, 100, 1000):
+        dets = _random_dets(n, rng)
+        label_ids: Dict[str, int] = {}
+        cls = np.array([label_ids.setdefault(d.label, len(label_ids)) for d in dets])
+        boxes = np.array([d.bbox for d in dets], dtype=np.int32)
+        scores = np.array([d.score for d in dets], dtype=np.float32)
+        iters = max(1, args.iters // (10 if n >= 1000 else 1))
+        legacy = _time_ms(lambda: _legacy_nms_dets(dets, thr), iters)
+        vector = _time_ms(lambda: nms.nms_dets(dets, thr), iters)
+        arrays = _time_ms(lambda: nms.nms_arrays(boxes, scores, cls, thr), iters)
+        soft = _time_ms(lambda: nms.nms_arrays(boxes, scores, cls, thr, soft_sigma=0.5), iters)
+        same = _legacy_nms_dets(dets, thr) == nms.nms_dets(dets, thr)
+        print(f"  {n:6d} {legacy:9.3f} {vector:9.3f} {arrays:9.3f} {soft:9.3f}  {same}")
+
+
+# -----------------------------
+# MJPEG streamer under viewer load
+# -----------------------------
+def _stream_viewers(port: int, n_clients: int, n_stalled: int, seconds: float, out) -> None:
+    """
+    Child process: n_clients reading viewers + n_stalled that connect and
+    never read, all on one selector so the viewers' cost stays out of the
+    server's process.
+    """
+    import selectors
+    import socket
+
+    sel = selectors.DefaultSelector()
+    socks = []
+    counts = [0] * n_clients
+    tails = [b""] * n_clients
+    for i in range(n_clients + n_stalled):
+        sock = socket.create_connection(("127.0.0.1", port), timeout=2.0)
+        if i >= n_clients:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.sendall(b"GET /stream.mjpg HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        sock.setblocking(False)
+        socks.append(sock)
+        if i < n_clients:
+            sel.register(sock, selectors.EVENT_READ, i)
+    out.put("connected")
+    t_start = time.time() + 0.5
+    t_end = t_start + seconds
+    counting = False
+    while time.time() < t_end:
+        if not counting and time.time() >= t_start:
+            # frames queued while the others were connecting don't count
+            counting = True
+            counts = [0] * n_clients
+        for key, _ in sel.select(timeout=0.1):
+            i = key.data
+            try:
+                data = key.fileobj.recv(1 << 16)
+            except BlockingIOError:
+                continue
+            if not data:
+                sel.unregister(key.fileobj)
+                continue
+            # boundaries may straddle two reads
+            buf = tails[i] + data
+            counts[i] += buf.count(b"--frame\r\n")
+            tails[i] = buf[-8:]
+    for sock in socks:
+        sock.close()
+    out.put(counts)
+
+
+def _rss_mb() -> float:
+    # current (not peak) RSS
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+
+
+def _stream_run(server: str, n_clients: int, n_stalled: int, seconds: float, fps: float) -> Dict[str, float]:
+    import multiprocessing
+
+    if server == "asyncio":
+        from stream_server import AsyncStreamServer as Streamer
+    else:
+        from mjpeg_streamer import MjpegStreamer as Streamer
+
+    streamer = Streamer(host="127.0.0.1", port=0, stream_fps=fps)
+    streamer.start()
+
+    # synthetic annotated frames at camera rate, each one different
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    frame = base.copy()
+    stop = threading.Event()
+
+    def feed() -> None:
+        i = 0
+        while not stop.is_set():
+            np.copyto(frame, base)
+            cv2.putText(frame, f"frame {i}", (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 255, 0), 3)
+            streamer.update_bgr(frame)
+            i += 1
+            time.sleep(1.0 / 30.0)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    time.sleep(0.5)
+    rss0, threads0 = _rss_mb(), threading.active_count()
+
+    ctx = multiprocessing.get_context("spawn")
+    q = ctx.Queue()
+    viewers = ctx.Process(target=_stream_viewers, args=(streamer.port, n_clients, n_stalled, seconds, q))
+    viewers.start()
+    q.get(timeout=30)
+    # same window as the viewers' counting
+    time.sleep(0.5)
+    feed = streamer.feeds["annotated"]
+    c0, e0, n0, t0 = time.process_time(), feed.encode_cpu_s, feed.encoded, time.time()
+    time.sleep(seconds)
+    cpu_s = time.process_time() - c0
+    enc_s = feed.encode_cpu_s - e0
+    wall_s = time.time() - t0
+    encoded = feed.encoded - n0
+    rss1, threads1 = _rss_mb(), threading.active_count()
+    st = streamer.stats()["feeds"]["annotated"]
+    counts = q.get(timeout=30)
+    viewers.join(timeout=5)
+    stop.set()
+    feeder.join(timeout=1.0)
+    streamer.stop()
+
+    client_fps = np.asarray(counts, dtype=np.float64) / seconds
+    n = max(n_clients + n_stalled, 1)
+    return {
+        "encoded": encoded,
+        "encode_ms": st["encode_ms_mean"],
+        "encoder_cpu_pct": 100.0 * enc_s / wall_s,
+        # everything in the process except the encoder (serving + frame feed)
+        "serve_cpu_pct": 100.0 * (cpu_s - enc_s) / wall_s,
+        "rss_per_client_kb": (rss1 - rss0) * 1024.0 / n,
+        "threads": threads1 - threads0,
+        "client_fps_mean": float(client_fps.mean()) if n_clients else 0.0,
+        "client_fps_min": float(client_fps.min()) if n_clients else 0.0,
+    }
+
+
+def cmd_stream(args: argparse.Namespace) -> None:
+    print(f"MJPEG streamer, 640x480 @30 fps in, stream_fps={args.fps:g}, {args.seconds:g}s per run, {args.stalled} stalled viewers")
+    print(
+        f"  {'server':>8} {'clients':>7} {'encoded':>8} {'enc ms':>7} {'enc CPU':>8} {'serve CPU':>9} "
+        f"{'KB/client':>9} {'+threads':>8} {'fps mean':>9} {'fps min':>8}"
+    )
+    for server in args.server.split(","):
+        for n in (int(c) for c in args.clients.split(",")):
+            r = _stream_run(server, n, args.stalled, args.seconds, args.fps)
+            print(
+                f"  {server:>8} {n:7d} {r['encoded']:8d} {r['encode_ms']:7.2f} {r['encoder_cpu_pct']:7.1f}% "
+                f"{r['serve_cpu_pct']:8.1f}% {r['rss_per_client_kb']:9.1f} {r['threads']:8d} "
+                f"{r['client_fps_mean']:9.2f} {r['client_fps_min']:8.2f}"
+            )
+
+
+# -----------------------------
+# detector model selection
+# -----------------------------
+def _model_names(value: str) -> List[str]:
+    names = [n for n in value.split(",") if n]
+    unknown = [n for n in names if n not in BENCH_MODELS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown model(s) {', '.join(unknown)} (choose from {', '.join(sorted(BENCH_MODELS))})"
+        )
+    return names
+
+
+def cmd_bench(args: argparse.Namespace) -> None:
+    import json
+
+    report = model_bench.run(
+        args.frames,
+        threads=args.threads,
+        models=args.models,
+        gt_path=args.gt,
+        labels_path=args.labels,
+        iou_thresh=args.iou,
+        limit=args.limit,
+        tag=args.tag,
+    )
+    md = model_bench.to_markdown(report)
+    print(md)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.md:
+        with open(args.md, "w", encoding="utf-8") as f:
+            f.write(md)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m perf")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("latency", help="frame hand-off wake-up latency")
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--fps", type=float, default=30.0)
+    p.set_defaults(func=cmd_latency)
+
+    p = sub.add_parser("preprocess", help="CocoDetector preprocessing, legacy vs fused LUT path")
+    p.add_argument("--iters", type=int, default=200)
+    p.set_defaults(func=cmd_preprocess)
+
+    p = sub.add_parser("nms", help="class-wise NMS, legacy vs vectorized")
+    p.add_argument("--iters", type=int, default=50)
+    p.set_defaults(func=cmd_nms)
+
+    p = sub.add_parser("stream", help="MJPEG streamer: CPU, memory and per-client fps under 1..N viewers")
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--clients", default="1,5,20")
+    p.add_argument("--stalled", type=int, default=0, help="extra viewers that connect and never read")
+    p.add_argument("--server", default="threaded,asyncio", help="comma-separated: threaded, asyncio")
+    p.add_argument("--fps", type=float, default=variables.STREAM_FPS, help="stream_fps of the streamer")
+    p.set_defaults(func=cmd_stream)
+
+    p = sub.add_parser("bench", help="detector models over recorded frames: latency, RSS, precision/recall")
+    p.add_argument("--frames", required=True, help="directory of frames (jpg/png) or a Recorder directory")
+    p.add_argument("--threads", type=int, default=variables.TFLITE_THREADS)
+    p.add_argument("--models", type=_model_names, default=None, help="comma-separated subset of " + ",".join(sorted(BENCH_MODELS)))
+    p.add_argument("--gt", default=None, help="ground-truth JSON for per-class precision/recall")
+    p.add_argument("--labels", default=variables.COCO_LABELS_PATH)
+    p.add_argument("--iou", type=float, default=0.5)
+    p.add_argument("--limit", type=int, default=None, help="use the first N frames")
+    p.add_argument("--tag", default="", help="release / build label stored in the report")
+    p.add_argument("--json", default=None, help="write the full report here")
+    p.add_argument("--md", default=None, help="write the markdown table here")
+    p.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
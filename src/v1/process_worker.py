@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import queue
+import time
+import traceback
+from collections import ChainMap
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import variables
+from module import Module
+from module_worker import ModuleWorker, ScheduleStats
+from results_store import ResultsStore
+from shm_ring import SharedFrameReader, SharedFrameRing
+
+
+class RemoteModule(Module):
+    """
+    Stand-in for a Module that lives in a child process.
+    Copies the scheduling attributes of `cls` without instantiating it; the
+    real module (and its TFLite interpreter) is built inside the child.
+    """
+
+    def __init__(self, cls, *args: Any, **kwargs: Any) -> None:
+        super().__init__()
+        self.cls = cls
+        self.args = args
+        self.kwargs = kwargs
+        self.name = cls.name
+        self.hz = cls.hz
+        self.priority = cls.priority
+        self.needs_frame = cls.needs_frame
+        self.cpu_heavy = cls.cpu_heavy
+        self.scene_gated = cls.scene_gated
+        self.depends_on = cls.depends_on
+        self.rate_settings = cls.rate_settings
+
+    def process(self, frame: np.ndarray, state: Dict[str, Any]) -> None:
+        raise RuntimeError("RemoteModule runs through ProcessModuleWorker")
+
+
+def _child_main(cls, args, kwargs, priority: int, req_q, res_q) -> None:
+    """
+    Child process loop: build the module, then serve requests
+    (req_id, frame_id, ring_name, slot, slots, shape, dtype, inputs) -> (req_id, 'ok', out, dt)
+    until None.
+    """
+    try:
+        os.nice(max(0, int(priority)))
+    except (AttributeError, OSError):
+        pass
+    try:
+        module = cls(*args, **kwargs)
+    except Exception:
+        res_q.put((0, "error", traceback.format_exc(), 0.0))
+        return
+    res_q.put((0, "ready", None, 0.0))
+
+    reader = SharedFrameReader()
+    try:
+        while True:
+            msg = req_q.get()
+            if msg is None:
+                break
+            req_id, frame_id, ring_name, slot, slots, shape, dtype, inputs = msg
+            frame = reader.view(ring_name, slot, slots, shape, dtype) if ring_name else None
+            module.frame_id = frame_id
+            out: Dict[str, Any] = {}
+            t0 = time.time()
+            try:
+                module.process(frame, ChainMap(out, inputs))
+            except Exception:
+                res_q.put((req_id, "error", traceback.format_exc(), time.time() - t0))
+                continue
+            finally:
+                frame = None
+            res_q.put((req_id, "ok", out, time.time() - t0))
+    finally:
+        reader.close()
+
+
+class ChildProcessFailed(RuntimeError):
+    """
+    The child process exited, or stopped answering.
+    """
+
+
+class ProcessModuleWorker(ModuleWorker):
+    """
+    ModuleWorker whose module runs in its own process.
+    Scheduling, gating and publishing stay in this (parent) thread; only the
+    process() call is remote:
+    - the frame is copied once into the shared ring (shared by all process
+      workers) and the child reads it zero-copy
+    - the child gets a plain-dict copy of the current results as its state
+    - only the module's (small) output dict comes back and is published
+      under the same state keys as in thread mode
+    A slot stays pinned until the child answers for it, including answers
+    that arrive after PROCESS_RESULT_TIMEOUT_S (they are dropped). A child
+    that exits, or still hasn't answered a timed-out request one timeout
+    later, is restarted, up to PROCESS_MAX_RESTARTS times; after that the
+    module is marked dead and its worker stops.
+    """
+
+    def __init__(self, module: RemoteModule, store: ResultsStore, source, ring: SharedFrameRing,
+                 gate=None, stats: Optional[ScheduleStats] = None):
+        super().__init__(module, store, source, gate=gate, stats=stats)
+        self.ring = ring
+        self._req_id = 0
+        # req_id -> ring slot (-1 without frame) of requests that timed out
+        self._late: Dict[int, int] = {}
+        self.restarts = 0
+        self._spawn()
+
+    def _spawn(self) -> None:
+        module = self.module
+        ctx = mp.get_context("spawn")
+        self._req_q = ctx.Queue()
+        self._res_q = ctx.Queue()
+        self._proc = ctx.Process(
+            target=_child_main,
+            args=(module.cls, module.args, module.kwargs, module.priority, self._req_q, self._res_q),
+            name=f"pathpal-{module.name}",
+            daemon=True,
+        )
+
+    def _start_child(self) -> None:
+        """
+        Start the child and wait for its "ready"; raises ChildProcessFailed if
+        it exits or is not ready within PROCESS_START_TIMEOUT_S.
+        """
+        self._proc.start()
+        deadline = time.time() + variables.PROCESS_START_TIMEOUT_S
+        while True:
+            try:
+                _, status, detail, _ = self._res_q.get(timeout=0.5)
+                break
+            except queue.Empty:
+                if not self._proc.is_alive():
+                    # an init error is sent right before the child exits
+                    try:
+                        _, status, detail, _ = self._res_q.get(timeout=0.5)
+                        break
+                    except queue.Empty:
+                        self._check_alive()
+                if time.time() > deadline:
+                    self._proc.terminate()
+                    self._proc.join(timeout=1.0)
+                    raise ChildProcessFailed(f"module '{self.module.name}' child process not ready "
+                                             f"within {variables.PROCESS_START_TIMEOUT_S:.1f} s")
+        if status != "ready":
+            raise RuntimeError(f"module '{self.module.name}' failed to start in child process:\n{detail}")
+
+    def start(self):
+        self._start_child()
+        super().start()
+
+    def stop(self):
+        super().stop()
+        self._stop_child()
+
+    def _stop_child(self) -> None:
+        if self._proc.is_alive():
+            self._req_q.put(None)
+            self._proc.join(timeout=2.0)
+            if self._proc.is_alive():
+                self._proc.terminate()
+                self._proc.join(timeout=1.0)
+
+    def _restart_child(self) -> None:
+        self.restarts += 1
+        self._proc.terminate()
+        self._proc.join(timeout=2.0)
+        # the old child is gone: nothing reads its slots any more
+        for slot in self._late.values():
+            if slot >= 0:
+                self.ring.release(slot)
+        self._late.clear()
+        self._spawn()
+        self._start_child()
+
+    def _recover(self, exc: Exception) -> bool:
+        if not isinstance(exc, ChildProcessFailed):
+            return False
+        name = self.module.name
+        print(f"[ERROR] {exc}")
+        if self.restarts < variables.PROCESS_MAX_RESTARTS:
+            print(f"[WARN] restarting '{name}' child ({self.restarts + 1}/{variables.PROCESS_MAX_RESTARTS})")
+            try:
+                self._restart_child()
+                return True
+            except RuntimeError as e:
+                print(f"[ERROR] {e}")
+        print(f"[ERROR] module '{name}' marked dead after {self.restarts} restart(s)")
+        self.dead = True
+        self._running = False
+        return True
+
+    def _run(self, frame: Optional[np.ndarray], frame_id: int, state: ChainMap) -> bool:
+        if self._late:
+            self._drain_late()
+        self._req_id += 1
+        req_id = self._req_id
+        inputs = dict(state.maps[1])
+        slot = -1
+        if frame is not None:
+            slot = self.ring.acquire(frame, frame_id)
+            msg = (req_id, frame_id, self.ring.name, slot, self.ring.slots, self.ring.shape, self.ring.dtype.str, inputs)
+        else:
+            msg = (req_id, frame_id, None, 0, 0, None, None, inputs)
+        try:
+            self._req_q.put(msg)
+            status, out = self._wait_result(req_id)
+            if status == "timeout":
+                # the child may still be reading the slot: keep it pinned
+                # until its (late) answer arrives
+                self._late[req_id] = slot
+                slot = -1
+        finally:
+            if slot >= 0:
+                self.ring.release(slot)
+        if status == "ok":
+            state.update(out)
+            return True
+        if variables.DEBUG:
+            print(f"[WARN] {self.module.name} child: {status} {out}")
+        # error / timeout: the module's last good results stay published
+        return False
+
+    def _drop_late(self, rid: int) -> None:
+        slot = self._late.pop(rid, None)
+        if slot is not None and slot >= 0:
+            self.ring.release(slot)
+
+    def _drain_late(self) -> None:
+        """
+        Wait for the answers to timed-out requests before sending another
+        (the child works through requests in order, so it is busy anyway).
+        """
+        deadline = time.time() + variables.PROCESS_RESULT_TIMEOUT_S
+        while self._late:
+            try:
+                rid, _, _, _ = self._res_q.get(timeout=0.5)
+            except queue.Empty:
+                self._check_alive()
+                if time.time() > deadline:
+                    raise ChildProcessFailed(f"module '{self.module.name}' child process stopped answering")
+                continue
+            self._drop_late(rid)
+
+    def _check_alive(self) -> None:
+        if not self._proc.is_alive():
+            raise ChildProcessFailed(f"module '{self.module.name}' child process exited "
+                                     f"(code {self._proc.exitcode})")
+
+    def _wait_result(self, req_id: int):
+        deadline = time.time() + variables.PROCESS_RESULT_TIMEOUT_S
+        while True:
+            try:
+                rid, status, out, _ = self._res_q.get(timeout=0.5)
+            except queue.Empty:
+                self._check_alive()
+                if time.time() > deadline:
+                    return "timeout", f"no answer within {variables.PROCESS_RESULT_TIMEOUT_S:.1f} s"
+                continue
+            if rid == req_id:
+                return status, out
+            # late answer to a request that already timed out: drop it, unpin its slot
+            self._drop_late(rid)
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import glob
+import os
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import variables
+from module import Module
+
+
+# -----------------------------
+# System probe
+# -----------------------------
+class SystemProbe:
+    """
+    CPU temperature and load from sysfs/procfs under `root`.
+    Point `root` at a directory with the same layout
+    (sys/class/thermal/thermal_zone*/temp, proc/stat) to drive the
+    controller from files instead of the real machine.
+    """
+
+    def __init__(self, root: str = variables.RATE_CTL_SYS_ROOT) -> None:
+        self.root = root
+        self._last_cpu: Optional[Tuple[int, int]] = None
+
+    def temperature_c(self) -> Optional[float]:
+        """
+        Hottest thermal zone in degrees C (sysfs reports millidegrees).
+        """
+        temps: List[float] = []
+        for path in glob.glob(os.path.join(self.root, "sys/class/thermal/thermal_zone*/temp")):
+            try:
+                with open(path) as f:
+                    temps.append(int(f.read().strip()) / 1000.0)
+            except (OSError, ValueError):
+                continue
+        return max(temps) if temps else None
+
+    def cpu_load(self) -> Optional[float]:
+        """
+        Busy fraction of all CPUs since the previous call (None on the first).
+        """
+        try:
+            with open(os.path.join(self.root, "proc/stat")) as f:
+                fields = f.readline().split()
+        except OSError:
+            return None
+        if not fields or fields[0] != "cpu":
+            return None
+        values = [int(v) for v in fields[1:9]]
+        idle = values[3] + values[4]  # idle + iowait
+        total = sum(values)
+        last, self._last_cpu = self._last_cpu, (idle, total)
+        if last is None or total <= last[1]:
+            return None
+        return 1.0 - (idle - last[0]) / (total - last[1])
+
+
+def module_settings(state: Mapping[str, Any], name: str) -> Dict[str, Any]:
+    """
+    Settings the controller currently wants for module `name` ({} if none).
+    """
+    ctl = state.get("rate_ctl") or {}
+    return ctl.get("settings", {}).get(name, {})
+
+
+# -----------------------------
+# Controller
+# -----------------------------
+class RateController:
+    """
+    Walks a ladder of load levels (variables.RATE_CTL_LEVELS, 0 = full speed)
+    to hold temperature, CPU load and per-module latency under their targets.
+    - step up (throttle) when any signal is above its high mark
+    - step down only when all signals are below their low marks
+    - at most one step per RATE_CTL_DWELL_S (hysteresis against flapping)
+    A level scales each managed module's hz and sets its interpreter thread
+    count (capped by RATE_CTL_MAX_THREADS) and whether it uses its small model.
+    """
+
+    def __init__(self, probe: Optional[SystemProbe] = None, levels: Optional[List[Dict[str, float]]] = None) -> None:
+        self.probe = probe if probe is not None else SystemProbe()
+        self.levels = levels if levels is not None else variables.RATE_CTL_LEVELS
+        self.level = 0
+        self.reason = "start"
+        self._changed_t = 0.0
+
+    def decide(self, temp_c: Optional[float], load: Optional[float], latency_ms: Mapping[str, float], now: float) -> int:
+        over: List[str] = []
+        under = True
+        if temp_c is not None:
+            if temp_c >= variables.RATE_CTL_TEMP_HIGH_C:
+                over.append(f"temp {temp_c:.0f}C")
+            under &= temp_c <= variables.RATE_CTL_TEMP_LOW_C
+        if load is not None:
+            if load >= variables.RATE_CTL_LOAD_HIGH:
+                over.append(f"load {load:.0%}")
+            under &= load <= variables.RATE_CTL_LOAD_LOW
+        for name, ms in latency_ms.items():
+            target = variables.RATE_CTL_TARGET_MS.get(name)
+            if target is None:
+                continue
+            if ms >= target * variables.RATE_CTL_LATENCY_HIGH:
+                over.append(f"{name} {ms:.0f}ms")
+            under &= ms <= target * variables.RATE_CTL_LATENCY_LOW
+
+        if now - self._changed_t < variables.RATE_CTL_DWELL_S:
+            return self.level
+        if over and self.level < len(self.levels) - 1:
+            self.level += 1
+            self.reason = "up: " + ", ".join(over)
+            self._changed_t = now
+        elif under and not over and self.level > 0:
+            self.level -= 1
+            self.reason = "down: all below targets"
+            self._changed_t = now
+        return self.level
+
+
+class RateControllerModule(Module):
+    """
+    Applies the controller once per second:
+    - hz of the managed modules is set on their (parent-side) Module, which
+      the scheduler reads for the next deadline
+    - threads / small_model go out through state["rate_ctl"]["settings"],
+      only those listed in the module's rate_settings; modules pick them up
+      in process() (works for process workers too)
+    Publishes state["rate_ctl"] with the level, the signals, the reason for
+    the last change and a one-line `status` for the overlay.
+    """
+    name = "rate_ctl"
+    hz = 1.0
+    priority = 0
+    needs_frame = False
+    cpu_heavy = False
+
+    def __init__(self, scheduler, controller: Optional[RateController] = None) -> None:
+        super().__init__()
+        self.scheduler = scheduler
+        self.ctl = controller if controller is not None else RateController()
+        self.base_hz: Dict[str, float] = {}
+
+    def process(self, frame, state: Dict[str, Any]) -> None:
+        workers = {n: self.scheduler.worker(n) for n in variables.RATE_CTL_MODULES}
+        workers = {n: w for n, w in workers.items() if w is not None}
+        for n, w in workers.items():
+            self.base_hz.setdefault(n, w.module.hz)
+
+        latency = {n: w.last_infer_ms for n, w in workers.items() if w.infer_count}
+        temp_c = self.ctl.probe.temperature_c()
+        load = self.ctl.probe.cpu_load()
+        level = self.ctl.decide(temp_c, load, latency, time.time())
+        lv = self.ctl.levels[level]
+
+        settings: Dict[str, Dict[str, Any]] = {}
+        for n, w in workers.items():
+            w.module.hz = self.base_hz[n] * lv["hz_scale"]
+            s: Dict[str, Any] = {"hz": w.module.hz}
+            if "threads" in w.module.rate_settings:
+                s["threads"] = min(int(lv["threads"]), variables.RATE_CTL_MAX_THREADS.get(n, variables.TFLITE_THREADS))
+            if "small_model" in w.module.rate_settings:
+                s["small_model"] = bool(lv["small_model"])
+            settings[n] = s
+
+        temp_s = f"{temp_c:.0f}C" if temp_c is not None else "--"
+        load_s = f"{load:.0%}" if load is not None else "--"
+        rates = " | ".join(_status(n, s) for n, s in settings.items())
+        state["rate_ctl"] = {
+            "level": level,
+            "temp_c": temp_c,
+            "cpu_load": load,
+            "latency_ms": latency,
+            "reason": self.ctl.reason,
+            "settings": settings,
+            "status": f"CTL L{level} {temp_s} {load_s} | {rates}",
+        }
+
+
+def _status(name: str, s: Mapping[str, Any]) -> str:
+    """
+    'coco 1.1Hz t2': only the settings the module applies.
+    """
+    out = f"{name} {s['hz']:.1f}Hz"
+    if "threads" in s:
+        out += f" t{s['threads']}"
+    if s.get("small_model"):
+        out += " small"
+    return out
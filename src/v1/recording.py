@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import variables
+from module import Module
+
+
+# -----------------------------
+# On-disk format
+# -----------------------------
+# <dir>/meta.json    : format, frame size, dtype, counts
+# <dir>/frames.mjpg  : concatenated JPEGs          (format "mjpeg")
+# <dir>/frames.raw   : fixed-size RGB frames, mmap (format "raw")
+# <dir>/index.bin    : one INDEX_DTYPE record per frame
+# <dir>/ranges.bin   : one RANGE_DTYPE record per ultrasonic reading
+FORMAT_VERSION = 1
+INDEX_DTYPE = np.dtype([("ts", "<f8"), ("offset", "<u8"), ("size", "<u4")])
+RANGE_DTYPE = np.dtype([("ts", "<f8"), ("cm", "<f4"), ("raw_cm", "<f4")])
+FRAMES_FILE = {"mjpeg": "frames.mjpg", "raw": "frames.raw"}
+
+
+class Recorder:
+    """
+    Appends grabbed frames (RGB uint8) and ultrasonic readings to a directory.
+    - "mjpeg": ~10x smaller, costs a JPEG encode per frame
+    - "raw"  : no encode; the replay side memory-maps the file
+    Both files are append-only, so a recording cut short by a crash is still
+    readable up to the last complete index record.
+    write_frame() only copies the frame into one of `queue_size` recorder
+    buffers; a writer thread encodes and writes them. When the writer falls
+    behind, the oldest queued frame is dropped (counted in `drops`), so the
+    grabber never waits on the disk. A change of frame size stops the frame
+    recording (logged; ranges keep going).
+    Thread-safe: frames come from the grabber thread, ranges from the main loop.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fmt: str = variables.RECORD_FORMAT,
+        jpeg_quality: int = variables.RECORD_JPEG_QUALITY,
+        queue_size: int = variables.RECORD_QUEUE_SIZE,
+    ) -> None:
+        if fmt not in FRAMES_FILE:
+            raise ValueError(f"unknown recording format {fmt!r} (use {' / '.join(FRAMES_FILE)})")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.fmt = fmt
+        self._encode = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+        self._frames = open(os.path.join(path, FRAMES_FILE[fmt]), "wb")
+        self._index = open(os.path.join(path, "index.bin"), "wb")
+        self._ranges = open(os.path.join(path, "ranges.bin"), "wb")
+        self._rec = np.zeros(1, dtype=INDEX_DTYPE)
+        self._range_rec = np.zeros(1, dtype=RANGE_DTYPE)
+        self._bgr: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.shape: Optional[Tuple[int, ...]] = None
+        self.frames = 0
+        self.ranges = 0
+        self.drops = 0
+        self.stopped_reason: Optional[str] = None
+        self._offset = 0
+        self._created = time.time()
+
+        # frame queue: grabber -> writer thread
+        self._queue_size = max(1, int(queue_size))
+        self._queue: Deque[Tuple[np.ndarray, float]] = deque()
+        self._free: List[np.ndarray] = []
+        self._cond = threading.Condition(threading.Lock())
+        self._accepting = True
+        self._writer = threading.Thread(target=self._write_loop, name="recorder", daemon=True)
+        self._writer.start()
+
+    def write_frame(self, frame: np.ndarray, ts: float) -> None:
+        """
+        Queue a copy of `frame` for the writer thread (never blocks on I/O).
+        """
+        with self._cond:
+            if not self._accepting:
+                return
+            if self.shape is None:
+                self.shape = tuple(frame.shape)
+                self._free = [np.empty_like(frame) for _ in range(self._queue_size)]
+            elif tuple(frame.shape) != self.shape:
+                self._accepting = False
+                self.stopped_reason = f"frame shape changed: {tuple(frame.shape)} != {self.shape}"
+                print(f"[REC] {self.stopped_reason}; frame recording stopped")
+                self._cond.notify_all()
+                return
+            if self._free:
+                buf = self._free.pop()
+            else:
+                # writer is behind: reuse the oldest queued frame's buffer
+                buf, _ = self._queue.popleft()
+                self.drops += 1
+            np.copyto(buf, frame)
+            self._queue.append((buf, ts))
+            self._cond.notify()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and self._accepting:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                buf, ts = self._queue.popleft()
+            try:
+                self._write(buf, ts)
+            finally:
+                with self._cond:
+                    self._free.append(buf)
+
+    def _write(self, frame: np.ndarray, ts: float) -> None:
+        with self._lock:
+            if self._frames.closed:
+                return
+            if self.frames == 0:
+                self._write_meta()
+            if self.fmt == "mjpeg":
+                if self._bgr is None:
+                    self._bgr = np.empty_like(frame)
+                cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=self._bgr)
+                ok, buf = cv2.imencode(".jpg", self._bgr, self._encode)
+                if not ok:
+                    return
+                data = buf.tobytes()
+            else:
+                data = frame.tobytes()
+            self._frames.write(data)
+
+            self._rec["ts"], self._rec["offset"], self._rec["size"] = ts, self._offset, len(data)
+            self._rec.tofile(self._index)
+            self._offset += len(data)
+            self.frames += 1
+
+    def write_range(self, cm: Optional[float], raw_cm: Optional[float], ts: float) -> None:
+        with self._lock:
+            if self._ranges.closed:
+                return
+            self._range_rec["ts"] = ts
+            self._range_rec["cm"] = np.nan if cm is None else cm
+            self._range_rec["raw_cm"] = np.nan if raw_cm is None else raw_cm
+            self._range_rec.tofile(self._ranges)
+            self.ranges += 1
+
+    def _write_meta(self) -> None:
+        h, w = self.shape[:2]
+        meta = {
+            "version": FORMAT_VERSION,
+            "format": self.fmt,
+            "width": w,
+            "height": h,
+            "channels": self.shape[2] if len(self.shape) > 2 else 1,
+            "dtype": "uint8",
+            "color": "RGB",
+            "created": self._created,
+            "frames": self.frames,
+            "ranges": self.ranges,
+        }
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    def close(self) -> None:
+        """
+        Write the frames still queued, then close the files.
+        """
+        with self._cond:
+            self._accepting = False
+            self._cond.notify_all()
+        self._writer.join()
+        with self._lock:
+            if self._frames.closed:
+                return
+            for f in (self._frames, self._index, self._ranges):
+                f.close()
+            if self.shape is not None:
+                self._write_meta()
+
+
+class Recording:
+    """
+    Read side of a Recorder directory: frame(i) -> RGB uint8 (a fresh array,
+    safe to keep or draw on), ts / ranges as numpy record arrays.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.fmt = self.meta["format"]
+        self.shape = (self.meta["height"], self.meta["width"], self.meta["channels"])
+        self.index = np.fromfile(os.path.join(path, "index.bin"), dtype=INDEX_DTYPE)
+        ranges_path = os.path.join(path, "ranges.bin")
+        self.ranges = np.fromfile(ranges_path, dtype=RANGE_DTYPE) if os.path.exists(ranges_path) else np.zeros(0, RANGE_DTYPE)
+
+        frames_path = os.path.join(path, FRAMES_FILE[self.fmt])
+        size = os.path.getsize(frames_path)
+        # drop index records whose frame bytes never made it to disk
+        self.index = self.index[self.index["offset"] + self.index["size"] <= size]
+        if len(self.index):
+            self._data = np.memmap(frames_path, dtype=np.uint8, mode="r", shape=(size,))
+        else:
+            self._data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def ts(self) -> np.ndarray:
+        return self.index["ts"]
+
+    @property
+    def duration_s(self) -> float:
+        return float(self.ts[-1] - self.ts[0]) if len(self) > 1 else 0.0
+
+    def frame(self, i: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Frame `i`, written into `out` if given (same shape).
+        """
+        off, size = int(self.index["offset"][i]), int(self.index["size"][i])
+        buf = self._data[off:off + size]
+        if self.fmt == "raw":
+            if out is None:
+                return np.array(buf).reshape(self.shape)
+            np.copyto(out, buf.reshape(self.shape))
+            return out
+        bgr = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=bgr if out is None else out)
+
+    def range_at(self, ts: float) -> Optional[np.void]:
+        """
+        Last ultrasonic reading at or before `ts` (None before the first).
+        """
+        i = int(np.searchsorted(self.ranges["ts"], ts, side="right")) - 1
+        return self.ranges[i] if i >= 0 else None
+
+
+# -----------------------------
+# Replay camera
+# -----------------------------
+class ReplayCamera:
+    """
+    Camera-compatible backend that serves a Recording.
+    - "realtime": frames released on their recorded timestamps, scaled by
+      1/speed (speed=4.0 plays 4x faster)
+    - "fast"    : as fast as read() is called
+    read() returns None once the recording is exhausted (`finished` is then
+    True) unless `loop`. clock() maps wall time to recording time so sensor
+    replays stay aligned with the frames.
+    """
+
+    def __init__(self, path: str, mode: str = variables.CAMERA_REPLAY_MODE, speed: float = variables.CAMERA_REPLAY_SPEED, loop: bool = variables.CAMERA_REPLAY_LOOP) -> None:
+        if mode not in ("realtime", "fast"):
+            raise ValueError(f"unknown replay mode {mode!r} (use realtime / fast)")
+        self.rec = Recording(path)
+        if not len(self.rec):
+            raise RuntimeError(f"recording {path} has no frames")
+        self.mode = mode
+        self.speed = max(float(speed), 1e-3)
+        self.loop = loop
+        self.size = (self.rec.shape[1], self.rec.shape[0])
+        self.backend = "replay"
+        self.finished = False
+        self.frames_served = 0
+        self.last_ts = float(self.rec.ts[0])
+        self._i = 0
+        self._t0_wall: Optional[float] = None
+        self._t0_rec = float(self.rec.ts[0])
+
+    def clock(self) -> float:
+        """
+        Current position in recording time.
+        """
+        if self.mode == "fast" or self._t0_wall is None:
+            return self.last_ts
+        return self._t0_rec + (time.time() - self._t0_wall) * self.speed
+
+    def read(self, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        if out is not None and out.shape != self.rec.shape:
+            out = None
+        if self._i >= len(self.rec):
+            if not self.loop:
+                self.finished = True
+                return None
+            self._i = 0
+            self._t0_wall = None
+        ts = float(self.rec.ts[self._i])
+        if self.mode == "realtime":
+            if self._t0_wall is None:
+                self._t0_wall, self._t0_rec = time.time(), ts
+            wait = self._t0_wall + (ts - self._t0_rec) / self.speed - time.time()
+            if wait > 0:
+                time.sleep(wait)
+        frame = self.rec.frame(self._i, out=out)
+        self._i += 1
+        self.last_ts = ts
+        self.frames_served += 1
+        return frame
+
+    def close(self) -> None:
+        self.finished = True
+
+
+class ReplayRangeModule(Module):
+    """
+    Stands in for UltrasonicModule during replay: publishes the recorded
+    readings (same state keys) in step with the replay camera's clock.
+    A missed echo writes only range_raw_cm, like the live sensor; the last
+    range_cm / range_ts / obstacle_near stay published.
+    """
+    name = "ultrasonic"
+    hz = 15.0
+    priority = 0
+    needs_frame = False
+    cpu_heavy = False
+
+    def __init__(self, cam: ReplayCamera) -> None:
+        super().__init__()
+        self.cam = cam
+
+    def process(self, frame, state: Dict[str, Any]) -> None:
+        r = self.cam.rec.range_at(self.cam.clock())
+        if r is None:
+            return
+        raw = None if np.isnan(r["raw_cm"]) else float(r["raw_cm"])
+        state['range_raw_cm'] = raw
+        if np.isnan(r["cm"]):
+            return
+        cm = float(r["cm"])
+        state['range_cm'] = cm
+        state['range_ts'] = state.get('now_ts', 0.0)
+        state['obstacle_near'] = cm <= getattr(variables, 'OBSTACLE_NEAR_CM', 80.0)
+
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+
+@dataclass(frozen=True)
+class ResultSnapshot:
+    """
+    Immutable result of one module run.
+    - values   : state keys written by the module (read-only mapping)
+    - ts       : capture timestamp of the source frame (or publish time for sensors)
+    - frame_id : id of the source frame (0 if the module does not use frames)
+    - latency_ms : time spent inside module.process()
+    """
+    module: str
+    values: Mapping[str, Any]
+    ts: float
+    frame_id: int
+    latency_ms: float = 0.0
+
+
+class ResultsStore:
+    """
+    Per-module results with lock-free reads.
+
+    Writers compute outside any lock and call publish() with the finished
+    values. publish() builds a new snapshot dict plus a new merged view and
+    swaps both references in one assignment each, so readers never see a
+    half-written result and never block on an inference in flight.
+
+    The merged view keeps the flat keys the main loop already reads
+    ('coco_dets', 'faces', 'persons', 'range_cm', ...) and adds
+    '<module>_ts' / '<module>_frame_id' for every publishing module.
+    """
+
+    def __init__(self, defaults: Optional[Dict[str, Any]] = None) -> None:
+        # only serializes writers against each other; readers never take it
+        self._write_lock = threading.Lock()
+        self._defaults: Dict[str, Any] = dict(defaults or {})
+        self._snapshots: Mapping[str, ResultSnapshot] = MappingProxyType({})
+        self._view: Mapping[str, Any] = MappingProxyType(dict(self._defaults))
+        self.version: int = 0
+
+    def publish(
+        self,
+        module: str,
+        values: Mapping[str, Any],
+        ts: float,
+        frame_id: int = 0,
+        latency_ms: float = 0.0,
+    ) -> ResultSnapshot:
+        """
+        Atomically replace the snapshot of `module`. `values` are merged into
+        the module's previous values: keys a run does not write keep their
+        last published value (like the shared state dict did), so e.g. a
+        failed ultrasonic read keeps the last good range.
+        Lists are frozen into tuples so readers can't mutate shared results.
+        """
+        frozen = {k: tuple(v) if isinstance(v, list) else v for k, v in values.items()}
+        with self._write_lock:
+            prev = self._snapshots.get(module)
+            if prev is not None:
+                frozen = {**prev.values, **frozen}
+            snap = ResultSnapshot(
+                module=module,
+                values=MappingProxyType(frozen),
+                ts=ts,
+                frame_id=frame_id,
+                latency_ms=latency_ms,
+            )
+            snapshots = dict(self._snapshots)
+            snapshots[module] = snap
+
+            view = dict(self._defaults)
+            for s in snapshots.values():
+                view.update(s.values)
+                view[f"{s.module}_ts"] = s.ts
+                view[f"{s.module}_frame_id"] = s.frame_id
+
+            # reference swaps are atomic; readers see old or new, never a mix
+            self._snapshots = MappingProxyType(snapshots)
+            self._view = MappingProxyType(view)
+            self.version += 1
+        return snap
+
+    def view(self) -> Mapping[str, Any]:
+        """
+        Returns the latest merged state (read-only, safe to keep).
+        """
+        return self._view
+
+    def get(self, module: str) -> Optional[ResultSnapshot]:
+        return self._snapshots.get(module)
+
+    def snapshots(self) -> Mapping[str, ResultSnapshot]:
+        return self._snapshots
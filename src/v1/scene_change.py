@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+import variables
+
+
+class SceneChangeDetector:
+    """
+    Cheap "did anything change?" test on a tiny grayscale thumbnail.
+    - changed pixels : |thumb - reference| > pixel_thresh, as a fraction of
+      the thumbnail; catches objects moving into view
+    - histogram      : half L1 distance of 16-bin histograms (0..1); catches
+      global changes (lighting, camera turned)
+    The reference is the thumbnail of the last frame that was let through,
+    so slow drift still adds up to a change. `motion_mask` keeps the changed
+    pixels of the last check (uint8 0/255, thumbnail size).
+    """
+
+    def __init__(
+        self,
+        size: Tuple[int, int] = variables.SCENE_THUMB_SIZE,
+        pixel_thresh: int = variables.SCENE_PIXEL_THRESH,
+        changed_fraction: float = variables.SCENE_CHANGED_FRACTION,
+        hist_thresh: float = variables.SCENE_HIST_THRESH,
+    ) -> None:
+        self.size = size
+        self.pixel_thresh = pixel_thresh
+        self.changed_fraction = changed_fraction
+        self.hist_thresh = hist_thresh
+        w, h = size
+        self._small = np.empty((h, w, 3), dtype=np.uint8)
+        self._thumb = np.empty((h, w), dtype=np.uint8)
+        self._diff = np.empty((h, w), dtype=np.uint8)
+        self._ref: Optional[np.ndarray] = None
+        self._ref_hist: Optional[np.ndarray] = None
+        self.motion_mask = np.zeros((h, w), dtype=np.uint8)
+        self.last_fraction = 0.0
+        self.last_hist = 0.0
+
+    def _histogram(self, thumb: np.ndarray) -> np.ndarray:
+        hist = cv2.calcHist([thumb], [0], None, [16], [0, 256]).ravel()
+        return hist / max(float(hist.sum()), 1.0)
+
+    def update(self, frame: np.ndarray, force: bool = False) -> bool:
+        """
+        True if `frame` differs from the reference (or `force`); the frame
+        then becomes the new reference.
+        """
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_RGB2GRAY, dst=self._thumb)
+        hist = self._histogram(self._thumb)
+
+        changed = True
+        if self._ref is not None:
+            cv2.absdiff(self._thumb, self._ref, dst=self._diff)
+            cv2.threshold(self._diff, self.pixel_thresh, 255, cv2.THRESH_BINARY, dst=self.motion_mask)
+            self.last_fraction = cv2.countNonZero(self.motion_mask) / self.motion_mask.size
+            self.last_hist = 0.5 * float(np.abs(hist - self._ref_hist).sum())
+            changed = self.last_fraction > self.changed_fraction or self.last_hist > self.hist_thresh
+
+        if changed or force:
+            if self._ref is None:
+                self._ref = self._thumb.copy()
+            else:
+                self._ref[...] = self._thumb
+            self._ref_hist = hist
+            return True
+        return False
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import variables
+from module import Module
+from module_worker import ModuleWorker, ScheduleStats
+from process_worker import ProcessModuleWorker, RemoteModule
+from results_store import ResultsStore
+from shm_ring import SharedFrameRing
+
+
+class ComputeGate:
+    """
+    Counting semaphore that hands free slots to the lowest `priority` waiter
+    first (FIFO within a priority). Caps how many heavy modules infer at once
+    so they don't oversubscribe the cores.
+    """
+
+    def __init__(self, slots: int) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._free = max(1, int(slots))
+        self._waiting: List[Tuple[int, int]] = []
+        self._counter = itertools.count()
+
+    def acquire(self, priority: int) -> None:
+        with self._cond:
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._waiting, entry)
+            self._cond.wait_for(lambda: self._free > 0 and self._waiting[0] == entry)
+            heapq.heappop(self._waiting)
+            self._free -= 1
+            # another slot may still be free for the next waiter in line
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self._free += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int) -> Iterator[None]:
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class DeadlineScheduler:
+    """
+    Drives every registered Module at its declared `hz`:
+    - one ModuleWorker thread per module, sleeping until the module's deadline
+    - frame modules then take the newest frame; sensor modules run frameless
+    - cpu-heavy modules share `max_concurrent` compute slots by priority
+    - RemoteModule entries run in their own process and share one
+      shared-memory frame ring (variables.WORKER_BACKEND = 'process')
+    """
+
+    def __init__(self, store: ResultsStore, source, max_concurrent: int = variables.SCHED_MAX_CONCURRENT) -> None:
+        self.store = store
+        self.source = source
+        self.gate = ComputeGate(max_concurrent)
+        self.workers: Dict[str, ModuleWorker] = {}
+        self.ring = SharedFrameRing(slots=2)
+        self._remote_count = 0
+
+    def add(self, module: Module) -> ModuleWorker:
+        if module.name in self.workers:
+            raise ValueError(f"module '{module.name}' already registered")
+        if isinstance(module, RemoteModule):
+            self._remote_count += 1
+            self.ring.reserve(self._remote_count)
+            worker: ModuleWorker = ProcessModuleWorker(
+                module, self.store, self.source, self.ring, gate=self.gate, stats=ScheduleStats()
+            )
+        else:
+            worker = ModuleWorker(module, self.store, self.source, gate=self.gate, stats=ScheduleStats())
+        self.workers[module.name] = worker
+        return worker
+
+    def worker(self, name: str) -> Optional[ModuleWorker]:
+        return self.workers.get(name)
+
+    def start(self) -> None:
+        for w in self.workers.values():
+            w.start()
+
+    def stop(self) -> None:
+        for w in self.workers.values():
+            w.stop()
+        self.ring.close()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        for name, w in self.workers.items():
+            s = w.stats.summary()
+            s["hz"] = w.module.hz
+            s["last_ms"] = w.last_infer_ms
+            if w.dead:
+                s["dead"] = True
+            out[name] = s
+        return out
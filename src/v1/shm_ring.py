@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import threading
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class SharedFrameRing:
+    """
+    Fixed ring of frame slots in one multiprocessing.shared_memory segment.
+
+    Owned by the parent process:
+    - acquire(frame, seq) copies a frame in once (or reuses the slot if that
+      seq is already in the ring) and pins the slot
+    - release(slot) unpins it once the child has returned its result
+    Pinned slots are never overwritten, so children read zero-copy views
+    without any cross-process locking. With N consumers, N + 1 slots are
+    always enough.
+    """
+
+    def __init__(self, slots: int) -> None:
+        self.slots = max(2, int(slots))
+        self._lock = threading.Lock()
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self.shape: Optional[Tuple[int, ...]] = None
+        self.dtype: Optional[np.dtype] = None
+        self._views: List[np.ndarray] = []
+        self._seq: List[int] = [0] * self.slots
+        self._pins: List[int] = [0] * self.slots
+        self._next: int = 0
+
+    def reserve(self, consumers: int) -> None:
+        """
+        Size the ring for `consumers` pinning readers (before first use).
+        """
+        with self._lock:
+            if self._shm is not None:
+                raise RuntimeError("ring already allocated")
+            self.slots = max(2, int(consumers) + 1)
+            self._seq = [0] * self.slots
+            self._pins = [0] * self.slots
+
+    @property
+    def name(self) -> Optional[str]:
+        return self._shm.name if self._shm is not None else None
+
+    def _allocate(self, frame: np.ndarray) -> None:
+        self.shape = tuple(frame.shape)
+        self.dtype = frame.dtype
+        nbytes = int(frame.nbytes)
+        self._shm = shared_memory.SharedMemory(create=True, size=nbytes * self.slots)
+        self._views = [
+            np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf, offset=i * nbytes)
+            for i in range(self.slots)
+        ]
+
+    def acquire(self, frame: np.ndarray, seq: int) -> int:
+        """
+        Returns the pinned slot index holding frame `seq`.
+        """
+        with self._lock:
+            if self._shm is None:
+                self._allocate(frame)
+            elif tuple(frame.shape) != self.shape or frame.dtype != self.dtype:
+                raise ValueError(f"frame {frame.shape}/{frame.dtype} does not match ring {self.shape}/{self.dtype}")
+
+            for i in range(self.slots):
+                if self._seq[i] == seq:
+                    self._pins[i] += 1
+                    return i
+
+            for k in range(self.slots):
+                i = (self._next + k) % self.slots
+                if self._pins[i] == 0:
+                    break
+            else:
+                raise RuntimeError("all frame slots are pinned; ring too small")
+            self._next = (i + 1) % self.slots
+            np.copyto(self._views[i], frame)
+            self._seq[i] = seq
+            self._pins[i] = 1
+            return i
+
+    def release(self, slot: int) -> None:
+        with self._lock:
+            if self._pins[slot] > 0:
+                self._pins[slot] -= 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._views = []
+            if self._shm is not None:
+                try:
+                    self._shm.close()
+                except BufferError:
+                    # a view is still referenced somewhere; the OS frees the
+                    # mapping with the process, unlink the name regardless
+                    pass
+                try:
+                    self._shm.unlink()
+                except FileNotFoundError:
+                    pass
+                self._shm = None
+
+
+class SharedFrameReader:
+    """
+    Child-side attachment: zero-copy numpy views onto the parent's ring.
+    """
+
+    def __init__(self) -> None:
+        self._attached: Dict[str, Tuple[shared_memory.SharedMemory, List[np.ndarray]]] = {}
+
+    def view(self, name: str, slot: int, slots: int, shape: Tuple[int, ...], dtype: str) -> np.ndarray:
+        if name not in self._attached:
+            # children started by multiprocessing share the parent's resource
+            # tracker, so attaching here doesn't add a second owner
+            shm = shared_memory.SharedMemory(name=name)
+            dt = np.dtype(dtype)
+            nbytes = int(np.prod(shape)) * dt.itemsize
+            views = [np.ndarray(shape, dtype=dt, buffer=shm.buf, offset=i * nbytes) for i in range(slots)]
+            self._attached[name] = (shm, views)
+        return self._attached[name][1][slot]
+
+    def close(self) -> None:
+        for shm, views in self._attached.values():
+            views.clear()
+            try:
+                shm.close()
+            except BufferError:
+                pass
+        self._attached.clear()
@@ -0,0 +1,421 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import variables
+from mjpeg_streamer import VIEW_HTML, EncodedFeed, MjpegStreamer
+
+STREAM_HEADER = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Age: 0\r\n"
+    b"Cache-Control: no-cache, private\r\n"
+    b"Pragma: no-cache\r\n"
+    b"Connection: close\r\n"
+    b"Content-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+    b"\r\n"
+)
+EVENTS_HEADER = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Connection: close\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"\r\n"
+    b"retry: 2000\r\n\r\n"
+)
+REASONS = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+# boxes are drawn by the browser over the low-res raw feed; coordinates in
+# the events are in full-frame pixels (w / h in each event)
+CANVAS_VIEW_HTML = b"""<html>
+<head>
+    <title>PathPal Stream</title>
+    <style>
+    html, body { margin: 0; padding: 0; background: #000; height: 100%; overflow: hidden; }
+    img, canvas { position: absolute; left: 0; top: 0; width: 100vw; height: 100vh; object-fit: contain; }
+    </style>
+</head>
+<body>
+    <img id="feed" src="/raw.mjpg" />
+    <canvas id="overlay"></canvas>
+    <script>
+    const img = document.getElementById("feed");
+    const canvas = document.getElementById("overlay");
+    const ctx = canvas.getContext("2d");
+    let last = null;
+    let queued = false;
+
+    function box(d, color, x0, y0, s) {
+        const [label, score, x1, y1, x2, y2] = d;
+        ctx.strokeStyle = color;
+        ctx.lineWidth = 2;
+        ctx.strokeRect(x0 + x1 * s, y0 + y1 * s, (x2 - x1) * s, (y2 - y1) * s);
+        ctx.fillStyle = color;
+        ctx.fillText(label + " " + score.toFixed(2), x0 + x1 * s + 2, Math.max(14, y0 + y1 * s - 4));
+    }
+
+    function draw() {
+        queued = false;
+        canvas.width = window.innerWidth;
+        canvas.height = window.innerHeight;
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        if (!last) return;
+        // same letterboxing as object-fit: contain on the <img>
+        const s = Math.min(canvas.width / last.w, canvas.height / last.h);
+        const x0 = (canvas.width - last.w * s) / 2;
+        const y0 = (canvas.height - last.h * s) / 2;
+        ctx.font = "14px sans-serif";
+        for (const d of last.boxes) box(d, "#ffff00", x0, y0, s);
+        for (const d of last.faces) box(d, "#00ffff", x0, y0, s);
+        const lines = [];
+        if (last.range_cm !== null) lines.push("DIST: " + last.range_cm.toFixed(2) + " cm");
+        lines.push("frame " + last.frame_id + "  age " + Math.max(0, Date.now() / 1000 - last.ts).toFixed(2) + " s");
+        for (const [name, ms] of Object.entries(last.latency_ms)) lines.push(name + ": " + ms.toFixed(1) + " ms");
+        ctx.fillStyle = "#00ff00";
+        ctx.font = "16px sans-serif";
+        lines.forEach((line, i) => ctx.fillText(line, 10, 24 + 20 * i));
+    }
+
+    function redraw() {
+        if (!queued) { queued = true; requestAnimationFrame(draw); }
+    }
+
+    new EventSource("/events").onmessage = (e) => { last = JSON.parse(e.data); redraw(); };
+    window.addEventListener("resize", redraw);
+    </script>
+</body>
+</html>
+"""
+
+
+class _AsyncClient:
+    """
+    One /stream.mjpg (or /events) viewer. Writes go straight to the
+    transport; a message is skipped while the previous one is still in the
+    write buffer, so a slow viewer holds at most one (partial) frame of
+    memory and always gets the newest message next.
+    """
+    __slots__ = ("transport", "sent", "skipped", "connected_ts")
+
+    def __init__(self, transport: asyncio.WriteTransport) -> None:
+        self.transport = transport
+        self.sent = 0
+        self.skipped = 0
+        self.connected_ts = time.time()
+
+    def send(self, chunk: bytes) -> None:
+        t = self.transport
+        if t.is_closing():
+            return
+        if t.get_write_buffer_size() > 0:
+            self.skipped += 1
+            return
+        t.write(chunk)
+        self.sent += 1
+
+
+class AsyncStreamServer(MjpegStreamer):
+    """
+    MjpegStreamer served from one asyncio event loop thread instead of a
+    thread per viewer. Same feeds and update_*/has_clients/stats API, same
+    encoder threads (one JPEG per frame for all viewers).
+    - /stream.mjpg    : annotated MJPEG, frames dropped for viewers that
+                        can't keep up
+    - /raw.mjpg       : raw camera MJPEG (the "raw" target)
+    - /stream/<name>.mjpg, /snapshot/<name>.jpg : any named target
+    - /streams        : list of targets
+    - /events         : Server-Sent Events, one JSON message per result
+                        (publish_event())
+    - /view, /        : raw feed with boxes drawn in the browser from /events
+    - /view/annotated : annotated feed
+    - /snapshot.jpg   : one JPEG of the latest annotated frame
+    - /stats.json     : streamer stats
+    - /telemetry.json : last set_telemetry() dict
+    """
+
+    def __init__(
+        self,
+        host: str = variables.STREAM_HOST,
+        port: int = variables.STREAM_PORT,
+        jpeg_quality: int = variables.STREAM_JPEG_QUALITY,
+        stream_fps: float = variables.STREAM_FPS,
+        targets: Optional[Dict[str, Dict[str, float]]] = None,
+        snapshot_timeout_s: float = variables.STREAM_SNAPSHOT_TIMEOUT_S,
+    ) -> None:
+        super().__init__(
+            host=host,
+            port=port,
+            jpeg_quality=jpeg_quality,
+            stream_fps=stream_fps,
+            targets=targets,
+        )
+        self.snapshot_timeout_s = float(snapshot_timeout_s)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._aserver: Optional[asyncio.AbstractServer] = None
+        self._start_error: Optional[BaseException] = None
+        # mutated on the loop thread only (read anywhere for counts)
+        self._event_clients: Set[_AsyncClient] = set()
+        self._snapshot_waiters: Dict[str, List[asyncio.Future]] = {name: [] for name in self.feeds}
+        self.events_published = 0
+
+    # -----------------------------
+    # lifecycle
+    # -----------------------------
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, args=(ready,), daemon=True, name="stream-server")
+        self._thread.start()
+        ready.wait()
+        if self._start_error is not None:
+            self._running = False
+            raise self._start_error
+        for feed in self.feeds.values():
+            feed.start()
+
+    def _serve(self, ready: threading.Event) -> None:
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        try:
+            self._aserver = loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, reuse_address=True)
+            )
+            # port 0 picks a free port
+            self.port = self._aserver.sockets[0].getsockname()[1]
+        except BaseException as e:
+            self._start_error = e
+            ready.set()
+            loop.close()
+            return
+        ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            tasks = [t for t in asyncio.all_tasks(loop) if not t.done()]
+            for t in tasks:
+                t.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    def stop(self) -> None:
+        if not self._running:
+            return
+        self._running = False
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=2.0)
+            except Exception:
+                pass
+            loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        for feed in self.feeds.values():
+            feed.stop()
+        self._thread = None
+        self._loop = None
+
+    async def _shutdown(self) -> None:
+        if self._aserver is not None:
+            self._aserver.close()
+        clients = list(self._event_clients)
+        for feed in self.feeds.values():
+            with feed.clients_lock:
+                clients.extend(feed.clients)
+        for c in clients:
+            c.transport.close()
+        for name, waiters in self._snapshot_waiters.items():
+            for f in waiters:
+                if not f.done():
+                    f.set_result(None)
+            waiters.clear()
+            self.feeds[name].pending = 0
+
+    # -----------------------------
+    # encoder / main loop -> event loop
+    # -----------------------------
+    def _publish(self, feed: EncodedFeed, chunk: bytes) -> None:
+        # encoder thread: one hop onto the loop per frame, not per viewer
+        self._call_soon(self._broadcast, feed, chunk, feed.latest_jpeg)
+
+    def _call_soon(self, fn, *args) -> None:
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            pass  # loop closed while stopping
+
+    def _broadcast(self, feed: EncodedFeed, chunk: bytes, jpg: Optional[bytes]) -> None:
+        with feed.clients_lock:
+            clients = list(feed.clients)
+        for c in clients:
+            c.send(chunk)
+        waiters = self._snapshot_waiters[feed.name]
+        if waiters:
+            for f in waiters:
+                if not f.done():
+                    f.set_result(jpg)
+            waiters.clear()
+            feed.pending = 0
+
+    def has_event_clients(self) -> bool:
+        return len(self._event_clients) > 0
+
+    def publish_event(self, event: Dict[str, Any]) -> None:
+        """
+        Send one JSON message to every /events client (serialized once,
+        here, in the caller's thread).
+        """
+        if not self._event_clients:
+            return
+        data = b"data: " + json.dumps(event, separators=(",", ":"), default=str).encode("utf-8") + b"\n\n"
+        self.events_published += 1
+        self._call_soon(self._broadcast_event, data)
+
+    def _broadcast_event(self, data: bytes) -> None:
+        for c in list(self._event_clients):
+            c.send(data)
+
+    # -----------------------------
+    # HTTP
+    # -----------------------------
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5.0)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+        parts = head.split(b"\r\n", 1)[0].split()
+        try:
+            if len(parts) < 2 or parts[0] != b"GET":
+                self._respond(writer, 405, "text/plain", b"GET only\n")
+            else:
+                path = parts[1].decode("latin-1").split("?", 1)[0]
+                if path in self.paths:
+                    await self._serve_stream(self.feeds[self.paths[path]], reader, writer)
+                elif path == "/events":
+                    await self._serve_events(reader, writer)
+                elif path in ("/view", "/"):
+                    self._respond(writer, 200, "text/html; charset=utf-8", CANVAS_VIEW_HTML)
+                elif path == "/view/annotated":
+                    self._respond(writer, 200, "text/html; charset=utf-8", VIEW_HTML)
+                elif path == "/snapshot.jpg":
+                    await self._serve_snapshot(self.feeds["annotated"], writer)
+                elif path.startswith("/snapshot/") and path.endswith(".jpg") and path[10:-4] in self.feeds:
+                    await self._serve_snapshot(self.feeds[path[10:-4]], writer)
+                elif path == "/streams":
+                    self._respond(writer, 200, "text/html; charset=utf-8", self._index_html())
+                elif path == "/stats.json":
+                    self._respond_json(writer, self.stats())
+                elif path == "/telemetry.json":
+                    self._respond_json(writer, self.telemetry())
+                else:
+                    self._respond(writer, 404, "text/plain", b"not found\n")
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _index_html(self) -> bytes:
+        rows = "".join(
+            f'<li><a href="/stream/{name}.mjpg">{name}</a> '
+            f'({feed.scale:g}x, q{feed.jpeg_quality}, {feed.fps:g} fps, {len(feed.clients)} watching) '
+            f'<a href="/snapshot/{name}.jpg">snapshot</a></li>'
+            for name, feed in self.feeds.items()
+        )
+        return (
+            "<html><head><title>PathPal streams</title></head><body>"
+            f'<ul>{rows}</ul><p><a href="/view">view</a> | <a href="/stats.json">stats</a></p>'
+            "</body></html>"
+        ).encode("utf-8")
+
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: int, content_type: str, body: bytes) -> None:
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Cache-Control: no-store\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1")
+            + body
+        )
+
+    def _respond_json(self, writer: asyncio.StreamWriter, obj: Any) -> None:
+        self._respond(writer, 200, "application/json", json.dumps(obj, default=str).encode("utf-8"))
+
+    async def _wait_closed(self, reader: asyncio.StreamReader) -> None:
+        # viewers never send anything; EOF means they went away
+        while self._running and await reader.read(4096):
+            pass
+
+    async def _serve_stream(self, feed: EncodedFeed, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(STREAM_HEADER)
+        client = _AsyncClient(writer.transport)
+        with feed.clients_lock:
+            feed.clients.add(client)
+        feed.wake()
+        try:
+            # a new viewer gets the last encoded frame right away
+            if feed.latest_chunk is not None:
+                client.send(feed.latest_chunk)
+            await self._wait_closed(reader)
+        finally:
+            with feed.clients_lock:
+                feed.clients.discard(client)
+
+    async def _serve_events(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(EVENTS_HEADER)
+        client = _AsyncClient(writer.transport)
+        self._event_clients.add(client)
+        try:
+            await self._wait_closed(reader)
+        finally:
+            self._event_clients.discard(client)
+
+    async def _serve_snapshot(self, feed: EncodedFeed, writer: asyncio.StreamWriter) -> None:
+        jpg = feed.latest_jpeg
+        if jpg is None or time.time() - feed.latest_ts > 1.0 / max(feed.fps, 0.1):
+            # stale: wait for the next encoded frame
+            waiters = self._snapshot_waiters[feed.name]
+            fut = self._loop.create_future()
+            waiters.append(fut)
+            feed.pending = len(waiters)
+            feed.wake()
+            try:
+                jpg = await asyncio.wait_for(fut, timeout=self.snapshot_timeout_s) or jpg
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if fut in waiters:
+                    waiters.remove(fut)
+                    feed.pending = len(waiters)
+        if jpg is None:
+            self._respond(writer, 503, "text/plain", b"no frame yet\n")
+        else:
+            self._respond(writer, 200, "image/jpeg", jpg)
+
+    def stats(self) -> Dict[str, Any]:
+        out = super().stats()
+        out["server"] = "asyncio"
+        for name, feed in self.feeds.items():
+            with feed.clients_lock:
+                clients = list(feed.clients)
+            out["feeds"][name]["buffered_bytes"] = [c.transport.get_write_buffer_size() for c in clients]
+        events = list(self._event_clients)
+        out["events"] = {
+            "clients": len(events),
+            "published": self.events_published,
+            "client_sent": [c.sent for c in events],
+            "client_skipped": [c.skipped for c in events],
+        }
+        return out
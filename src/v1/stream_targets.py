@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from det import Det
+from overlay import OverlayCompositor
+from scene_change import SceneChangeDetector
+from utils import annotate_bgr
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+@dataclass
+class TargetInput:
+    """
+    What the main loop has for the current frame.
+    - frame : RGB, shared with the workers (renderers must not write to it)
+    - dets / faces : the boxes the loop uses (flow / tracker adjusted)
+    - state : the ResultsStore view of this iteration
+    """
+    frame: np.ndarray
+    dets: Sequence[Det]
+    faces: Sequence[Det]
+    range_cm: Optional[float] = None
+    fps_loop: Optional[float] = None
+    fps_det: Optional[float] = None
+    status_lines: Optional[Sequence[str]] = None
+    state: Mapping[str, Any] = field(default_factory=dict)
+
+
+def _placeholder(text: str, size: Tuple[int, int]) -> np.ndarray:
+    w, h = size
+    img = np.zeros((h, w, 3), dtype=np.uint8)
+    cv2.putText(img, text, (10, h // 2), FONT, 0.5, (0, 200, 255), 1, cv2.LINE_AA)
+    return img
+
+
+def _fit(img: np.ndarray, out: np.ndarray) -> None:
+    """
+    Letterbox `img` into `out` (aspect kept, black bars).
+    """
+    oh, ow = out.shape[:2]
+    h, w = img.shape[:2]
+    s = min(ow / w, oh / h)
+    nw, nh = max(1, int(w * s)), max(1, int(h * s))
+    x0, y0 = (ow - nw) // 2, (oh - nh) // 2
+    out[...] = 0
+    cv2.resize(img, (nw, nh), dst=out[y0:y0 + nh, x0:x0 + nw], interpolation=cv2.INTER_AREA)
+
+
+class StreamTargets:
+    """
+    Renders the streamer's named targets; a renderer runs only while
+    streamer.due(name), i.e. someone is subscribed and the target's fps cap
+    allows a new frame. With no viewers a call costs a few dict lookups.
+    - annotated      : boxes + HUD (annotate_bgr)
+    - raw            : the camera frame
+    - detector_input : the detector's last input tensor at its native size
+                       (dequantized), with the boxes of the last run
+    - motion         : scene-change motion mask over the dimmed frame
+    - debug          : 2x2 of boxes / detector input / motion / stage timings
+    The detector copies its input tensor only while detector_input or debug
+    is watched. Without a local detector (process worker backend) those
+    panels show a placeholder. The motion mask is the detector worker's
+    scene gate; without one (SCENE_GATE off) a private detector compares
+    consecutive rendered frames. The motion panel is built at most once per
+    render() and shared by motion and debug.
+    """
+
+    def __init__(self, streamer, store, coco=None, coco_worker=None, scheduler=None, grabber=None) -> None:
+        self.streamer = streamer
+        self.store = store
+        self.detector = getattr(coco, "det", None)
+        self.scheduler = scheduler
+        self.grabber = grabber
+        self.scene: Optional[SceneChangeDetector] = getattr(coco_worker, "scene", None)
+        self._own_scene: Optional[SceneChangeDetector] = None
+        self._debug_overlay = OverlayCompositor("stream")
+        self._mosaic: Optional[np.ndarray] = None
+        self._motion_img: Optional[np.ndarray] = None  # this render()'s motion panel
+        self._renderers: Dict[str, Callable[[TargetInput], None]] = {
+            "annotated": self._annotated,
+            "raw": self._raw,
+            "detector_input": self._detector_input,
+            "motion": self._motion,
+            "debug": self._debug,
+        }
+        self.renders: Dict[str, int] = {name: 0 for name in self._renderers}
+
+    def render(self, inp: TargetInput) -> None:
+        s = self.streamer
+        if self.detector is not None:
+            self.detector.capture_input = s.wants("detector_input") or s.wants("debug")
+        self._motion_img = None
+        for name, fn in self._renderers.items():
+            if s.due(name):
+                fn(inp)
+                self.renders[name] += 1
+        self._motion_img = None
+
+    # -----------------------------
+    # targets
+    # -----------------------------
+    def _annotated(self, inp: TargetInput) -> None:
+        bgr = annotate_bgr(
+            frame_rgb=inp.frame,
+            persons=inp.dets,
+            faces=inp.faces,
+            fps_det=inp.fps_det,
+            fps_loop=inp.fps_loop,
+            range_cm=inp.range_cm,
+            status_lines=inp.status_lines,
+        )
+        self.streamer.update_bgr(bgr, feed="annotated")
+
+    def _raw(self, inp: TargetInput) -> None:
+        self.streamer.update_rgb(inp.frame, feed="raw")
+
+    def _detector_input(self, inp: TargetInput) -> None:
+        self.streamer.update_bgr(self._detector_input_bgr(inp), feed="detector_input")
+
+    def _motion(self, inp: TargetInput) -> None:
+        self.streamer.update_bgr(self._motion_bgr(inp.frame), feed="motion")
+
+    def _debug(self, inp: TargetInput) -> None:
+        h, w = inp.frame.shape[:2]
+        if self._mosaic is None or self._mosaic.shape[:2] != (h, w):
+            self._mosaic = np.zeros((h, w, 3), dtype=np.uint8)
+        m = self._mosaic
+        ch, cw = h // 2, w // 2
+        boxes = self._debug_overlay.compose(inp.frame, inp.dets, inp.faces, inp.range_cm, inp.fps_loop, inp.fps_det)
+        cv2.resize(boxes, (cw, ch), dst=m[:ch, :cw], interpolation=cv2.INTER_AREA)
+        _fit(self._detector_input_bgr(inp), m[:ch, cw:2 * cw])
+        cv2.resize(self._motion_bgr(inp.frame), (cw, ch), dst=m[ch:2 * ch, :cw], interpolation=cv2.INTER_AREA)
+        panel = m[ch:2 * ch, cw:2 * cw]
+        panel[...] = 0
+        for i, line in enumerate(self._stage_lines(inp)):
+            cv2.putText(panel, line, (6, 16 + 16 * i), FONT, 0.4, (0, 255, 0), 1, cv2.LINE_AA)
+        self.streamer.update_bgr(m, feed="debug")
+
+    # -----------------------------
+    # panels
+    # -----------------------------
+    def _detector_input_bgr(self, inp: TargetInput) -> np.ndarray:
+        det = self.detector
+        last = det.last_input if det is not None else None
+        if last is None:
+            text = "no detector input yet" if det is not None else "detector runs in another process"
+            return _placeholder(text, (320, 320))
+        x, (w, h) = last
+        img = cv2.cvtColor(det.pre.to_uint8(x), cv2.COLOR_RGB2BGR)
+        sx, sy = img.shape[1] / w, img.shape[0] / h
+        # the detector's own boxes (not moved by flow / tracker)
+        for d in inp.state.get("coco_dets", ()):
+            x1, y1, x2, y2 = d.bbox
+            cv2.rectangle(img, (int(x1 * sx), int(y1 * sy)), (int(x2 * sx), int(y2 * sy)), (0, 255, 255), 1)
+        cv2.putText(img, f"{x.shape[1]}x{x.shape[0]} {x.dtype}", (4, 14), FONT, 0.4, (0, 255, 0), 1, cv2.LINE_AA)
+        return img
+
+    def _motion_bgr(self, frame: np.ndarray) -> np.ndarray:
+        if self._motion_img is not None:
+            return self._motion_img
+        scene = self.scene
+        if scene is None:
+            if self._own_scene is None:
+                self._own_scene = SceneChangeDetector()
+            scene = self._own_scene
+            scene.update(frame, force=True)
+        h, w = frame.shape[:2]
+        img = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        cv2.convertScaleAbs(img, dst=img, alpha=0.5)
+        mask = cv2.resize(scene.motion_mask, (w, h), interpolation=cv2.INTER_NEAREST)
+        img[mask > 0] = (0, 0, 255)
+        cv2.putText(
+            img,
+            f"changed {scene.last_fraction * 100:.1f}%  hist {scene.last_hist:.2f}",
+            (10, 24), FONT, 0.6, (0, 255, 0), 1, cv2.LINE_AA,
+        )
+        self._motion_img = img
+        return img
+
+    def _stage_lines(self, inp: TargetInput) -> List[str]:
+        fps_loop = f"{inp.fps_loop:.1f}" if inp.fps_loop is not None else "--"
+        fps_det = f"{inp.fps_det:.1f}" if inp.fps_det is not None else "--"
+        lines = [f"loop {fps_loop} fps  det {fps_det} fps"]
+        sched = self.scheduler.stats() if self.scheduler is not None else {}
+        for name, snap in self.store.snapshots().items():
+            if name == "main":
+                continue
+            line = f"{name}: {snap.latency_ms:.1f} ms  #{snap.frame_id}"
+            st = sched.get(name)
+            if st:
+                line += f"  runs {st['runs']} miss {st['missed']} skip {st['skipped']}"
+            lines.append(line)
+        if self.detector is not None and self.detector.last_timings:
+            lines.append("coco " + " ".join(f"{k} {v:.1f}" for k, v in self.detector.last_timings.items()))
+        face_timings = inp.state.get("face_timings")
+        if face_timings:
+            lines.append("face " + " ".join(f"{k} {v:.1f}" for k, v in face_timings.items()))
+        pool = self.grabber.pool_metrics() if self.grabber is not None else {}
+        if pool:
+            lines.append(f"pool {pool['leased']}/{pool['size']} leased  drops {pool['drops']}")
+        watched = [f"{n}:{len(f.clients)}" for n, f in self.streamer.feeds.items() if f.clients]
+        lines.append("viewers " + (" ".join(watched) or "-"))
+        return lines
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# modules in src/v1 are imported top-level (`import nms`), as when run from src/v1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,131 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pytest
+
+from vendor_fdlite.nms import _overlap_similarity, non_maximum_suppression
+from vendor_fdlite.nms import weighted_non_maximum_suppression_arrays
+from vendor_fdlite.types import Detection
+
+NUM_KEYPOINTS = 6   # BlazeFace: eyes, nose, mouth, ears
+
+
+# -----------------------------
+# reference: _weighted_non_maximum_suppression before vectorization
+# -----------------------------
+def legacy_weighted_nms(
+    indexed_scores: List[Tuple[int, float]],
+    detections: List[Detection],
+    min_suppression_threshold: float,
+    min_score: Optional[float],
+) -> List[Detection]:
+    remaining_indexed_scores = list(indexed_scores)
+    remaining: List[Tuple[int, float]] = []
+    candidates: List[Tuple[int, float]] = []
+    outputs: List[Detection] = []
+
+    while len(remaining_indexed_scores):
+        detection = detections[remaining_indexed_scores[0][0]]
+        if min_score is not None and detection.score < min_score:
+            break
+        num_prev_indexed_scores = len(remaining_indexed_scores)
+        detection_bbox = detection.bbox
+        remaining.clear()
+        candidates.clear()
+        weighted_detection = detection
+        for (index, score) in remaining_indexed_scores:
+            remaining_bbox = detections[index].bbox
+            similarity = _overlap_similarity(remaining_bbox, detection_bbox)
+            if similarity > min_suppression_threshold:
+                candidates.append((index, score))
+            else:
+                remaining.append((index, score))
+        if len(candidates):
+            weighted = np.zeros((2 + len(detection), 2), dtype=np.float32)
+            total_score = 0.
+            for index, score in candidates:
+                total_score += score
+                weighted += detections[index].data * score
+            weighted /= total_score
+            weighted_detection = Detection(weighted, detection.score)
+        outputs.append(weighted_detection)
+        if num_prev_indexed_scores == len(remaining):
+            break
+        remaining_indexed_scores = list(remaining)
+    return outputs
+
+
+def _indexed(detections: List[Detection]) -> List[Tuple[int, float]]:
+    return sorted(enumerate(d.score for d in detections), key=lambda p: p[1], reverse=True)
+
+
+def _detections(centers: np.ndarray, n: int, jitter: float, seed: int, tie_levels: int = 0) -> List[Detection]:
+    """
+    n face detections in normalized coordinates around `centers`, with
+    keypoints inside each box (decoded BlazeFace output before NMS).
+    """
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        cx, cy = centers[rng.integers(len(centers))] + rng.normal(0, jitter, 2)
+        w, h = rng.uniform(0.05, 0.25, 2)
+        box = [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+        kps = np.column_stack([rng.uniform(box[0], box[2], NUM_KEYPOINTS),
+                               rng.uniform(box[1], box[3], NUM_KEYPOINTS)])
+        data = np.concatenate([box, kps.ravel()]).astype(np.float32)
+        score = float(rng.uniform(0.3, 1.0))
+        if tie_levels:
+            score = float(rng.integers(1, tie_levels + 1)) / tie_levels
+        out.append(Detection(data, score))
+    return out
+
+
+def _random_case(n: int, seed: int, tie_levels: int = 0) -> List[Detection]:
+    centers = np.random.default_rng(seed).uniform(0.1, 0.9, size=(max(1, n // 4), 2))
+    return _detections(centers, n, jitter=0.05, seed=seed, tie_levels=tie_levels)
+
+
+def _crowded_case(n: int, seed: int, tie_levels: int = 0) -> List[Detection]:
+    # two faces, every anchor around them firing: long candidate lists per merge
+    centers = np.array([[0.4, 0.5], [0.55, 0.5]])
+    return _detections(centers, n, jitter=0.01, seed=seed, tie_levels=tie_levels)
+
+
+def _assert_same(got: List[Detection], expected: List[Detection]) -> None:
+    assert len(got) == len(expected)
+    for g, e in zip(got, expected):
+        assert g.score == pytest.approx(e.score)
+        # boxes (rows 0, 1) and keypoints (rows 2..)
+        np.testing.assert_allclose(g.data[:2], e.data[:2], rtol=0, atol=1e-5)
+        np.testing.assert_allclose(g.data[2:], e.data[2:], rtol=0, atol=1e-5)
+
+
+@pytest.mark.parametrize("make", [_random_case, _crowded_case])
+@pytest.mark.parametrize("n", [1, 8, 64, 512])
+@pytest.mark.parametrize("tie_levels", [0, 3])
+@pytest.mark.parametrize("thr, min_score", [(0.3, 0.5), (0.3, None), (0.65, 0.75)])
+def test_weighted_nms_matches_legacy(make, n, tie_levels, thr, min_score):
+    dets = make(n, seed=n + tie_levels, tie_levels=tie_levels)
+    expected = legacy_weighted_nms(_indexed(dets), dets, thr, min_score)
+
+    _assert_same(non_maximum_suppression(dets, thr, min_score, weighted=True), expected)
+
+    boxes = np.stack([d.data for d in dets])
+    scores = np.array([d.score for d in dets], dtype=np.float32)
+    merged, merged_scores = weighted_non_maximum_suppression_arrays(boxes, scores, thr, min_score)
+    assert merged.shape == (len(expected), 2 + NUM_KEYPOINTS, 2)
+    _assert_same([Detection(b, s) for b, s in zip(merged, merged_scores)], expected)
+
+
+def test_weighted_nms_degenerate_boxes():
+    # empty and inverted boxes never merge, as with BBox.intersect
+    data = np.zeros((2 + NUM_KEYPOINTS, 2), dtype=np.float32)
+    dets = [
+        Detection(data.copy(), 0.9),
+        Detection(data.copy(), 0.8),
+        Detection(np.array([[0.5, 0.5], [0.4, 0.4]] + [[0.45, 0.45]] * NUM_KEYPOINTS, dtype=np.float32), 0.7),
+        Detection(np.array([[0.1, 0.1], [0.6, 0.6]] + [[0.3, 0.3]] * NUM_KEYPOINTS, dtype=np.float32), 0.6),
+    ]
+    expected = legacy_weighted_nms(_indexed(dets), dets, 0.3, None)
+    _assert_same(non_maximum_suppression(dets, 0.3, None, weighted=True), expected)
+    assert non_maximum_suppression([], 0.3, None, weighted=True) == []
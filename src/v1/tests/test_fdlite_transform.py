@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from vendor_fdlite import ArgumentError
+from vendor_fdlite.transform import array_to_tensor, image_to_tensor
+from vendor_fdlite.types import Rect
+
+
+def _frame(width: int = 640, height: int = 360) -> np.ndarray:
+    # smooth content plus noise, like a camera frame
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / width, y * 255 / height, (x + y) * 127 / (width + height)], axis=-1)
+    noise = rng.normal(0, 8, base.shape)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+ROIS = [
+    None,
+    Rect(320, 180, 200, 120, rotation=0., normalized=False),
+    Rect(320, 180, 120, 200, rotation=0., normalized=False),
+    Rect(600, 30, 160, 160, rotation=0., normalized=False),     # partly outside
+    Rect(100, 100, 40, 40, rotation=0., normalized=False),      # upscaled
+]
+
+
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.parametrize("size", [(128, 128), (256, 256)])
+def test_array_to_tensor_matches_pil_for_face_detection(roi, size):
+    # the settings FaceDetection uses: letterboxed, range [-1, 1]
+    frame = _frame()
+    kwargs = dict(output_size=size, keep_aspect_ratio=True, output_range=(-1, 1))
+    expected = image_to_tensor(Image.fromarray(frame), roi, **kwargs)
+    out = np.empty((size[1], size[0], 3), dtype=np.float32)
+    got = array_to_tensor(frame, roi, out=out, **kwargs)
+    assert got.tensor_data is out
+    assert got.padding == pytest.approx(expected.padding)
+    assert got.original_size == expected.original_size
+    diff = np.abs(got.tensor_data - expected.tensor_data)
+    # range is 2 wide: 3/255 of it is 6/255
+    assert diff.mean() < 6 / 255
+
+
+def test_image_to_tensor_numpy_input_takes_pil_path():
+    # landmark models call image_to_tensor with numpy frames; they must get
+    # the same tensor as with a PIL image
+    frame = _frame()
+    roi = Rect(0.5, 0.5, 0.3, 0.4, rotation=0., normalized=True)
+    kwargs = dict(output_size=(192, 192), keep_aspect_ratio=False, output_range=(0., 1.))
+    a = image_to_tensor(frame, roi, **kwargs)
+    b = image_to_tensor(Image.fromarray(frame), roi, **kwargs)
+    np.testing.assert_array_equal(a.tensor_data, b.tensor_data)
+
+
+def test_array_to_tensor_rejects_rotated_roi():
+    with pytest.raises(ArgumentError):
+        array_to_tensor(_frame(), Rect(0.5, 0.5, 0.3, 0.3, rotation=0.2, normalized=True))
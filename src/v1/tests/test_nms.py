@@ -0,0 +1,139 @@
+from fractions import Fraction
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+import nms
+from det import Det
+
+LABELS = ["person", "car", "bottle", "bicycle"]
+
+
+# -----------------------------
+# reference: nms.nms_dets before vectorization
+# -----------------------------
+def _legacy_iou(a, b) -> float:
+    ax1, ay1, ax2, ay2 = a
+    bx1, by1, bx2, by2 = b
+    iw = max(0, min(ax2, bx2) - max(ax1, bx1))
+    ih = max(0, min(ay2, by2) - max(ay1, by1))
+    inter = iw * ih
+    if inter <= 0:
+        return 0.0
+    area_a = max(0, ax2 - ax1) * max(0, ay2 - ay1)
+    area_b = max(0, bx2 - bx1) * max(0, by2 - by1)
+    denom = area_a + area_b - inter
+    return float(inter / denom) if denom > 0 else 0.0
+
+
+def legacy_nms_dets(dets: List[Det], iou_thresh: float) -> List[Det]:
+    out: List[Det] = []
+    by_label: Dict[str, List[Det]] = {}
+    for d in dets:
+        by_label.setdefault(d.label, []).append(d)
+    for group in by_label.values():
+        group = sorted(group, key=lambda d: d.score, reverse=True)
+        kept: List[Det] = []
+        for d in group:
+            if all(_legacy_iou(d.bbox, k.bbox) < iou_thresh for k in kept):
+                kept.append(d)
+        out.extend(kept)
+    out.sort(key=lambda d: d.score, reverse=True)
+    return out
+
+
+def _clustered_dets(n: int, seed: int, tie_levels: int = 0) -> List[Det]:
+    """
+    Clustered boxes over 4 labels in a 640x480 frame, like raw detector
+    output. tie_levels > 0 quantizes scores so many of them tie.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform((40, 40), (600, 440), size=(max(1, n // 8), 2))
+    dets = []
+    for _ in range(n):
+        cx, cy = centers[rng.integers(len(centers))] + rng.normal(0, 8, 2)
+        bw, bh = rng.uniform(20, 120, 2)
+        bbox = (int(cx - bw / 2), int(cy - bh / 2), int(cx + bw / 2), int(cy + bh / 2))
+        score = float(rng.random())
+        if tie_levels:
+            score = float(rng.integers(1, tie_levels + 1)) / tie_levels
+        dets.append(Det(label=LABELS[rng.integers(len(LABELS))], score=score, bbox=bbox))
+    return dets
+
+
+def _as_arrays(dets: List[Det], ids: Dict[str, int]):
+    boxes = np.array([d.bbox for d in dets], dtype=np.float64)
+    scores = np.array([d.score for d in dets], dtype=np.float64)
+    classes = np.array([ids[d.label] for d in dets], dtype=np.int64)
+    return boxes, scores, classes
+
+
+@pytest.mark.parametrize("n", [10, 100, 1000])
+@pytest.mark.parametrize("tie_levels", [0, 4])
+@pytest.mark.parametrize("thr", [0.3, 0.45, 0.5])
+def test_nms_matches_legacy(n, tie_levels, thr):
+    dets = _clustered_dets(n, seed=n + tie_levels, tie_levels=tie_levels)
+    expected = legacy_nms_dets(dets, thr)
+
+    assert nms.nms_dets(dets, thr) == expected
+
+    # class ids in first-appearance order reproduce the legacy tie order
+    first_seen: Dict[str, int] = {}
+    for d in dets:
+        first_seen.setdefault(d.label, len(first_seen))
+    boxes, scores, classes = _as_arrays(dets, first_seen)
+    keep, kept_scores = nms.nms_arrays(boxes, scores, classes, thr)
+    assert [dets[i] for i in keep] == expected
+    np.testing.assert_allclose(kept_scores, [d.score for d in expected])
+
+    # any other class numbering keeps the same boxes
+    boxes, scores, classes = _as_arrays(dets, {lbl: i for i, lbl in enumerate(LABELS)})
+    keep, _ = nms.nms_arrays(boxes, scores, classes, thr)
+    assert sorted(keep.tolist()) == sorted(dets.index(d) for d in expected)
+
+
+def test_nms_large_input_matches_legacy():
+    # above _MATRIX_MAX_BOXES the one-to-many path is used
+    dets = _clustered_dets(nms._MATRIX_MAX_BOXES + 200, seed=7, tie_levels=8)
+    assert nms.nms_dets(dets, 0.45) == legacy_nms_dets(dets, 0.45)
+
+
+@pytest.mark.parametrize("thr", [0.25, 0.45, 0.5, 0.6])
+def test_nms_exact_threshold_iou(thr):
+    # nested boxes with the same width: IoU = h_b / h_a == thr exactly, which
+    # the legacy loop suppresses (it keeps only iou < thr)
+    frac = Fraction(thr).limit_denominator(100)
+    h_b, h_a = frac.numerator, frac.denominator
+    a = Det("person", 0.9, (0, 0, 10, h_a))
+    b = Det("person", 0.8, (0, 0, 10, h_b))
+    assert _legacy_iou(a.bbox, b.bbox) == thr
+    dets = [a, b, Det("car", 0.8, b.bbox)]
+    expected = legacy_nms_dets(dets, thr)
+    assert expected == [a, dets[2]]
+    assert nms.nms_dets(dets, thr) == expected
+    for t in (thr - 1e-9, thr + 1e-9):
+        assert nms.nms_dets(dets, t) == legacy_nms_dets(dets, t)
+
+
+def test_nms_ties_across_classes_keep_legacy_order():
+    box = (10, 10, 50, 50)
+    dets = [
+        Det("car", 0.5, box),
+        Det("person", 0.7, box),
+        Det("person", 0.5, (200, 200, 240, 240)),
+        Det("car", 0.5, (200, 200, 240, 240)),
+        Det("person", 0.5, box),
+    ]
+    assert nms.nms_dets(dets, 0.45) == legacy_nms_dets(dets, 0.45)
+
+
+def test_nms_degenerate_boxes():
+    dets = [
+        Det("person", 0.9, (5, 5, 5, 5)),
+        Det("person", 0.8, (5, 5, 5, 5)),
+        Det("person", 0.7, (10, 10, 4, 4)),
+        Det("person", 0.6, (0, 0, 20, 20)),
+    ]
+    assert nms.nms_dets(dets, 0.45) == legacy_nms_dets(dets, 0.45)
+    assert nms.nms_dets([], 0.45) == []
@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from module_worker import ModuleWorker
+from recording import RANGE_DTYPE, ReplayRangeModule
+from results_store import ResultsStore
+
+
+def _replay(readings):
+    ranges = np.array(readings, dtype=RANGE_DTYPE)
+    rec = SimpleNamespace(range_at=lambda ts: ranges[np.searchsorted(ranges["ts"], ts, side="right") - 1])
+    clock = SimpleNamespace(t=0.0)
+    cam = SimpleNamespace(rec=rec, clock=lambda: clock.t)
+    return clock, ReplayRangeModule(cam)
+
+
+def test_missed_echo_keeps_last_range():
+    clock, module = _replay([(1.0, 40.0, 41.0), (2.0, np.nan, np.nan)])
+    store = ResultsStore()
+    worker = ModuleWorker(module, store, source=None)
+
+    clock.t = 1.0
+    worker._step(None, 1.0, 0)
+    clock.t = 2.0
+    worker._step(None, 2.0, 0)
+
+    view = store.view()
+    assert view["range_raw_cm"] is None
+    assert view["range_cm"] == 40.0
+    assert view["obstacle_near"] is True
+    assert view["ultrasonic_ts"] == 2.0
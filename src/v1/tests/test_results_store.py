@@ -0,0 +1,35 @@
+from results_store import ResultsStore
+
+
+def test_partial_publish_keeps_previous_values():
+    store = ResultsStore(defaults={"range_cm": None, "obstacle_near": False})
+    store.publish("ultrasonic", {"range_raw_cm": 42.0, "range_cm": 41.5, "range_ts": 1.0, "obstacle_near": True}, ts=1.0)
+    # missed echo: only the raw reading is written
+    store.publish("ultrasonic", {"range_raw_cm": None}, ts=2.0)
+    view = store.view()
+    assert view["range_raw_cm"] is None
+    assert view["range_cm"] == 41.5
+    assert view["range_ts"] == 1.0
+    assert view["obstacle_near"] is True
+    assert view["ultrasonic_ts"] == 2.0
+    assert dict(store.get("ultrasonic").values) == {
+        "range_raw_cm": None, "range_cm": 41.5, "range_ts": 1.0, "obstacle_near": True,
+    }
+
+
+def test_publish_overwrites_written_keys_and_freezes_lists():
+    store = ResultsStore(defaults={"coco_dets": []})
+    store.publish("coco", {"coco_dets": ["a", "b"], "person_present": True}, ts=1.0, frame_id=3)
+    store.publish("coco", {"coco_dets": [], "person_present": False}, ts=2.0, frame_id=4)
+    view = store.view()
+    assert view["coco_dets"] == ()
+    assert view["person_present"] is False
+    assert view["coco_frame_id"] == 4
+
+
+def test_modules_do_not_share_previous_values():
+    store = ResultsStore()
+    store.publish("face", {"faces": ["f"]}, ts=1.0)
+    store.publish("coco", {"coco_dets": []}, ts=1.0)
+    assert dict(store.get("coco").values) == {"coco_dets": ()}
+    assert store.view()["faces"] == ("f",)
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import variables
+from det import Det
+from module import Module
+
+
+# -----------------------------
+# Tracked objects
+# -----------------------------
+@dataclass(frozen=True)
+class TrackedObject:
+    """
+    A tracked detection; has the same label/score/bbox fields as Det so it
+    can be used wherever a Det is drawn or reasoned about.
+    - bbox      : predicted x1,y1,x2,y2 in pixels at the time of the update
+    - velocity  : centre velocity in pixels per second
+    - hits      : detections matched to this track
+    - age       : tracker updates since the track was created
+    - misses    : consecutive detector runs without a match
+    - predicted : True if the box is extrapolated past the last detection
+    """
+    label: str
+    score: float
+    bbox: Tuple[int, int, int, int]
+    track_id: int
+    velocity: Tuple[float, float] = (0.0, 0.0)
+    hits: int = 1
+    age: int = 0
+    misses: int = 0
+    predicted: bool = False
+
+
+class BoxKalman:
+    """
+    Constant-velocity Kalman filter on a box centre and size:
+    state [cx, cy, w, h, vcx, vcy, vw, vh], measurement [cx, cy, w, h].
+    The filter is only stepped at detector updates; between them the box is
+    extrapolated from the last state (see box_at), which costs no matrix work.
+    """
+    _H = np.hstack([np.eye(4), np.zeros((4, 4))])
+
+    def __init__(self, box: np.ndarray, ts: float) -> None:
+        self.x = np.concatenate([_box_to_cxcywh(box), np.zeros(4)])
+        self.P = np.diag([variables.TRACKER_MEAS_STD ** 2] * 4 + [variables.TRACKER_INIT_VEL_STD ** 2] * 4)
+        self.ts = ts
+
+    def _predict(self, ts: float) -> Tuple[np.ndarray, np.ndarray]:
+        dt = max(0.0, ts - self.ts)
+        F = np.eye(8)
+        F[:4, 4:] = np.eye(4) * dt
+        # white-noise acceleration
+        G = np.concatenate([np.eye(4) * (0.5 * dt * dt), np.eye(4) * dt])
+        Q = G @ G.T * variables.TRACKER_ACCEL_STD ** 2
+        return F @ self.x, F @ self.P @ F.T + Q
+
+    def update(self, box: np.ndarray, ts: float) -> None:
+        x, P = self._predict(ts)
+        R = np.eye(4) * variables.TRACKER_MEAS_STD ** 2
+        S = self._H @ P @ self._H.T + R
+        K = P @ self._H.T @ np.linalg.inv(S)
+        self.x = x + K @ (_box_to_cxcywh(box) - self._H @ x)
+        self.P = (np.eye(8) - K @ self._H) @ P
+        self.ts = ts
+
+    def box_at(self, ts: float) -> np.ndarray:
+        """
+        x1,y1,x2,y2 extrapolated to `ts` (capped at TRACKER_MAX_PREDICT_S).
+        """
+        dt = min(max(0.0, ts - self.ts), variables.TRACKER_MAX_PREDICT_S)
+        cx, cy, w, h = self.x[:4] + self.x[4:] * dt
+        w, h = max(w, 1.0), max(h, 1.0)
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+    @property
+    def velocity(self) -> Tuple[float, float]:
+        return float(self.x[4]), float(self.x[5])
+
+
+def _box_to_cxcywh(box: np.ndarray) -> np.ndarray:
+    x1, y1, x2, y2 = box
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+
+def _iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    (len(a), len(b)) IoU of x1,y1,x2,y2 boxes.
+    """
+    iw = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    ih = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    area_a = np.clip(a[:, 2] - a[:, 0], 0, None) * np.clip(a[:, 3] - a[:, 1], 0, None)
+    area_b = np.clip(b[:, 2] - b[:, 0], 0, None) * np.clip(b[:, 3] - b[:, 1], 0, None)
+    union = area_a[:, None] + area_b[None, :] - inter
+    out = np.zeros_like(inter)
+    np.divide(inter, union, out=out, where=union > 0)
+    return out
+
+
+class _Track:
+    def __init__(self, track_id: int, det: Det, ts: float) -> None:
+        self.track_id = track_id
+        self.label = det.label
+        self.score = float(det.score)
+        self.kf = BoxKalman(np.asarray(det.bbox, dtype=np.float64), ts)
+        self.hits = 1
+        self.age = 0
+        self.misses = 0
+
+
+# -----------------------------
+# Multi-object tracker
+# -----------------------------
+class MultiObjectTracker:
+    """
+    Associates detector outputs to tracks and predicts boxes in between.
+    - association per label: greedy on IoU (>= iou_thresh), then a centroid
+      fallback for fast movers whose predicted box no longer overlaps
+      (centre distance <= centroid_gate * sqrt(track box area))
+    - a track is dropped after `max_misses` detector runs without a match
+    """
+
+    def __init__(
+        self,
+        iou_thresh: float = variables.TRACKER_IOU_THRESH,
+        centroid_gate: float = variables.TRACKER_CENTROID_GATE,
+        max_misses: int = variables.TRACKER_MAX_MISSES,
+        min_hits: int = variables.TRACKER_MIN_HITS,
+    ) -> None:
+        self.iou_thresh = iou_thresh
+        self.centroid_gate = centroid_gate
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self._tracks: List[_Track] = []
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def update(self, dets: Sequence[Det], ts: float) -> None:
+        """
+        Feed one detector run; `ts` is the capture time of its frame.
+        """
+        tracks = self._tracks
+        matches = self._associate(tracks, dets, ts)
+        matched_t = {t for t, _ in matches}
+        matched_d = {d for _, d in matches}
+
+        for t, d in matches:
+            tr, det = tracks[t], dets[d]
+            tr.kf.update(np.asarray(det.bbox, dtype=np.float64), ts)
+            tr.score = float(det.score)
+            tr.hits += 1
+            tr.misses = 0
+        for t, tr in enumerate(tracks):
+            if t not in matched_t:
+                tr.misses += 1
+        self._tracks = [tr for tr in tracks if tr.misses <= self.max_misses]
+        for d, det in enumerate(dets):
+            if d not in matched_d:
+                self._tracks.append(_Track(self._next_id, det, ts))
+                self._next_id += 1
+
+    def _associate(self, tracks: List[_Track], dets: Sequence[Det], ts: float) -> List[Tuple[int, int]]:
+        if not tracks or not dets:
+            return []
+        pred = np.array([tr.kf.box_at(ts) for tr in tracks])
+        boxes = np.array([d.bbox for d in dets], dtype=np.float64)
+        same_label = np.array([[tr.label == d.label for d in dets] for tr in tracks])
+
+        iou = np.where(same_label, _iou_matrix(pred, boxes), 0.0)
+        matches: List[Tuple[int, int]] = []
+        used_t, used_d = set(), set()
+        for t, d in zip(*np.unravel_index(np.argsort(-iou, axis=None, kind="stable"), iou.shape)):
+            if iou[t, d] < self.iou_thresh:
+                break
+            if t in used_t or d in used_d:
+                continue
+            matches.append((int(t), int(d)))
+            used_t.add(t)
+            used_d.add(d)
+
+        # centroid fallback for whatever IoU left unmatched
+        centres_t = (pred[:, :2] + pred[:, 2:]) / 2
+        centres_d = (boxes[:, :2] + boxes[:, 2:]) / 2
+        dist = np.linalg.norm(centres_t[:, None] - centres_d[None], axis=-1)
+        scale = np.sqrt(np.clip((pred[:, 2] - pred[:, 0]) * (pred[:, 3] - pred[:, 1]), 1.0, None))
+        norm = np.where(same_label, dist / scale[:, None], np.inf)
+        for t, d in zip(*np.unravel_index(np.argsort(norm, axis=None, kind="stable"), norm.shape)):
+            if norm[t, d] > self.centroid_gate:
+                break
+            if t in used_t or d in used_d:
+                continue
+            matches.append((int(t), int(d)))
+            used_t.add(t)
+            used_d.add(d)
+        return matches
+
+    def tracks(self, ts: float) -> List[TrackedObject]:
+        """
+        Confirmed tracks with boxes predicted at `ts`; counts one tracker step.
+        """
+        out: List[TrackedObject] = []
+        for tr in self._tracks:
+            tr.age += 1
+            if tr.hits < self.min_hits:
+                continue
+            x1, y1, x2, y2 = tr.kf.box_at(ts).round().astype(int).tolist()
+            out.append(TrackedObject(
+                label=tr.label,
+                score=tr.score,
+                bbox=(x1, y1, x2, y2),
+                track_id=tr.track_id,
+                velocity=tr.kf.velocity,
+                hits=tr.hits,
+                age=tr.age,
+                misses=tr.misses,
+                predicted=ts > tr.kf.ts,
+            ))
+        return out
+
+
+# -----------------------------
+# Tracker module
+# -----------------------------
+class TrackerModule(Module):
+    """
+    Runs on every grabbed frame; cheap (no inference).
+    - feeds new detector results (detected via state['coco_frame_id'])
+    - publishes state['tracks'] : List[TrackedObject] predicted to now
+    """
+    name = "tracker"
+    hz = float(variables.TARGET_FRAME_GRABBER_FPS)
+    priority = 3
+    cpu_heavy = False
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.tracker = MultiObjectTracker()
+        self._last_det_id: Optional[int] = None
+
+    def process(self, frame: np.ndarray, state: Dict[str, Any]) -> None:
+        det_id = state.get("coco_frame_id")
+        if det_id is not None and det_id != self._last_det_id:
+            self._last_det_id = det_id
+            self.tracker.update(state.get("coco_dets", []), state.get("coco_ts", time.time()))
+        state["tracks"] = self.tracker.tracks(time.time())
@@ -24,6 +24,9 @@ class UltrasonicModule(Module):
     """
     name = "ultrasonic"
     hz = 15.0  # sensor read rate
+    priority = 0
+    needs_frame = False
+    cpu_heavy = False
 
     def __init__(self) -> None:
         super().__init__()
@@ -26,6 +26,18 @@ STREAM_HOST = '0.0.0.0'
 STREAM_PORT = 8080
 STREAM_JPEG_QUALITY = 70
 STREAM_FPS = 5.0
+# named stream targets, served at /stream/<name>.mjpg (+ /snapshot/<name>.jpg);
+# each one is rendered and encoded only while someone is subscribed
+# scale: of the rendered image | quality: JPEG | fps: render + encode cap
+STREAM_TARGETS = {
+    'annotated':      {'scale': 1.0, 'quality': STREAM_JPEG_QUALITY, 'fps': STREAM_FPS},  # also /stream.mjpg
+    'raw':            {'scale': 0.5, 'quality': 60, 'fps': 10.0},  # also /raw.mjpg (boxes drawn by the browser from /events)
+    'detector_input': {'scale': 1.0, 'quality': 85, 'fps': 2.0},   # the detector's input tensor, native size
+    'motion':         {'scale': 1.0, 'quality': 60, 'fps': 5.0},   # scene-change motion mask over the frame
+    'debug':          {'scale': 1.0, 'quality': 70, 'fps': 2.0},   # 2x2: boxes / detector input / motion / stage timings
+}
+STREAM_SERVER = 'asyncio'  # 'asyncio' (one event loop thread) | 'threaded' (thread per viewer)
+STREAM_SNAPSHOT_TIMEOUT_S = 2.0  # /snapshot.jpg waits this long for a fresh frame
 
 # confidence threshold
 COCO_DEFAULT_THRESH = 0.45
@@ -37,6 +49,7 @@ COCO_THRESHOLDS = {
 }
 DEBUG_TOP_N = 10
 COCO_NMS_THRESH = 0.45
+COCO_NMS_TOP_K = None  # e.g. 20 to cap detections per frame
 
 # intrested labels
 WANTED_LABELS = {
@@ -87,4 +100,131 @@ GRABBER_COPY_FRAME = False
 
 
 # TFLITE
-TFLITE_THREADS = 3
\ No newline at end of file
+TFLITE_THREADS = 3
+
+# Scheduler
+# how many cpu-heavy modules (detector, face) may infer at the same time;
+# the rest wait in priority order (Module.priority, lower first)
+SCHED_MAX_CONCURRENT = 2
+SCHED_STATS_EVERY_S = 5.0
+
+# Worker backend
+# 'thread'  : every module runs as a thread in this process
+# 'process' : detector modules (coco, face) each run in their own process;
+#             frames go through a shared-memory ring, only results come back
+WORKER_BACKEND = 'thread'
+PROCESS_RESULT_TIMEOUT_S = 10.0
+PROCESS_MAX_RESTARTS = 3  # child exits / hangs before the module is marked dead
+PROCESS_START_TIMEOUT_S = 60.0  # model load + warm-up in a new child before it counts as failed
+
+# Face detection
+# keep the SSD anchor table as .npy next to the face models (faster startup)
+FACE_CACHE_ANCHORS = True
+# interpreter threads of the face models; the small BlazeFace graphs gain little
+# from more threads and would compete with the detector's TFLITE_THREADS
+FACE_TFLITE_THREADS = 1
+# 'frame'  : BlazeFace back-camera model (256x256) over the top 75% of the frame
+# 'person' : short-range model (128x128) on the head region of each person box
+#            published by the detector, all crops in one batch
+FACE_ROI_MODE = 'frame'
+FACE_MAX_CROPS = 4           # highest-scoring persons only; also the face model's batch size
+FACE_HEAD_FRACTION = 0.4     # upper part of the person box that holds the head
+FACE_HEAD_PAD = 0.15         # padding around the head region (fraction of its side)
+FACE_CROP_NMS_THRESH = 0.3   # merge duplicates from overlapping crops
+
+# Tracker
+# predicts boxes between detector runs; events and display use the tracks
+ENABLE_TRACKER = False        # opt-in: events/display use the tracks instead of raw detections
+TRACKER_IOU_THRESH = 0.3
+TRACKER_CENTROID_GATE = 1.5    # fallback match: centre distance / sqrt(box area)
+TRACKER_MAX_MISSES = 2         # detector runs without a match before a track is dropped
+TRACKER_MIN_HITS = 1
+TRACKER_MAX_PREDICT_S = 1.0    # never extrapolate further than this past a detection
+TRACKER_MEAS_STD = 10.0        # px
+TRACKER_ACCEL_STD = 300.0      # px/s^2
+TRACKER_INIT_VEL_STD = 200.0   # px/s
+
+# Optical flow
+# moves coco_dets/faces to every frame with sparse LK flow (flow_dets, flow_faces)
+ENABLE_FLOW = False                # opt-in: takes precedence over the tracker when confident
+FLOW_SCALE = 0.5                  # flow runs on a downscaled gray frame
+FLOW_HISTORY = 8                  # gray frames kept to seed late detector results on their own frame
+FLOW_MAX_POINTS = 20              # corners per box
+FLOW_MIN_POINTS = 4               # fewer surviving points: box is lost
+FLOW_FB_MAX_ERR = 1.0             # forward-backward error limit (downscaled px)
+FLOW_MAX_PATCH_ERR = 10.0         # mean abs. patch difference limit (LK err)
+FLOW_MIN_CONFIDENCE = 0.5         # below this the detector is run early
+FLOW_TRIGGER_MIN_INTERVAL_S = 0.5
+
+# Scene-change gate
+# detector/face skip inference while the scene is static and keep their
+# previous results (with the original timestamps)
+SCENE_GATE = False            # opt-in: detector/face run on every frame otherwise
+SCENE_MAX_STALENESS_S = 3.0   # run anyway once results are this old
+SCENE_THUMB_SIZE = (64, 48)   # (w, h) of the grayscale thumbnail compared
+SCENE_PIXEL_THRESH = 20       # per-pixel change (0-255)
+SCENE_CHANGED_FRACTION = 0.01 # changed pixels needed to count as a change
+SCENE_HIST_THRESH = 0.1       # histogram distance (0-1) for global changes
+
+# Rate controller
+# holds CPU temperature, load and detector latency by stepping through
+# RATE_CTL_LEVELS (0 = full speed); decisions go to state['rate_ctl']
+# small_model: face (frame mode) swaps the 256x256 back-camera model for the
+# 128x128 short-range one (shorter detection range, not a rescaled input)
+ENABLE_RATE_CTL = False            # opt-in: modules keep their configured hz / threads otherwise
+RATE_CTL_SYS_ROOT = '/'            # a directory with sys/class/thermal + proc/stat for testing
+RATE_CTL_MODULES = ('coco', 'face')
+RATE_CTL_TEMP_HIGH_C = 75.0        # Pi 4 soft-throttles at 80 C
+RATE_CTL_TEMP_LOW_C = 65.0
+RATE_CTL_LOAD_HIGH = 0.90
+RATE_CTL_LOAD_LOW = 0.60
+RATE_CTL_TARGET_MS = {'coco': 450.0, 'face': 120.0}
+RATE_CTL_LATENCY_HIGH = 1.2        # x target: throttle
+RATE_CTL_LATENCY_LOW = 0.8         # x target: may speed up again
+RATE_CTL_DWELL_S = 5.0             # min time between level changes
+# per-module thread ceiling: a level's 'threads' never raises a module above its own setting
+RATE_CTL_MAX_THREADS = {'coco': TFLITE_THREADS, 'face': FACE_TFLITE_THREADS}
+RATE_CTL_LEVELS = [
+    {'hz_scale': 1.0, 'threads': TFLITE_THREADS, 'small_model': False},
+    {'hz_scale': 0.75, 'threads': TFLITE_THREADS, 'small_model': False},
+    {'hz_scale': 0.5, 'threads': 2, 'small_model': True},
+    {'hz_scale': 0.35, 'threads': 1, 'small_model': True},
+]
+
+# -----------------------------
+# Interpreter factory (interpreter_backend.make_interpreter)
+# -----------------------------
+# applies to every model (coco detector and the vendor_fdlite face/landmark/iris models)
+# XNNPACK CPU delegate (default delegate of TF >= 2.3); False uses the plain builtin kernels
+TFLITE_XNNPACK = True
+# zero-input invokes right after loading so the first real frame runs at steady-state speed
+INTERPRETER_WARMUP_RUNS = 2
+# print read/load/warm-up times per interpreter at startup
+INTERPRETER_LOG = True
+
+# -----------------------------
+# Record / replay (recording.py)
+# -----------------------------
+# directory to record grabbed frames + ultrasonic readings into (None = off)
+RECORD_PATH = None
+# 'mjpeg' (small, one JPEG encode per frame) or 'raw' (no encode, memory-mapped on replay)
+RECORD_FORMAT = 'mjpeg'
+RECORD_JPEG_QUALITY = 90
+# frames buffered for the recorder's writer thread; when full the oldest is dropped (Recorder.drops)
+RECORD_QUEUE_SIZE = 8
+# replay a recording instead of opening the camera (None = live camera)
+CAMERA_REPLAY_PATH = None
+# 'realtime' (recorded timestamps / CAMERA_REPLAY_SPEED) or 'fast' (as fast as frames are read)
+CAMERA_REPLAY_MODE = 'realtime'
+CAMERA_REPLAY_SPEED = 1.0
+CAMERA_REPLAY_LOOP = False
+# stop main() when a non-looping replay runs out (headless CI runs)
+EXIT_ON_REPLAY_END = True
+
+# -----------------------------
+# Frame pool (frame_pool.py)
+# -----------------------------
+# preallocated frame buffers the grabber recycles (0 = allocate per frame).
+# Held at once: 1 being filled + 1 latest in the channel + 1 main loop + 1 per
+# frame-consuming module (coco, face, tracker, flow); extra buffers absorb jitter
+FRAME_POOL_SIZE = 8
\ No newline at end of file
@@ -16,17 +16,20 @@ Reference:
     Workshop on Computer Vision for Augmented and
     Virtual Reality, Long Beach, CA, USA, 2019.
 """
+import hashlib
 import numpy as np
 import os
-from tflite_runtime.interpreter import Interpreter
+import time
+from vendor_fdlite.interpreter import make_interpreter, warm_up
 from enum import IntEnum
 from PIL.Image import Image
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 from vendor_fdlite import InvalidEnumError
-from vendor_fdlite.nms import non_maximum_suppression
-from vendor_fdlite.transform import detection_letterbox_removal, image_to_tensor
+from vendor_fdlite.nms import weighted_non_maximum_suppression_arrays
+from vendor_fdlite.transform import array_to_tensor, detection_letterbox_removal
+from vendor_fdlite.transform import _is_rgb_array, image_to_tensor
 from vendor_fdlite.transform import sigmoid
-from vendor_fdlite.types import Detection, Rect
+from vendor_fdlite.types import Detection, FaceDetectionResult, Rect
 
 MODEL_NAME_BACK = 'face_detection_back.tflite'
 MODEL_NAME_FRONT = 'face_detection_front.tflite'
@@ -41,6 +44,8 @@ RAW_SCORE_LIMIT = 80
 MIN_SCORE = 0.5
 # NMS similarity threshold
 MIN_SUPPRESSION_THRESHOLD = 0.3
+# file suffix of cached anchor tables (next to the model file)
+ANCHORS_SUFFIX = '.anchors.npy'
 
 # from mediapipe module; irrelevant parts removed
 # (reference: mediapipe/modules/face_detection/face_detection_front_cpu.pbtxt)
@@ -142,6 +147,15 @@ class FaceDetection:
     and Numpy array of shape (height, width, channels) as input. There is no
     size restriction, but smaller images are processed faster.
 
+    With `cache_anchors=True` the SSD anchor table is also saved as a `.npy`
+    file next to the model and loaded from there on the next start.
+
+    With `max_batch > 1` the input is allocated once for that many images
+    (if the model accepts a resized batch dimension); `detect_batch` then
+    runs up to `max_batch` ROIs per invoke and pads the unused slots.
+    `num_threads` is the interpreter thread count (factory default if
+    `None`).
+
     Example:
 
     ```
@@ -162,7 +176,10 @@ class FaceDetection:
     def __init__(
         self,
         model_type: FaceDetectionModel = FaceDetectionModel.FRONT_CAMERA,
-        model_path: Optional[str] = None
+        model_path: Optional[str] = None,
+        cache_anchors: bool = False,
+        max_batch: int = 1,
+        num_threads: Optional[int] = None
     ) -> None:
         ssd_opts = {}
         if model_path is None:
@@ -186,13 +203,26 @@ class FaceDetection:
         else:
             raise InvalidEnumError(f'unsupported model_type "{model_type}"')
         # self.interpreter = tf.lite.Interpreter(model_path=self.model_path)
-        self.interpreter = Interpreter(model_path=self.model_path)
-        self.interpreter.allocate_tensors()
+        # a batched model is warmed up once resized (_allocate_batch)
+        self.interpreter = make_interpreter(
+            self.model_path, num_threads=num_threads,
+            warmup_runs=0 if max_batch > 1 else None)
+        self.num_threads = num_threads
         self.input_index = self.interpreter.get_input_details()[0]['index']
         self.input_shape = self.interpreter.get_input_details()[0]['shape']
         self.bbox_index = self.interpreter.get_output_details()[0]['index']
         self.score_index = self.interpreter.get_output_details()[1]['index']
-        self.anchors = _ssd_generate_anchors(ssd_opts)
+        cache_file = (os.path.splitext(self.model_path)[0] + ANCHORS_SUFFIX
+                      if cache_anchors else None)
+        self.anchors = ssd_anchors(ssd_opts, cache_file)
+        # anchor position added to box centre and keypoints (not the size)
+        bbox_shape = self.interpreter.get_output_details()[0]['shape']
+        self.anchor_offsets = _anchor_offsets(self.anchors,
+                                              bbox_shape[-1] // 2)
+        # preallocated input batch; the ROI tensors are written into it directly
+        self.input_data = np.zeros(self.input_shape, dtype=np.float32)
+        if max_batch > 1:
+            self._allocate_batch(max_batch)
 
     def __call__(
         self,
@@ -211,28 +241,195 @@ class FaceDetection:
         Returns:
             (list) List of detection results with relative coordinates.
         """
-        height, width = self.input_shape[1:3]
-        image_data = image_to_tensor(
-            image,
-            roi,
-            output_size=(width, height),
-            keep_aspect_ratio=True,
-            output_range=(-1, 1))
-        input_data = image_data.tensor_data[np.newaxis]
-        self.interpreter.set_tensor(self.input_index, input_data)
+        boxes, scores, padding, _ = self._detect_arrays(image, roi)
+        pruned_detections = [Detection(box, score)
+                             for box, score in zip(boxes, scores)]
+        detections = detection_letterbox_removal(pruned_detections, padding)
+        return detections
+
+    def detect(
+        self,
+        image: np.ndarray,
+        roi_px: Optional[Tuple[float, float, float, float]] = None
+    ) -> FaceDetectionResult:
+        """Run inference on a numpy frame and return pixel detections
+
+        Unlike calling the model, the image is never converted to PIL and
+        the ROI is not copied out of the frame.
+
+        Args:
+            image (ndarray): RGB uint8 array of shape `(height, width, 3)`.
+
+            roi_px (tuple|None): Optional `(x1, y1, x2, y2)` region of the
+                image in pixels to search for faces; whole image if `None`.
+
+        Returns:
+            (FaceDetectionResult) Detections with bounding box and keypoints
+            in pixel coordinates of `image`, and per-stage timings.
+        """
+        image_height, image_width = image.shape[:2]
+        roi_px = roi_px or (0, 0, image_width, image_height)
+        boxes, scores, padding, timings = self._detect_arrays(
+            image, _pixel_rect(roi_px))
+        boxes = _roi_to_image(boxes, padding, roi_px)
+        detections = [Detection(box, score)
+                      for box, score in zip(boxes, scores)]
+        return FaceDetectionResult(detections, *timings)
+
+    def detect_batch(
+        self,
+        image: np.ndarray,
+        rois_px: Sequence[Tuple[float, float, float, float]]
+    ) -> FaceDetectionResult:
+        """Run inference on several ROIs of a numpy frame at once
+
+        With a batch allocated (`max_batch > 1`) the ROIs go through the
+        model `max_batch` at a time, one invoke per chunk; otherwise one by
+        one. Detections of overlapping ROIs are not merged.
+
+        Args:
+            image (ndarray): RGB uint8 array of shape `(height, width, 3)`.
+
+            rois_px (list): List of `(x1, y1, x2, y2)` regions in pixels.
+
+        Returns:
+            (FaceDetectionResult) Detections of all ROIs in pixel coordinates
+            of `image`, and per-stage timings for the whole batch.
+        """
+        batch_size = len(self.input_data)
+        merged = FaceDetectionResult([])
+        for start in range(0, len(rois_px), batch_size):
+            chunk = rois_px[start:start + batch_size]
+            if batch_size > 1:
+                result = self._detect_chunk(image, chunk)
+            else:
+                result = self.detect(image, chunk[0])
+            merged.detections += result.detections
+            merged.tensorize_ms += result.tensorize_ms
+            merged.invoke_ms += result.invoke_ms
+            merged.decode_ms += result.decode_ms
+            merged.nms_ms += result.nms_ms
+        return merged
+
+    def _detect_chunk(
+        self,
+        image: np.ndarray,
+        rois_px: Sequence[Tuple[float, float, float, float]]
+    ) -> FaceDetectionResult:
+        """Run up to `max_batch` ROIs in one invoke; slots past the last ROI
+        are zero-filled and their outputs are not decoded.
+        """
+        t0 = time.perf_counter()
+        paddings = [self._to_tensor(image, _pixel_rect(roi_px), tensor)
+                    for roi_px, tensor in zip(rois_px, self.input_data)]
+        self.input_data[len(rois_px):] = 0
+        self.interpreter.set_tensor(self.input_index, self.input_data)
+        t1 = time.perf_counter()
         self.interpreter.invoke()
+        t2 = time.perf_counter()
         raw_boxes = self.interpreter.get_tensor(self.bbox_index)
         raw_scores = self.interpreter.get_tensor(self.score_index)
+        decoded = [FaceDetection._filter_detections(
+                       self._decode_boxes(raw_boxes[i]),
+                       self._get_sigmoid_scores(raw_scores[i]))
+                   for i in range(len(rois_px))]
+        t3 = time.perf_counter()
+        detections = []
+        for (boxes, scores), padding, roi_px in zip(decoded, paddings,
+                                                    rois_px):
+            boxes, scores = weighted_non_maximum_suppression_arrays(
+                                boxes, scores,
+                                MIN_SUPPRESSION_THRESHOLD, MIN_SCORE)
+            boxes = _roi_to_image(boxes, padding, roi_px)
+            detections += [Detection(box, score)
+                           for box, score in zip(boxes, scores)]
+        t4 = time.perf_counter()
+        return FaceDetectionResult(detections, (t1 - t0) * 1e3,
+                                   (t2 - t1) * 1e3, (t3 - t2) * 1e3,
+                                   (t4 - t3) * 1e3)
+
+    def set_num_threads(self, num_threads: int) -> None:
+        """Rebuild the interpreter with another thread count (fixed at
+        construction in TFLite); the allocated batch size is kept. Call
+        between inferences, from the inferring thread.
+        """
+        num_threads = max(1, int(num_threads))
+        if num_threads == self.num_threads:
+            return
+        batch_size = len(self.input_data)
+        self.interpreter = make_interpreter(
+            self.model_path, num_threads=num_threads,
+            warmup_runs=0 if batch_size > 1 else None)
+        self.input_data = np.zeros(self.input_shape, dtype=np.float32)
+        if batch_size > 1:
+            self._allocate_batch(batch_size)
+        self.num_threads = num_threads
+
+    def _allocate_batch(self, batch_size: int) -> None:
+        """Resize the model input to `batch_size` images, once; models with
+        a fixed batch dimension stay at one image per invoke. Warms up the
+        re-allocated interpreter (make_interpreter skipped it).
+        """
+        shape = [batch_size, *self.input_shape[1:]]
+        try:
+            self.interpreter.resize_tensor_input(self.input_index, shape)
+            self.interpreter.allocate_tensors()
+        except (RuntimeError, ValueError):
+            self.interpreter.resize_tensor_input(
+                self.input_index, list(self.input_shape))
+            self.interpreter.allocate_tensors()
+        else:
+            self.input_data = np.zeros(shape, dtype=np.float32)
+        warm_up(self.interpreter)
+
+    def _detect_arrays(
+        self,
+        image: Union[Image, np.ndarray, str],
+        roi: Optional[Rect]
+    ) -> Tuple[np.ndarray, np.ndarray, Tuple[float, float, float, float],
+               Tuple[float, float, float, float]]:
+        """Return merged boxes and scores relative to the letterboxed input,
+        the letterbox padding and the stage timings (tensorize, invoke,
+        decode, nms) in milliseconds.
+        """
+        t0 = time.perf_counter()
+        padding = self._to_tensor(image, roi, self.input_data[0])
+        # batch allocated: only the first slot is used
+        self.input_data[1:] = 0
+        self.interpreter.set_tensor(self.input_index, self.input_data)
+        t1 = time.perf_counter()
+        self.interpreter.invoke()
+        t2 = time.perf_counter()
+        raw_boxes = self.interpreter.get_tensor(self.bbox_index)[0]
+        raw_scores = self.interpreter.get_tensor(self.score_index)[0]
         boxes = self._decode_boxes(raw_boxes)
         scores = self._get_sigmoid_scores(raw_scores)
-        detections = FaceDetection._convert_to_detections(boxes, scores)
-        pruned_detections = non_maximum_suppression(
-                                detections,
-                                MIN_SUPPRESSION_THRESHOLD, MIN_SCORE,
-                                weighted=True)
-        detections = detection_letterbox_removal(
-            pruned_detections, image_data.padding)
-        return detections
+        boxes, scores = FaceDetection._filter_detections(boxes, scores)
+        t3 = time.perf_counter()
+        boxes, scores = weighted_non_maximum_suppression_arrays(
+                                boxes, scores,
+                                MIN_SUPPRESSION_THRESHOLD, MIN_SCORE)
+        t4 = time.perf_counter()
+        timings = ((t1 - t0) * 1e3, (t2 - t1) * 1e3,
+                   (t3 - t2) * 1e3, (t4 - t3) * 1e3)
+        return boxes, scores, padding, timings
+
+    def _to_tensor(
+        self,
+        image: Union[Image, np.ndarray, str],
+        roi: Optional[Rect],
+        out: np.ndarray
+    ) -> Tuple[float, float, float, float]:
+        """Write the letterboxed model input for `roi` into `out` and return
+        the padding; numpy frames with an unrotated ROI take the cv2 path.
+        """
+        height, width = self.input_shape[1:3]
+        to_tensor = image_to_tensor
+        if _is_rgb_array(image) and (roi is None or roi.rotation == 0):
+            to_tensor = array_to_tensor
+        return to_tensor(image, roi, output_size=(width, height),
+                         keep_aspect_ratio=True, output_range=(-1, 1),
+                         out=out).padding
 
     def _decode_boxes(self, raw_boxes: np.ndarray) -> np.ndarray:
         """Simplified version of
@@ -244,9 +441,9 @@ class FaceDetection:
         # scale all values (applies to positions, width, and height alike)
         boxes = raw_boxes.reshape(-1, num_points, 2) / scale
         # adjust center coordinates and key points to anchor positions
-        boxes[:, 0] += self.anchors
-        for i in range(2, num_points):
-            boxes[:, i] += self.anchors
+        if self.anchor_offsets.shape[1] != num_points:
+            self.anchor_offsets = _anchor_offsets(self.anchors, num_points)
+        boxes += self.anchor_offsets
         # convert x_center, y_center, w, h to xmin, ymin, xmax, ymax
         center = np.array(boxes[:, 0])
         half_size = boxes[:, 1] / 2
@@ -267,40 +464,105 @@ class FaceDetection:
         return sigmoid(raw_scores)
 
     @staticmethod
-    def _convert_to_detections(
+    def _filter_detections(
         boxes: np.ndarray,
         scores: np.ndarray
-    ) -> List[Detection]:
-        """Apply detection threshold, filter invalid boxes and return
-        detection instance.
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Apply detection threshold and filter invalid boxes; detection
+        instances are only created for the boxes that survive NMS.
         """
-        # return whether width and height are positive
-        def is_valid(box: np.ndarray) -> bool:
-            return np.all(box[1] > box[0])
+        scores = scores.reshape(-1)
+        # keep boxes above the threshold with positive width and height
+        is_valid = np.all(boxes[:, 1] > boxes[:, 0], axis=-1)
+        keep = (scores > MIN_SCORE) & is_valid
+        return boxes[keep], scores[keep]
+
+
+def _pixel_rect(roi_px: Tuple[float, float, float, float]) -> Rect:
+    """Return an unrotated pixel Rect from `(x1, y1, x2, y2)`"""
+    x1, y1, x2, y2 = roi_px
+    return Rect((x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1,
+                rotation=0., normalized=False)
+
+
+def _roi_to_image(
+    boxes: np.ndarray,
+    padding: Tuple[float, float, float, float],
+    roi_px: Tuple[float, float, float, float]
+) -> np.ndarray:
+    """Map `(N, K, 2)` letterboxed model coordinates of an ROI to pixel
+    coordinates of the image the ROI was taken from.
+    """
+    x1, y1, x2, y2 = roi_px
+    left, top, right, bottom = padding
+    scale = np.array([(x2 - x1) / (1 - left - right),
+                      (y2 - y1) / (1 - top - bottom)], dtype=np.float32)
+    return (boxes - (left, top)) * scale + (x1, y1)
 
-        score_above_threshold = scores > MIN_SCORE
-        filtered_boxes = boxes[np.argwhere(score_above_threshold)[:, 1], :]
-        filtered_scores = scores[score_above_threshold]
-        return [Detection(box, score)
-                for box, score in zip(filtered_boxes, filtered_scores)
-                if is_valid(box)]
 
+# anchor tables generated in this process, keyed by SSD options
+_ANCHOR_CACHE: Dict[tuple, np.ndarray] = {}
 
-def _ssd_generate_anchors(opts: dict) -> np.ndarray:
-    """This is a trimmed down version of the C++ code; all irrelevant parts
-    have been removed.
-    (reference: mediapipe/calculators/tflite/ssd_anchors_calculator.cc)
+
+def ssd_anchors(opts: dict, cache_file: Optional[str] = None) -> np.ndarray:
+    """Return the (read-only) anchor table for the given SSD options.
+
+    Anchors are generated once per process and set of options; with
+    `cache_file` they are also loaded from (or saved to) a `.npy` file.
+    The file name gets a digest of the options, so a table written for
+    other options is never picked up.
     """
-    layer_id = 0
+    key = tuple((name, tuple(value) if isinstance(value, list) else value)
+                for name, value in sorted(opts.items()))
+    anchors = _ANCHOR_CACHE.get(key)
+    if anchors is not None:
+        return anchors
+    if cache_file:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+        root, ext = os.path.splitext(cache_file)
+        cache_file = f'{root}-{digest}{ext}'
+    anchors = _load_anchors(cache_file) if cache_file else None
+    if anchors is None or len(anchors) != _ssd_num_anchors(opts):
+        anchors = _ssd_generate_anchors(opts)
+        if cache_file:
+            try:
+                np.save(cache_file, anchors)
+            except OSError:
+                pass    # read-only install: the in-process memo still works
+    anchors.setflags(write=False)
+    _ANCHOR_CACHE[key] = anchors
+    return anchors
+
+
+def _load_anchors(cache_file: str) -> Optional[np.ndarray]:
+    """Return anchors from a `.npy` file or `None` if missing or invalid"""
+    try:
+        anchors = np.load(cache_file, allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    if anchors.dtype != np.float32 or anchors.ndim != 2 \
+            or anchors.shape[1] != 2:
+        return None
+    return anchors
+
+
+def _anchor_offsets(anchors: np.ndarray, num_points: int) -> np.ndarray:
+    """Return an `(N, num_points, 2)` array holding the anchor position for
+    the box centre (index 0) and each keypoint, zero for the box size.
+    """
+    offsets = np.repeat(anchors[:, np.newaxis], num_points, axis=1)
+    offsets[:, 1] = 0
+    return offsets
+
+
+def _ssd_layer_groups(opts: dict) -> List[Tuple[int, int]]:
+    """Return `(stride, repeats)` per group of layers with the same stride"""
     num_layers = opts['num_layers']
     strides = opts['strides']
     assert len(strides) == num_layers
-    input_height = opts['input_size_height']
-    input_width = opts['input_size_width']
-    anchor_offset_x = opts['anchor_offset_x']
-    anchor_offset_y = opts['anchor_offset_y']
     interpolated_scale_aspect_ratio = opts['interpolated_scale_aspect_ratio']
-    anchors = []
+    groups = []
+    layer_id = 0
     while layer_id < num_layers:
         last_same_stride_layer = layer_id
         repeats = 0
@@ -309,14 +571,36 @@ def _ssd_generate_anchors(opts: dict) -> np.ndarray:
             last_same_stride_layer += 1
             # aspect_ratios are added twice per iteration
             repeats += 2 if interpolated_scale_aspect_ratio == 1.0 else 1
-        stride = strides[layer_id]
+        groups.append((strides[layer_id], repeats))
+        layer_id = last_same_stride_layer
+    return groups
+
+
+def _ssd_num_anchors(opts: dict) -> int:
+    """Return the number of anchors generated for the given options"""
+    return sum((opts['input_size_height'] // stride) *
+               (opts['input_size_width'] // stride) * repeats
+               for stride, repeats in _ssd_layer_groups(opts))
+
+
+def _ssd_generate_anchors(opts: dict) -> np.ndarray:
+    """This is a trimmed down version of the C++ code; all irrelevant parts
+    have been removed.
+    (reference: mediapipe/calculators/tflite/ssd_anchors_calculator.cc)
+    """
+    input_height = opts['input_size_height']
+    input_width = opts['input_size_width']
+    anchor_offset_x = opts['anchor_offset_x']
+    anchor_offset_y = opts['anchor_offset_y']
+    anchors = []
+    for stride, repeats in _ssd_layer_groups(opts):
         feature_map_height = input_height // stride
         feature_map_width = input_width // stride
-        for y in range(feature_map_height):
-            y_center = (y + anchor_offset_y) / feature_map_height
-            for x in range(feature_map_width):
-                x_center = (x + anchor_offset_x) / feature_map_width
-                for _ in range(repeats):
-                    anchors.append((x_center, y_center))
-        layer_id = last_same_stride_layer
-    return np.array(anchors, dtype=np.float32)
+        # row-major grid of cell centres, each repeated `repeats` times
+        y_center = (np.arange(feature_map_height) + anchor_offset_y) \
+            / feature_map_height
+        x_center = (np.arange(feature_map_width) + anchor_offset_x) \
+            / feature_map_width
+        grid = np.stack(np.meshgrid(x_center, y_center), axis=-1)
+        anchors.append(np.repeat(grid.reshape(-1, 2), repeats, axis=0))
+    return np.concatenate(anchors).astype(np.float32)
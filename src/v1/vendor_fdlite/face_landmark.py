@@ -3,7 +3,7 @@
 # SPDX-Identifier: MIT
 import os
 import numpy as np
-from tflite_runtime.interpreter import Interpreter
+from vendor_fdlite.interpreter import make_interpreter
 from PIL.Image import Image
 from typing import List, Optional, Sequence, Tuple, Union
 from vendor_fdlite import ModelDataError
@@ -145,7 +145,7 @@ class FaceLandmark:
             model_path = os.path.join(os.path.dirname(my_path), 'data')
         self.model_path = os.path.join(model_path, MODEL_NAME)
         # self.interpreter = tf.lite.Interpreter(model_path=self.model_path)
-        self.interpreter = Interpreter(model_path=self.model_path)
+        self.interpreter = make_interpreter(self.model_path)
         self.input_index = self.interpreter.get_input_details()[0]['index']
         self.input_shape = self.interpreter.get_input_details()[0]['shape']
         self.data_index = self.interpreter.get_output_details()[0]['index']
@@ -155,7 +155,6 @@ class FaceLandmark:
         if data_shape[-1] < num_exected_elements:
             raise ModelDataError(f'incompatible model: {data_shape} < '
                                  f'{num_exected_elements}')
-        self.interpreter.allocate_tensors()
 
     def __call__(
         self,
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Interpreter construction for the vendored models.
+
+Inside PathPal the shared factory (interpreter_backend.make_interpreter)
+is used so these models get the same backend, thread count, XNNPACK
+setting, model-bytes cache and warm-up as the rest of the pipeline.
+"""
+try:
+    import variables
+    from interpreter_backend import make_interpreter        # noqa:F401
+    from interpreter_backend import warm_up as _warm_up
+
+    def warm_up(interpreter, runs=None) -> None:
+        """Zero-input invokes (INTERPRETER_WARMUP_RUNS by default), e.g.
+        after resizing an input re-allocated the interpreter.
+        """
+        runs = variables.INTERPRETER_WARMUP_RUNS if runs is None else runs
+        if runs > 0:
+            _warm_up(interpreter, runs)
+except ImportError:                                          # used standalone
+    from tflite_runtime.interpreter import Interpreter
+
+    def make_interpreter(model_path: str, num_threads=None, **kwargs):
+        interpreter = Interpreter(model_path=model_path,
+                                  num_threads=num_threads)
+        interpreter.allocate_tensors()
+        return interpreter
+
+    def warm_up(interpreter, runs=None) -> None:
+        """No warm-up standalone (make_interpreter does none either)."""
@@ -3,9 +3,10 @@
 # SPDX-Identifier: MIT
 from dataclasses import dataclass
 from enum import IntEnum
+import math
 import numpy as np
 import os
-from tflite_runtime.interpreter import Interpreter
+from vendor_fdlite.interpreter import make_interpreter
 from PIL.Image import Image
 from typing import List, Optional, Sequence, Tuple, Union
 from vendor_fdlite import ArgumentError, MissingExifDataError, ModelDataError, exif
@@ -101,7 +102,7 @@ RIGHT_EYE_TO_FACE_LANDMARK_INDEX = [
 ]
 
 # 35mm camera sensor diagonal (36mm * 24mm)
-SENSOR_DIAGONAL_35MM = np.math.sqrt(36 ** 2 + 24 ** 2)
+SENSOR_DIAGONAL_35MM = math.sqrt(36 ** 2 + 24 ** 2)
 # average human iris size
 IRIS_SIZE_IN_MM = 11.8
 
@@ -385,7 +386,7 @@ def iris_depth_in_mm_from_landmarks(
     if height_px > width_px:
         w, h = h, w
     sqr_inv_aspect = (h / w) ** 2
-    sensor_width = np.math.sqrt((sensor_diagonal_mm**2) / (1 + sqr_inv_aspect))
+    sensor_width = math.sqrt((sensor_diagonal_mm**2) / (1 + sqr_inv_aspect))
     focal_len_px = w * focal_len_mm / sensor_width
     left_landmarks, right_landmarks = iris_data_left.iris, iris_data_right.iris
     left_iris_size = _get_iris_diameter(left_landmarks, pixel_size)
@@ -446,7 +447,7 @@ class IrisLandmark:
             model_path = os.path.join(os.path.dirname(my_path), 'data')
         self.model_path = os.path.join(model_path, MODEL_NAME)
         # self.interpreter = tf.lite.Interpreter(model_path=self.model_path)
-        self.interpreter = Interpreter(model_path=self.model_path)
+        self.interpreter = make_interpreter(self.model_path)
         self.input_index = self.interpreter.get_input_details()[0]['index']
         self.input_shape = self.interpreter.get_input_details()[0]['shape']
         self.eye_index = self.interpreter.get_output_details()[0]['index']
@@ -460,7 +461,6 @@ class IrisLandmark:
         if iris_shape[-1] != NUM_DIMS * NUM_IRIS_LANDMARKS:
             raise ModelDataError('unexpected number of iris landmarks: '
                                  f'{eye_shape[-1]}')
-        self.interpreter.allocate_tensors()
 
     def __call__(
         self,
@@ -508,7 +508,7 @@ def _get_iris_diameter(
 
     def get_landmark_depth(a: Landmark, b: Landmark) -> float:
         x0, y0, x1, y1 = a.x * width, a.y * height, b.x * width, b.y * height
-        return np.math.sqrt((x0 - x1) ** 2 + (y0 - y1) ** 2)
+        return math.sqrt((x0 - x1) ** 2 + (y0 - y1) ** 2)
 
     iris_size_horiz = get_landmark_depth(iris_landmarks[IrisIndex.LEFT],
                                          iris_landmarks[IrisIndex.RIGHT])
@@ -528,6 +528,6 @@ def _get_iris_depth(
     center = iris_landmarks[IrisIndex.CENTER]
     x0, y0 = width / 2, height / 2
     x1, y1 = center.x * width, center.y * height
-    y = np.math.sqrt((x0 - x1) ** 2 + (y0 - y1) ** 2)
-    x = np.math.sqrt(focal_length_mm ** 2 + y ** 2)
+    y = math.sqrt((x0 - x1) ** 2 + (y0 - y1) ** 2)
+    x = math.sqrt(focal_length_mm ** 2 + y ** 2)
     return IRIS_SIZE_IN_MM * x / iris_size_px
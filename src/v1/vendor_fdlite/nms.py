@@ -81,40 +81,99 @@ def _weighted_non_maximum_suppression(
     min_score: Optional[float]
 ) -> List[Detection]:
     """Return only most significant detections; merge similar detections"""
-    remaining_indexed_scores = list(indexed_scores)
-    remaining: List[Tuple[int, float]] = []
-    candidates: List[Tuple[int, float]] = []
-    outputs: List[Detection] = []
+    if not len(detections):
+        return []
+    data = np.stack([detection.data for detection in detections])
+    scores = np.array([detection.score for detection in detections],
+                      dtype=np.float32)
+    merged, merged_scores = weighted_non_maximum_suppression_arrays(
+        data, scores, min_suppression_threshold, min_score)
+    return [Detection(box, score)
+            for box, score in zip(merged, merged_scores)]
 
-    while len(remaining_indexed_scores):
-        detection = detections[remaining_indexed_scores[0][0]]
+
+def weighted_non_maximum_suppression_arrays(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    min_suppression_threshold: float,
+    min_score: Optional[float]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Array-native weighted NMS.
+
+    Same result as merging `Detection` instances one by one, but the
+    similarities to the current top box are computed for all remaining boxes
+    at once and the weighted merge is a single reduction.
+
+    Args:
+        boxes (ndarray): Array of shape `(N, K, 2)`; row 0 is `(xmin, ymin)`,
+            row 1 is `(xmax, ymax)`, followed by `K - 2` keypoints.
+
+        scores (ndarray): Array of shape `(N,)` with detection scores.
+
+        min_suppression_threshold (float): Merge detections whose similarity
+            to the current top detection is above this threshold value
+
+        min_score (float): Minimum score of valid detections.
+
+    Returns:
+        (tuple) Merged boxes of shape `(M, K, 2)` and their scores `(M,)`.
+    """
+    num_boxes = len(scores)
+    if num_boxes == 0:
+        return boxes[:0], scores[:0]
+    # stable order matches sorting (index, score) pairs by score
+    remaining = np.argsort(-scores, kind='stable')
+    xmin, ymin = boxes[:, 0, 0], boxes[:, 0, 1]
+    xmax, ymax = boxes[:, 1, 0], boxes[:, 1, 1]
+    width, height = xmax - xmin, ymax - ymin
+    areas = np.where((width > 0) & (height > 0), width * height, 0)
+    outputs: List[np.ndarray] = []
+    output_scores: List[float] = []
+    while len(remaining):
+        top = remaining[0]
         # exit loop if remaining scores are below threshold
-        if min_score is not None and detection.score < min_score:
+        if min_score is not None and scores[top] < min_score:
             break
-        num_prev_indexed_scores = len(remaining_indexed_scores)
-        detection_bbox = detection.bbox
-        remaining.clear()
-        candidates.clear()
-        weighted_detection = detection
-        for (index, score) in remaining_indexed_scores:
-            remaining_bbox = detections[index].bbox
-            similarity = _overlap_similarity(remaining_bbox, detection_bbox)
-            if similarity > min_suppression_threshold:
-                candidates.append((index, score))
-            else:
-                remaining.append((index, score))
+        similarity = _overlap_similarity_one_to_many(
+            top, remaining, xmin, ymin, xmax, ymax, areas)
+        is_candidate = similarity > min_suppression_threshold
+        candidates = remaining[is_candidate]
         # weighted merging of similar (close) boxes
         if len(candidates):
-            weighted = np.zeros((2 + len(detection), 2), dtype=np.float32)
-            total_score = 0.
-            for index, score in candidates:
-                total_score += score
-                weighted += detections[index].data * score
-            weighted /= total_score
-            weighted_detection = Detection(weighted, detection.score)
-        outputs.append(weighted_detection)
-        # exit the loop if the number of indexed scores didn't change
-        if num_prev_indexed_scores == len(remaining):
+            weights = scores[candidates]
+            weighted = np.tensordot(weights, boxes[candidates], axes=1)
+            weighted /= weights.sum()
+        else:
+            weighted = boxes[top]
+        outputs.append(weighted)
+        output_scores.append(scores[top])
+        # exit the loop if the number of remaining boxes didn't change
+        if not len(candidates):
             break
-        remaining_indexed_scores = list(remaining)
-    return outputs
+        remaining = remaining[~is_candidate]
+    return (np.array(outputs, dtype=boxes.dtype).reshape(-1, *boxes.shape[1:]),
+            np.array(output_scores, dtype=scores.dtype))
+
+
+def _overlap_similarity_one_to_many(
+    index: int,
+    others: np.ndarray,
+    xmin: np.ndarray,
+    ymin: np.ndarray,
+    xmax: np.ndarray,
+    ymax: np.ndarray,
+    areas: np.ndarray
+) -> np.ndarray:
+    """Return intersection-over-union similarity of one box to many boxes"""
+    ixmin = np.maximum(xmin[index], xmin[others])
+    iymin = np.maximum(ymin[index], ymin[others])
+    ixmax = np.minimum(xmax[index], xmax[others])
+    iymax = np.minimum(ymax[index], ymax[others])
+    intersecting = (ixmin < ixmax) & (iymin < iymax)
+    intersect_area = np.where(
+        intersecting, (ixmax - ixmin) * (iymax - iymin), 0)
+    denominator = areas[index] + areas[others] - intersect_area
+    similarity = np.zeros(len(others), dtype=np.float64)
+    np.divide(intersect_area, denominator, out=similarity,
+              where=intersecting & (denominator > 0))
+    return similarity
@@ -2,8 +2,9 @@
 # Copyright © 2021 Patrick Levin
 # SPDX-Identifier: MIT
 from dataclasses import dataclass
+import math
 import numpy as np
-from typing import Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 """Types used throughout the library"""
 
 
@@ -61,7 +62,7 @@ class Rect:
         pts = [(x - w, y - h), (x + w, y - h), (x + w, y + h), (x - w, y + h)]
         if self.rotation == 0:
             return pts
-        s, c = np.math.sin(self.rotation), np.math.cos(self.rotation)
+        s, c = math.sin(self.rotation), math.cos(self.rotation)
         t = np.array(pts) - (x, y)
         r = np.array([[c, s], [-s, c]])
         return np.matmul(t, r) + (x, y)
@@ -206,3 +207,27 @@ class Detection(object):
     def scaled(self, factor: Union[Tuple[float, float], float]) -> 'Detection':
         """Return a scaled version of the bounding box and keypoints"""
         return Detection(self.data * factor, self.score)
+
+
+@dataclass
+class FaceDetectionResult:
+    """Face detections in image pixel coordinates and the time spent per
+    stage (milliseconds) to produce them.
+    """
+    detections: List[Detection]
+    tensorize_ms: float = 0.
+    invoke_ms: float = 0.
+    decode_ms: float = 0.
+    nms_ms: float = 0.
+
+    @property
+    def total_ms(self) -> float:
+        """Sum of all stage timings"""
+        return self.tensorize_ms + self.invoke_ms + self.decode_ms + \
+            self.nms_ms
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """Stage timings as a dict"""
+        return {'tensorize': self.tensorize_ms, 'invoke': self.invoke_ms,
+                'decode': self.decode_ms, 'nms': self.nms_ms}